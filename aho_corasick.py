@@ -0,0 +1,61 @@
+"""Aho–Corasick multi-pattern matcher.
+
+Finds every occurrence of any of a set of patterns in one pass over the text,
+independent of how many patterns there are. Used to see which concepts (labels
+and aliases) each paragraph of a section mentions.
+"""
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Set, Tuple
+
+
+class AhoCorasick:
+    """Automaton over (pattern, key) pairs; several patterns may share one key (e.g. a label and its aliases)."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Hashable]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, Hashable]]] = [[]]
+        for pattern, key in patterns:
+            if pattern:
+                self._add(pattern, key)
+        self._build()
+
+    def _add(self, pattern: str, key: Hashable):
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append((len(pattern), key))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                # Inherit matches that end here through the failure link
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Hashable]]:
+        """Yield (start, end, key) for every occurrence, overlapping ones included."""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, key in self.out[state]:
+                yield i + 1 - length, i + 1, key
+
+    def keys_in(self, text: str) -> Set[Hashable]:
+        """Distinct keys with at least one occurrence in text."""
+        return {key for _, _, key in self.iter_matches(text)}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+関係抽出のコンテキスト削減（pipeline.py --prune-relations）の比較
+
+webui/public のセクション別グラフの概念（ラベル・別名）とエッジを、原文の h2 セクションに
+割り当て、関係抽出リクエストを全文モードと削減モード（概念が2つ以上共起する段落のみ）で
+組み立てて比較する。
+
+オフライン（既定）: 入力トークン数（概算）と、既存エッジ（全文モードで抽出されたもの）のうち
+根拠テキストが削減後のコンテキストにも残っている割合（エッジ収量の代理指標）を出す。
+--live: OPENAI_BASE_URL に両モードで実際に送り、usage の入力トークン数と得られたエッジ数を比べる。
+
+    python benchmarks/bench_context_pruning.py
+    python benchmarks/bench_context_pruning.py --live --limit 5 --model gpt-4o-mini
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aho_corasick import AhoCorasick  # noqa: E402
+from llm import ChatCompletionsClient  # noqa: E402
+from manifest import resolve_source, section_id_from_graph  # noqa: E402
+from pipeline import (MAX_SECTION_CHARS, Concept, Section, extract_relations,  # noqa: E402
+                      normalize_for_match, prune_relation_context, split_sections)
+from prompts import relations_messages  # noqa: E402
+from utils import approx_tokens  # noqa: E402
+from validate_evidence import normalize_text  # noqa: E402
+
+
+def load_cases(graph_dir: Path) -> List[Tuple[Section, List[Concept], List[Dict]]]:
+    """(h2セクション, そのセクションに現れる概念, 根拠がそのセクションにあるエッジ) の一覧"""
+    cases = []
+    for graph_file in sorted(graph_dir.glob('graph_*.json')):
+        section_id = section_id_from_graph(graph_file)
+        source = resolve_source(section_id) if section_id else None
+        if not source:
+            continue
+        graph = json.loads(graph_file.read_text(encoding='utf-8'))
+        concepts = [Concept(id=n['id'], label=n.get('label', ''), aliases=n.get('aliases') or [])
+                    for n in graph.get('nodes', [])]
+        matcher = AhoCorasick((normalize_for_match(name), i) for i, c in enumerate(concepts)
+                              for name in [c.label, *c.aliases] if len(name.strip()) >= 2)
+        text = source.read_text(encoding='utf-8')
+        for j, (title, body) in enumerate(split_sections(text), start=1):
+            body = body[:MAX_SECTION_CHARS]
+            present = [concepts[i] for i in sorted(matcher.keys_in(normalize_for_match(body)))]
+            if len(present) < 2:
+                continue
+            normalized_body = normalize_text(body)
+            edges = [e for e in graph.get('edges', [])
+                     if any(normalize_text(ev.get('text', '')) in normalized_body for ev in e.get('evidence', []))]
+            sec = Section(id=f"{section_id}:{j}", chapter=source.name, title=title, text=body, path=str(source))
+            cases.append((sec, present, edges))
+    return cases
+
+
+def prompt_tokens(sec: Section, concepts: List[Concept], text: str) -> int:
+    labels = json.dumps([c.label for c in concepts], ensure_ascii=False, indent=2)
+    return sum(approx_tokens(m['content']) for m in relations_messages(sec.title, sec.chapter, text, labels))
+
+
+def evidence_retained(edge: Dict, context: str) -> bool:
+    normalized = normalize_text(context)
+    return any(normalize_text(ev.get('text', '')) in normalized for ev in edge.get('evidence', []))
+
+
+def run_offline(cases) -> Dict[str, int]:
+    stats = {'sections': len(cases), 'full_tokens': 0, 'pruned_tokens': 0, 'edges': 0, 'edges_retained': 0}
+    for sec, concepts, edges in cases:
+        pruned = prune_relation_context(sec.text, concepts)
+        stats['full_tokens'] += prompt_tokens(sec, concepts, sec.text)
+        stats['pruned_tokens'] += prompt_tokens(sec, concepts, pruned)
+        stats['edges'] += len(edges)
+        stats['edges_retained'] += sum(1 for e in edges if evidence_retained(e, pruned))
+    return stats
+
+
+def run_live(cases, model: str) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for mode, prune in (('full', False), ('pruned', True)):
+        client = ChatCompletionsClient(model=model)
+        edges = sum(len(extract_relations(client, sec, concepts, prune)) for sec, concepts, _ in cases)
+        results[mode] = {'prompt_tokens': client.usage['prompt_tokens'], 'edges': edges,
+                         'latency': client.usage['latency']}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='関係抽出の全文モードと削減モードの比較')
+    parser.add_argument('--graph-dir', type=Path, default=Path('webui/public'), help='セクション別グラフのディレクトリ')
+    parser.add_argument('--limit', type=int, default=0, help='使うセクション数（0は全部）')
+    parser.add_argument('--live', action='store_true', help='OPENAI_BASE_URL に実際に送って計測する')
+    parser.add_argument('--model', default=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'))
+    parser.add_argument('--output', type=Path, default=None, help='結果のJSONの出力先')
+    args = parser.parse_args()
+
+    cases = load_cases(args.graph_dir)
+    if args.limit:
+        cases = cases[:args.limit]
+    print(f"{len(cases)} sections with 2+ known concepts")
+
+    results = {'offline': run_offline(cases)}
+    s = results['offline']
+    saving = 1 - s['pruned_tokens'] / s['full_tokens'] if s['full_tokens'] else 0.0
+    retention = s['edges_retained'] / s['edges'] if s['edges'] else 0.0
+    print(f"\n{'mode':<8} {'input tok':>10}")
+    print(f"{'full':<8} {s['full_tokens']:>10}")
+    print(f"{'pruned':<8} {s['pruned_tokens']:>10}  ({saving:.1%} fewer, approximate tokens)")
+    print(f"Existing edges whose evidence survives pruning: {s['edges_retained']}/{s['edges']} ({retention:.1%})")
+
+    if args.live:
+        results['live'] = run_live(cases, args.model)
+        full, pruned = results['live']['full'], results['live']['pruned']
+        print(f"\n{'mode':<8} {'input tok':>10} {'edges':>6} {'latency s':>10}  (live: {args.model})")
+        for mode, r in results['live'].items():
+            print(f"{mode:<8} {r['prompt_tokens']:>10} {r['edges']:>6} {r['latency']:>10.1f}")
+        if full['prompt_tokens'] and full['edges']:
+            print(f"Input tokens: {1 - pruned['prompt_tokens'] / full['prompt_tokens']:.1%} fewer, "
+                  f"edge yield: {pruned['edges'] / full['edges']:.1%} of full-text mode")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
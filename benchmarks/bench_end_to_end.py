@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+記録したLLM応答によるエンドツーエンド計測（実コーパス input/）
+
+--record: 各章を pipeline.py で抽出し、LLMへの全リクエストと応答（遅延つき）をアーカイブ
+（LLM_RECORD）に保存する。送り先は OPENAI_BASE_URL（実APIまたは mock_server.py）。
+既定（再生）: 同じ抽出をアーカイブの応答（LLM_REPLAY）で行うので、APIキーもネットワークも
+不要で、何度でも同じ入力で比べられる。--replay-latency 1 で記録時の遅延も再現する。
+
+続けて同じ成果物で merge_graphs.merge_graphs と証拠の照合（validate_evidence.find_text_in_source,
+fix_evidence.find_best_match_in_source）を計測する。段階ごとの所要時間（--repeat 回の最小・中央値）を出す。
+
+    python benchmarks/bench_end_to_end.py --record --archive llm_archive.jsonl
+    python benchmarks/bench_end_to_end.py --archive llm_archive.jsonl --repeat 3 --output e2e.json
+"""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fix_evidence import find_best_match_in_source  # noqa: E402
+from manifest import section_id_from_source  # noqa: E402
+from merge_graphs import merge_graphs  # noqa: E402
+from validate_evidence import find_text_in_source  # noqa: E402
+
+
+def run_extract(sources: List[Path], work: Path, env: Dict[str, str], model: str,
+                extra: List[str]) -> Dict[Path, Path]:
+    """章ごとに pipeline.py を実行し、graph_sec<ID>.json を work/graphs に置く。{グラフ: 原文}"""
+    graph_dir = work / 'graphs'
+    graph_dir.mkdir(parents=True, exist_ok=True)
+    graphs = {}
+    for source in sources:
+        section_id = section_id_from_source(source) or source.stem
+        single = work / f'in-{section_id}'
+        single.mkdir(exist_ok=True)
+        shutil.copy(source, single)
+        out = work / f'out-{section_id}'
+        cmd = [sys.executable, 'pipeline.py', '--input', str(single), '--out', str(out), '--model', model, *extra]
+        result = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(result.stdout[-2000:] + result.stderr[-2000:])
+            raise SystemExit(f"pipeline.py failed on {source.name} (replay miss? record the archive again)")
+        graph = graph_dir / f'graph_sec{section_id}.json'
+        shutil.copy(out / 'graph.json', graph)
+        graphs[graph] = source
+    return graphs
+
+
+def evidence_texts(graph: Dict) -> List[str]:
+    return [ev.get('text', '') if isinstance(ev, dict) else str(ev)
+            for item in [*graph.get('nodes', []), *graph.get('edges', [])]
+            for ev in item.get('evidence', []) if ev]
+
+
+def run_evidence(graphs: Dict[Path, Path]) -> Dict[str, int]:
+    stats = {'evidence': 0, 'validated': 0, 'fixable': 0}
+    for graph_file, source in graphs.items():
+        source_text = source.read_text(encoding='utf-8')
+        for text in evidence_texts(json.loads(graph_file.read_text(encoding='utf-8'))):
+            if not text.strip():
+                continue
+            stats['evidence'] += 1
+            stats['validated'] += find_text_in_source(text, source_text) is not None
+            stats['fixable'] += find_best_match_in_source(text, source_text) is not None
+    return stats
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='記録したLLM応答による抽出・結合・証拠照合のエンドツーエンド計測')
+    parser.add_argument('--input', type=Path, default=ROOT / 'input', help='原文ディレクトリ')
+    parser.add_argument('--archive', type=Path, default=ROOT / 'llm_archive.jsonl', help='LLM応答のアーカイブ')
+    parser.add_argument('--record', action='store_true', help='OPENAI_BASE_URL に送ってアーカイブを作り直す')
+    parser.add_argument('--replay-latency', type=float, default=0.0,
+                        help='再生時に記録時の遅延を何倍で再現するか（0は待たない）')
+    parser.add_argument('--model', default=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'))
+    parser.add_argument('--pipeline-args', default='', help='pipeline.py に渡す追加オプション（記録時と揃える）')
+    parser.add_argument('--limit', type=int, default=0, help='使う章の数（0は全部）')
+    parser.add_argument('--repeat', type=int, default=1, help='再生時の繰り返し回数')
+    parser.add_argument('--workdir', type=Path, default=None, help='成果物の置き場所（既定は一時ディレクトリ）')
+    parser.add_argument('--output', type=Path, default=None, help='結果のJSONの出力先')
+    args = parser.parse_args()
+
+    sources = sorted(args.input.glob('*.md'))
+    if args.limit:
+        sources = sources[:args.limit]
+    if not sources:
+        raise SystemExit(f"No markdown files in {args.input}")
+    env = {k: v for k, v in os.environ.items() if k not in ('LLM_RECORD', 'LLM_REPLAY')}
+    if args.record:
+        if args.archive.exists():
+            args.archive.unlink()
+        env['LLM_RECORD'] = str(args.archive.resolve())
+    elif not args.archive.exists():
+        raise SystemExit(f"Archive not found: {args.archive} (run with --record first)")
+    else:
+        env['LLM_REPLAY'] = str(args.archive.resolve())
+        env['LLM_REPLAY_LATENCY'] = str(args.replay_latency)
+        env.setdefault('OPENAI_API_KEY', 'replay')
+    extra = shlex.split(args.pipeline_args)
+    repeats = 1 if args.record else max(1, args.repeat)
+
+    times: Dict[str, List[float]] = {'extract': [], 'merge': [], 'evidence': []}
+    for i in range(repeats):
+        work = args.workdir / f'run{i}' if args.workdir else Path(tempfile.mkdtemp(prefix='e2e-'))
+        try:
+            elapsed, graphs = timed(run_extract, sources, work, env, args.model, extra)
+            times['extract'].append(elapsed)
+            elapsed, merged = timed(merge_graphs, sorted(graphs))
+            times['merge'].append(elapsed)
+            elapsed, evidence = timed(run_evidence, graphs)
+            times['evidence'].append(elapsed)
+        finally:
+            if not args.workdir:
+                shutil.rmtree(work, ignore_errors=True)
+        print(f"run {i + 1}/{repeats}: " + ", ".join(f"{k} {v[-1]:.2f}s" for k, v in times.items()))
+
+    stats = merged['metadata']['statistics']
+    results = {
+        'mode': 'record' if args.record else 'replay', 'archive': str(args.archive), 'model': args.model,
+        'pipeline_args': extra, 'chapters': len(sources), 'replay_latency': args.replay_latency,
+        'nodes': stats['total_nodes'], 'edges': stats['total_edges'], **evidence,
+        'stages': {k: {'min': min(v), 'median': statistics.median(v), 'runs': v} for k, v in times.items()},
+    }
+    print(f"\n{len(sources)} chapters -> {results['nodes']} nodes, {results['edges']} edges; "
+          f"evidence {evidence['validated']}/{evidence['evidence']} found in source")
+    print(f"{'stage':<10} {'min s':>8} {'median s':>9}")
+    for stage, r in results['stages'].items():
+        print(f"{stage:<10} {r['min']:>8.3f} {r['median']:>9.3f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
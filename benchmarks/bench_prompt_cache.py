@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+プロンプト配置によるプレフィックスキャッシュ効果のベンチマーク
+
+従来の配置（指示が先・本文が後、complete() のJSON指示で包む）と、
+キャッシュ向けの配置（固定のシステムブロック・本文が先、タスク指示が後）で
+同じセクションの概念抽出・関係抽出リクエストを組み立て、比較する。
+
+オフライン（既定）: 各リクエストが直前までのリクエストと共有するプレフィックスを
+プロバイダのキャッシュ規則（1024トークン以上、128トークン単位）で見積もり、
+キャッシュされる入力トークン数と入力コストを比較する（トークン数は概算）。
+--live: OPENAI_BASE_URL に実際に送り、usage の cached_tokens と遅延を計測する。
+
+    python benchmarks/bench_prompt_cache.py
+    python benchmarks/bench_prompt_cache.py --live --limit 5 --model gpt-4o-mini
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm import ChatCompletionsClient  # noqa: E402
+from pipeline import read_markdown_files, split_sections  # noqa: E402
+from prompts import (SECTION_CONCEPTS_PROMPT, SECTION_RELATIONS_PROMPT,  # noqa: E402
+                     concepts_messages, relations_messages)
+from utils import approx_tokens  # noqa: E402
+
+CACHE_MIN_TOKENS = 1024
+CACHE_INCREMENT = 128
+LEGACY_SYSTEM = "You are a careful assistant. Respond in strict JSON if asked."
+SAMPLE_CONCEPTS = json.dumps([f"概念{i}" for i in range(1, 11)], ensure_ascii=False, indent=2)
+
+
+def legacy_messages(prompt: str) -> List[Dict[str, str]]:
+    """ChatCompletionsClient.complete() と同じ包み方"""
+    user = f"Return ONLY valid JSON. No commentary. Prompt:\n{prompt}"
+    return [{"role": "system", "content": LEGACY_SYSTEM}, {"role": "user", "content": user}]
+
+
+def build_requests(sections: List[Tuple[str, str, str]], max_concepts: int) -> Dict[str, List[List[Dict]]]:
+    """配置ごとに、セクション順の [概念抽出, 関係抽出, ...] リクエスト列を作る"""
+    layouts: Dict[str, List[List[Dict]]] = {"legacy": [], "cache_friendly": []}
+    for chapter, title, text in sections:
+        text = text[:12000]
+        layouts["legacy"].append(legacy_messages(SECTION_CONCEPTS_PROMPT.format(
+            section_title=title, chapter=chapter, max_concepts=max_concepts, text=text)))
+        layouts["legacy"].append(legacy_messages(SECTION_RELATIONS_PROMPT.format(
+            section_title=title, chapter=chapter, concepts=SAMPLE_CONCEPTS, text=text)))
+        layouts["cache_friendly"].append(concepts_messages(title, chapter, text, max_concepts))
+        layouts["cache_friendly"].append(relations_messages(title, chapter, text, SAMPLE_CONCEPTS))
+    return layouts
+
+
+def render(messages: List[Dict[str, str]]) -> str:
+    """プレフィックス比較用にメッセージ列を1つの文字列にする"""
+    return "".join(f"<|{m['role']}|>{m['content']}<|end|>" for m in messages)
+
+
+def simulate_prefix_cache(requests: List[List[Dict]]) -> Dict[str, float]:
+    """各リクエストについて、以前のリクエストとの最長共通プレフィックスがキャッシュされるとみなす"""
+    seen: List[str] = []
+    prompt_tokens = cached_tokens = 0
+    for messages in requests:
+        text = render(messages)
+        shared = max((len(os.path.commonprefix([text, previous])) for previous in seen), default=0)
+        shared_tokens = approx_tokens(text[:shared])
+        cached = 0 if shared_tokens < CACHE_MIN_TOKENS else shared_tokens // CACHE_INCREMENT * CACHE_INCREMENT
+        prompt_tokens += approx_tokens(text)
+        cached_tokens += cached
+        seen.append(text)
+    return {"requests": len(requests), "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens}
+
+
+def run_live(client: ChatCompletionsClient, requests: List[List[Dict]]) -> Dict[str, float]:
+    """実際に送信して usage と遅延を集計する"""
+    latencies = []
+    for messages in requests:
+        start = time.perf_counter()
+        client.chat(messages)
+        latencies.append(time.perf_counter() - start)
+    usage = dict(client.usage)
+    usage["latency_p50"] = sorted(latencies)[len(latencies) // 2] if latencies else 0.0
+    return usage
+
+
+def input_cost(prompt_tokens: int, cached_tokens: int, price: float, cached_price: float) -> float:
+    """入力コスト（USD、価格は100万トークンあたり）"""
+    return ((prompt_tokens - cached_tokens) * price + cached_tokens * cached_price) / 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='プロンプト配置によるプレフィックスキャッシュ効果の比較')
+    parser.add_argument('--input', type=Path, default=Path('input'), help='Markdownのディレクトリ')
+    parser.add_argument('--limit', type=int, default=0, help='使うセクション数（0は全部）')
+    parser.add_argument('--max-concepts', type=int, default=15)
+    parser.add_argument('--price', type=float, default=0.15, help='入力100万トークンあたりの価格（USD）')
+    parser.add_argument('--cached-price', type=float, default=0.075, help='キャッシュ済み入力100万トークンあたりの価格')
+    parser.add_argument('--live', action='store_true', help='OPENAI_BASE_URL に実際に送って計測する')
+    parser.add_argument('--model', default=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'))
+    parser.add_argument('--output', type=Path, default=None, help='結果のJSONの出力先')
+    args = parser.parse_args()
+
+    sections = []
+    for path, text in read_markdown_files(args.input):
+        for title, body in split_sections(text):
+            sections.append((Path(path).name, title, body))
+    if args.limit:
+        sections = sections[:args.limit]
+    layouts = build_requests(sections, args.max_concepts)
+    print(f"{len(sections)} sections, {len(layouts['legacy'])} requests per layout"
+          f"{' (live: ' + args.model + ')' if args.live else ' (offline estimate, approximate tokens)'}")
+
+    results = {}
+    for name, requests in layouts.items():
+        stats = run_live(ChatCompletionsClient(model=args.model), requests) if args.live \
+            else simulate_prefix_cache(requests)
+        stats['input_cost_usd'] = input_cost(stats['prompt_tokens'], stats['cached_tokens'],
+                                             args.price, args.cached_price)
+        results[name] = stats
+
+    print(f"\n{'layout':<16} {'prompt tok':>11} {'cached tok':>11} {'cached %':>9} {'input $':>9}"
+          + (f" {'latency s':>10} {'p50 s':>7}" if args.live else ''))
+    for name, stats in results.items():
+        rate = stats['cached_tokens'] / stats['prompt_tokens'] if stats['prompt_tokens'] else 0.0
+        line = (f"{name:<16} {stats['prompt_tokens']:>11} {stats['cached_tokens']:>11} {rate:>8.0%} "
+                f"{stats['input_cost_usd']:>9.4f}")
+        if args.live:
+            line += f" {stats['latency']:>10.1f} {stats['latency_p50']:>7.2f}"
+        print(line)
+    legacy, friendly = results['legacy'], results['cache_friendly']
+    if legacy['input_cost_usd']:
+        saving = 1 - friendly['input_cost_usd'] / legacy['input_cost_usd']
+        print(f"\nInput cost saving from reordering: {saving:.1%}")
+    if args.live and legacy['latency']:
+        print(f"Latency saving from reordering: {1 - friendly['latency'] / legacy['latency']:.1%}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+find_similar_concepts のスケーリングベンチマーク
+
+合成した結合グラフ（1k〜100kノード）で索引版の実行時間を測り、
+小さいサイズでは従来の全ペア走査と結果が一致することも確認する。
+
+    python benchmarks/bench_similar_concepts.py
+    python benchmarks/bench_similar_concepts.py --sizes 1000 10000 --naive-limit 2000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from create_cross_chapter_links import extract_section_from_node, find_similar_concepts  # noqa: E402
+
+# 合成ラベル用の文字プール（カタカナ・漢字を混ぜて日本語ラベルのn-gram分布に近づける）
+CHAR_POOL = (
+    "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモラリルレロ"
+    "民主主義多元性技術協働社会投票市場権利公衆信頼契約財産環境学習政策結論自由分散型"
+    "共有現実資本制度参加合意形成対話集団意思決定透明性説明責任計算機通信情報基盤設計"
+)
+
+
+def naive_find_similar_concepts(graph: Dict) -> List[Tuple[Dict, Dict, float]]:
+    """索引化前の全ペア走査（比較・検証用）"""
+    similar_pairs = []
+    nodes = graph['nodes']
+    for i, node1 in enumerate(nodes):
+        section1 = extract_section_from_node(node1)
+        if not section1:
+            continue
+        for node2 in nodes[i+1:]:
+            section2 = extract_section_from_node(node2)
+            if not section2 or section1 == section2:
+                continue
+            label1 = node1.get('label', '').lower()
+            label2 = node2.get('label', '').lower()
+            original1 = node1.get('original_id', '').lower()
+            original2 = node2.get('original_id', '').lower()
+            if original1 and original1 == original2:
+                similar_pairs.append((node1, node2, 1.0))
+            elif label1 in label2 or label2 in label1:
+                similarity = min(len(label1), len(label2)) / max(len(label1), len(label2))
+                if similarity > 0.7:
+                    similar_pairs.append((node1, node2, similarity))
+    return sorted(similar_pairs, key=lambda x: x[2], reverse=True)
+
+
+def make_synthetic_graph(num_nodes: int, nodes_per_section: int = 12, seed: int = 0) -> Dict:
+    """実データに近い長さ分布・重複率を持つ合成結合グラフを作る"""
+    rng = random.Random(seed)
+    nodes = []
+    labels: List[str] = []
+    for i in range(num_nodes):
+        section = f"{i // (nodes_per_section * 8)}-{(i // nodes_per_section) % 8}"
+        roll = rng.random()
+        if labels and roll < 0.05:
+            # 既存概念の言い換え（括弧書きの補足付き）
+            label = rng.choice(labels) + "（" + "".join(rng.choices(CHAR_POOL, k=2)) + "）"
+        elif labels and roll < 0.08:
+            # 別セクションで同じ概念が再登場
+            label = rng.choice(labels)
+        else:
+            label = "".join(rng.choices(CHAR_POOL, k=rng.randint(3, 14)))
+        labels.append(label)
+        nodes.append({
+            'id': f"{label}_{i}",
+            'label': label,
+            'original_id': label,
+            'aliases': [],
+            'source_section': section,
+        })
+    return {'nodes': nodes, 'edges': []}
+
+
+def pair_keys(pairs: List[Tuple[Dict, Dict, float]]) -> List[Tuple[str, str, float]]:
+    return [(a['id'], b['id'], round(s, 9)) for a, b, s in pairs]
+
+
+def time_call(func, *args) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark find_similar_concepts scaling')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 3000, 10000, 30000, 100000])
+    parser.add_argument('--naive-limit', type=int, default=3000,
+                        help='このノード数以下では全ペア走査とも比較する')
+    parser.add_argument('--merged-graph', type=Path, default=Path('webui/public/graph_merged.json'))
+    parser.add_argument('--output', type=Path, default=None, help='結果をJSONで保存')
+    args = parser.parse_args()
+
+    results = []
+
+    if args.merged_graph.exists():
+        with open(args.merged_graph, 'r', encoding='utf-8') as f:
+            graph = json.load(f)
+        indexed_time, indexed = time_call(find_similar_concepts, graph)
+        naive_time, naive = time_call(naive_find_similar_concepts, graph)
+        match = pair_keys(indexed) == pair_keys(naive)
+        print(f"real graph ({len(graph['nodes'])} nodes): indexed {indexed_time*1000:.1f} ms, "
+              f"naive {naive_time*1000:.1f} ms, pairs {len(indexed)}, identical={match}")
+        results.append({'nodes': len(graph['nodes']), 'source': str(args.merged_graph),
+                        'indexed_sec': indexed_time, 'naive_sec': naive_time,
+                        'pairs': len(indexed), 'identical': match})
+
+    print(f"\n{'nodes':>8} {'indexed(s)':>11} {'naive(s)':>10} {'pairs':>8} identical")
+    for size in args.sizes:
+        graph = make_synthetic_graph(size)
+        indexed_time, indexed = time_call(find_similar_concepts, graph)
+        row = {'nodes': size, 'source': 'synthetic', 'indexed_sec': indexed_time,
+               'naive_sec': None, 'pairs': len(indexed), 'identical': None}
+        if size <= args.naive_limit:
+            naive_time, naive = time_call(naive_find_similar_concepts, graph)
+            row['naive_sec'] = naive_time
+            row['identical'] = pair_keys(indexed) == pair_keys(naive)
+        naive_text = f"{row['naive_sec']:.3f}" if row['naive_sec'] is not None else '-'
+        identical_text = '-' if row['identical'] is None else str(row['identical'])
+        print(f"{size:>8} {indexed_time:>11.3f} {naive_text:>10} {len(indexed):>8} {identical_text}")
+        results.append(row)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+パイプライン各段階のベンチマーク（コミット間で比較できるJSONを出力）
+
+実コーパス（input/*.md と webui/public/graph_sec*.json）と、それを10倍・100倍・1000倍に拡大した
+合成コーパスで、各段階の処理量（件/秒）とピークメモリ（tracemalloc）を計測し、
+既定では benchmarks/results/<コミット>.json に保存する。
+
+拡大の仕方:
+- 集約する段階（dedupe_concepts, filter_edges, グラフ出力, merge_graphs, find_similar_concepts,
+  analyze_graph_connectivity）: 実グラフをセクションごと複製し、ラベルとIDに複製番号を付ける。
+  DUPLICATE_SHARE の割合は元のラベルのまま残し、セクション間の重複・ID衝突も同じ比率で増やす。
+- 1件ずつ処理する段階（split_sections, normalize_label/slugify_id, extract_json_block,
+  find_text_in_source）: 実データの入力を k 倍の件数だけ処理する（章や引用の長さは変えない）。
+
+時間は --repeat 回の最小値、メモリは別の1回を tracemalloc 下で実行したピーク（段階の入力は含まない）。
+1件ずつ処理する段階は --budget 秒で打ち切り、それまでの件数で処理量を出す（truncated として記録）。
+前の倍率の実測から線形に見積もった全件の時間が --budget 秒を超える段階はスキップし、その旨を記録する。
+
+    python benchmarks/run_benchmarks.py --scales 1 10 100
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<比較元のコミット>.json
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from create_cross_chapter_links import find_similar_concepts  # noqa: E402
+from create_graph_fix_prompt import analyze_graph_connectivity  # noqa: E402
+from manifest import section_id_from_source  # noqa: E402
+from merge_graphs import merge_graphs  # noqa: E402
+from pipeline import (Concept, Edge, Evidence, build_graph, dedupe_concepts, filter_edges,  # noqa: E402
+                      split_sections, write_outputs)
+from utils import extract_json_block, normalize_label, section_id_from_graph_file, slugify_id  # noqa: E402
+from validate_evidence import find_text_in_source  # noqa: E402
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+DUPLICATE_SHARE = 0.1  # 複製でラベルを変えずに残す割合（セクション間で重複する概念）
+
+
+@dataclass
+class RealCorpus:
+    chapters: List[str]                   # input/*.md の本文
+    graphs: Dict[str, Dict]               # セクションID -> セクショングラフ
+    sources: Dict[str, str]               # セクションID -> 原文（グラフと対応が取れるもの）
+
+
+def load_real_corpus(input_dir: Path, graph_dir: Path) -> RealCorpus:
+    chapter_files = sorted(input_dir.glob('*.md'))
+    graphs = {}
+    for graph_file in sorted(graph_dir.glob('graph_sec*.json')):
+        graphs[section_id_from_graph_file(graph_file.name)] = json.loads(graph_file.read_text(encoding='utf-8'))
+    sources = {}
+    for path in chapter_files:
+        section_id = section_id_from_source(path)
+        if section_id in graphs:
+            sources[section_id] = path.read_text(encoding='utf-8')
+    return RealCorpus([p.read_text(encoding='utf-8') for p in chapter_files], graphs, sources)
+
+
+def evidence_texts(item: Dict) -> List[str]:
+    return [ev.get('text', '') if isinstance(ev, dict) else str(ev) for ev in item.get('evidence') or []]
+
+
+def quiet(func, *args):
+    """標準出力（merge_graphs の衝突一覧など）を捨てて呼ぶ"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return func(*args)
+
+
+class ScaledCorpus:
+    """実コーパスを scale 倍にした合成コーパス。成果物は必要になったときに作ってキャッシュする"""
+
+    def __init__(self, real: RealCorpus, scale: int, workdir: Path, seed: int = 0):
+        self.real = real
+        self.scale = scale
+        self.workdir = workdir
+        self.seed = seed
+        self._cache: Dict[str, Any] = {}
+
+    def _cached(self, key: str, build: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    # --- 1件ずつ処理する段階の入力（実データの繰り返し） --------------------------
+
+    def chapters(self) -> List[str]:
+        return self.real.chapters * self.scale
+
+    def responses(self) -> List[str]:
+        def build():
+            responses = []
+            for graph in self.real.graphs.values():
+                for payload in ({'concepts': graph.get('nodes', [])}, {'edges': graph.get('edges', [])}):
+                    body = json.dumps(payload, ensure_ascii=False, indent=2)
+                    responses.append(f"Here is the result:\n```json\n{body}\n```\n")
+            return responses
+        return self._cached('responses', build) * self.scale
+
+    def evidence_pairs(self) -> List[Tuple[str, str]]:
+        def build():
+            pairs = [(text, self.real.sources[sid]) for sid, graph in self.real.graphs.items()
+                     if sid in self.real.sources
+                     for item in [*graph.get('nodes', []), *graph.get('edges', [])]
+                     for text in evidence_texts(item) if text.strip()]
+            # 打ち切ったときにも代表的な標本になるよう、章の順ではなく混ぜておく
+            random.Random(self.seed).shuffle(pairs)
+            return pairs
+        return self._cached('evidence_pairs', build) * self.scale
+
+    # --- 集約する段階の入力（ラベルを変えた複製） ----------------------------------
+
+    def section_graphs(self) -> Dict[str, Dict]:
+        return self._cached('section_graphs', self._build_section_graphs)
+
+    def _build_section_graphs(self) -> Dict[str, Dict]:
+        rng = random.Random(self.seed)
+        graphs = {}
+        for copy in range(self.scale):
+            for section_id, graph in self.real.graphs.items():
+                if copy == 0:
+                    graphs[section_id] = graph
+                    continue
+                id_map, nodes = {}, []
+                for node in graph.get('nodes', []):
+                    node = dict(node)
+                    if rng.random() >= DUPLICATE_SHARE:
+                        id_map[node['id']] = f"{node['id']}-{copy}"
+                        node['id'] = id_map[node['id']]
+                        node['label'] = f"{node.get('label', '')}-{copy}"
+                    nodes.append(node)
+                edges = [{**e, 'source': id_map.get(e['source'], e['source']),
+                          'target': id_map.get(e['target'], e['target'])} for e in graph.get('edges', [])]
+                graphs[f"{section_id}x{copy}"] = {**graph, 'nodes': nodes, 'edges': edges}
+        return graphs
+
+    def labels(self) -> List[str]:
+        return [name for graph in self.section_graphs().values() for node in graph.get('nodes', [])
+                for name in [node.get('label', ''), *(node.get('aliases') or [])] if name]
+
+    def concepts(self) -> List[Concept]:
+        """毎回新しいオブジェクトを返す（dedupe_concepts が書き換えるため）"""
+        return [Concept(id=n['id'], label=n.get('label', ''), aliases=list(n.get('aliases') or []),
+                        tier=n.get('tier', 'core'), definition=n.get('definition'),
+                        evidence=[Evidence(text=t) for t in evidence_texts(n)], section_id=sid)
+                for sid, graph in self.section_graphs().items() for n in graph.get('nodes', [])]
+
+    def edges(self) -> List[Edge]:
+        return [Edge(source=e['source'], target=e['target'], relation=e.get('relation', ''),
+                     relation_description=e.get('relation_description', ''),
+                     confidence=float(e.get('confidence') or 0.7),
+                     evidence=[Evidence(text=t) for t in evidence_texts(e)], section_id=sid)
+                for sid, graph in self.section_graphs().items() for e in graph.get('edges', [])]
+
+    def built(self) -> Tuple[List[Concept], List[Edge], Dict]:
+        return self._cached('built', lambda: build_graph(self.concepts(), self.edges()))
+
+    def graph_files(self) -> List[Path]:
+        def build():
+            graph_dir = self.workdir / 'graphs'
+            graph_dir.mkdir(parents=True, exist_ok=True)
+            files = []
+            for section_id, graph in self.section_graphs().items():
+                path = graph_dir / f'graph_sec{section_id}.json'
+                path.write_text(json.dumps(graph, ensure_ascii=False), encoding='utf-8')
+                files.append(path)
+            return sorted(files)
+        return self._cached('graph_files', build)
+
+    def merged(self) -> Dict:
+        return self._cached('merged', lambda: quiet(merge_graphs, self.graph_files()))
+
+
+@dataclass
+class Stage:
+    name: str
+    unit: str
+    prepare: Callable[[ScaledCorpus], Any]            # 計測の外で入力を作る
+    run: Optional[Callable[[Any], Any]] = None        # 入力全体を一度に処理する段階
+    each: Optional[Callable[[Any], Any]] = None       # 1件ずつ処理する段階（時間切れで打ち切れる）
+    count: Callable[[Any], int] = len                 # 入力の件数
+
+
+def prepare_writers(corpus: ScaledCorpus):
+    concepts, edges, graph = corpus.built()
+    return corpus.workdir / 'out', concepts, edges, graph
+
+
+def graph_size(graph: Dict) -> int:
+    return len(graph['nodes']) + len(graph['edges'])
+
+
+def normalize_and_slugify(label: str):
+    return normalize_label(label), slugify_id(label)
+
+
+STAGES = [
+    Stage('split_sections', 'chapters', lambda c: c.chapters(), each=split_sections),
+    Stage('normalize_label/slugify_id', 'labels', lambda c: c.labels(), each=normalize_and_slugify),
+    Stage('extract_json_block', 'responses', lambda c: c.responses(), each=extract_json_block),
+    Stage('dedupe_concepts', 'concepts', lambda c: c.concepts(), run=dedupe_concepts),
+    Stage('filter_edges', 'edges', lambda c: (c.edges(), {x.id for x in c.built()[0]}),
+          run=lambda w: filter_edges(*w), count=lambda w: len(w[0])),
+    Stage('write_outputs', 'nodes+edges', prepare_writers, run=lambda w: write_outputs(*w),
+          count=lambda w: graph_size(w[3])),
+    Stage('merge_graphs', 'section graphs', lambda c: c.graph_files(), run=lambda w: quiet(merge_graphs, w)),
+    Stage('find_similar_concepts', 'nodes', lambda c: c.merged(), run=find_similar_concepts,
+          count=lambda w: len(w['nodes'])),
+    Stage('find_text_in_source', 'evidence', lambda c: c.evidence_pairs(), each=lambda p: find_text_in_source(*p)),
+    Stage('analyze_graph_connectivity', 'nodes+edges', lambda c: c.merged(), run=analyze_graph_connectivity,
+          count=graph_size),
+]
+
+
+def execute(stage: Stage, workload: Any, budget: float) -> Tuple[float, int]:
+    """(秒, 処理した件数)。1件ずつの段階は budget 秒を超えたところで打ち切る"""
+    start = time.perf_counter()
+    if stage.each is None:
+        stage.run(workload)
+        return time.perf_counter() - start, stage.count(workload)
+    for done, item in enumerate(workload, 1):
+        stage.each(item)
+        if time.perf_counter() - start > budget:
+            return time.perf_counter() - start, done
+    return time.perf_counter() - start, len(workload)
+
+
+def measure(stage: Stage, corpus: ScaledCorpus, repeat: int, memory: bool, budget: float) -> Dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        workload = stage.prepare(corpus)
+        total = stage.count(workload)
+        gc.collect()
+        seconds, items = execute(stage, workload, budget)
+        runs.append(seconds)
+        if items < total:
+            break  # 打ち切った段階は繰り返さない
+    seconds = min(runs)
+    result = {'stage': stage.name, 'scale': corpus.scale, 'unit': stage.unit, 'items': items, 'total_items': total,
+              'truncated': items < total, 'seconds': seconds, 'runs': runs,
+              'throughput': items / seconds if seconds else None, 'peak_bytes': None}
+    if memory:
+        workload = stage.prepare(corpus)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            execute(stage, workload, budget)
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def git_revision() -> Tuple[str, bool]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float, min_seconds: float,
+            min_bytes: int) -> List[str]:
+    """比較元より (1 + threshold) 倍を超えて遅い（1件あたり）・メモリを使う段階の一覧を表示して返す"""
+    before = {(r['stage'], r['scale']): r for r in baseline.get('results', []) if 'seconds' in r}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit', '?')}{' (dirty)' if baseline.get('dirty') else ''}:")
+    print(f"{'stage':<28} {'scale':>6} {'time':>8} {'memory':>8}")
+    for r in results:
+        old = before.get((r['stage'], r['scale']))
+        if old is None or 'seconds' not in r:
+            continue
+        # 打ち切った計測とも比べられるよう1件あたりの時間で比べる
+        time_ratio = ((r['seconds'] / r['items']) / (old['seconds'] / old['items'])
+                      if old['seconds'] and old['items'] and r['items'] else None)
+        mem_ratio = (r['peak_bytes'] / old['peak_bytes']
+                     if r.get('peak_bytes') is not None and old.get('peak_bytes') else None)
+        flags = []
+        if time_ratio and time_ratio > 1 + threshold and old['seconds'] >= min_seconds:
+            flags.append('slower')
+        if mem_ratio and mem_ratio > 1 + threshold and r['peak_bytes'] >= min_bytes:
+            flags.append('more memory')
+        if flags:
+            regressions.append(f"{r['stage']} x{r['scale']}: {', '.join(flags)}")
+        time_text = f"{time_ratio:.2f}x" if time_ratio else '-'
+        mem_text = f"{mem_ratio:.2f}x" if mem_ratio else '-'
+        print(f"{r['stage']:<28} {r['scale']:>6} {time_text:>8} {mem_text:>8}  {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='パイプライン各段階の処理量とピークメモリを倍率別に計測する')
+    parser.add_argument('--input', type=Path, default=ROOT / 'input', help='原文ディレクトリ')
+    parser.add_argument('--graph-dir', type=Path, default=ROOT / 'webui' / 'public', help='graph_sec*.json のディレクトリ')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help='コーパスの倍率（1は実コーパス）')
+    parser.add_argument('--stages', nargs='+', default=None, help='計測する段階（既定: 全部）')
+    parser.add_argument('--repeat', type=int, default=3, help='時間計測の繰り返し回数（最小値を採用）')
+    parser.add_argument('--budget', type=float, default=60.0, help='1回の見積もり時間がこれを超える段階はスキップ（秒）')
+    parser.add_argument('--no-memory', action='store_true', help='tracemalloc によるメモリ計測を省く')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=None, help='結果のJSON（既定: benchmarks/results/<コミット>.json）')
+    parser.add_argument('--compare', type=Path, default=None, help='比較元の結果JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='退行とみなす増加率')
+    parser.add_argument('--min-seconds', type=float, default=0.01, help='これより短い計測は時間の退行判定から外す')
+    parser.add_argument('--min-bytes', type=int, default=1_000_000, help='これより小さいピークはメモリの退行判定から外す')
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if not args.stages or s.name in args.stages]
+    real = load_real_corpus(args.input, args.graph_dir)
+    corpus_info = {'chapters': len(real.chapters), 'chars': sum(len(t) for t in real.chapters),
+                   'section_graphs': len(real.graphs),
+                   'nodes': sum(len(g.get('nodes', [])) for g in real.graphs.values()),
+                   'edges': sum(len(g.get('edges', [])) for g in real.graphs.values())}
+    print(f"Real corpus: {corpus_info['chapters']} chapters ({corpus_info['chars']} chars), "
+          f"{corpus_info['section_graphs']} section graphs ({corpus_info['nodes']} nodes, {corpus_info['edges']} edges)")
+
+    results: List[Dict] = []
+    last: Dict[str, Tuple[int, float]] = {}
+    print(f"\n{'stage':<28} {'scale':>6} {'items':>9} {'seconds':>9} {'items/s':>11} {'peak MB':>8}")
+    for scale in sorted(args.scales):
+        workdir = Path(tempfile.mkdtemp(prefix=f'bench-x{scale}-'))
+        corpus = ScaledCorpus(real, scale, workdir, args.seed)
+        try:
+            for stage in stages:
+                projected: Optional[float] = None
+                if stage.name in last:
+                    prev_scale, prev_seconds = last[stage.name]
+                    projected = prev_seconds * scale / prev_scale
+                if projected is not None and projected > args.budget:
+                    results.append({'stage': stage.name, 'scale': scale, 'unit': stage.unit,
+                                    'skipped': f"projected {projected:.0f}s > budget {args.budget:.0f}s"})
+                    print(f"{stage.name:<28} {scale:>6} {'skipped':>9} (projected {projected:.0f}s)")
+                    continue
+                r = measure(stage, corpus, max(1, args.repeat), not args.no_memory, args.budget)
+                results.append(r)
+                last[stage.name] = (scale, r['seconds'] * r['total_items'] / max(1, r['items']))
+                peak = f"{r['peak_bytes'] / 1e6:.1f}" if r['peak_bytes'] is not None else '-'
+                throughput = f"{r['throughput']:,.1f}" if r['throughput'] else '-'
+                note = f"  (stopped after {r['items']}/{r['total_items']})" if r['truncated'] else ''
+                print(f"{stage.name:<28} {scale:>6} {r['items']:>9} {r['seconds']:>9.4f} {throughput:>11} {peak:>8}{note}")
+        finally:
+            del corpus
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit, 'dirty': dirty, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(), 'platform': platform.platform(),
+        'corpus': corpus_info,
+        'settings': {'scales': sorted(args.scales), 'repeat': args.repeat, 'budget': args.budget,
+                     'seed': args.seed, 'duplicate_share': DUPLICATE_SHARE, 'memory': not args.no_memory},
+        'results': results,
+    }
+    output = args.output or ROOT / 'benchmarks' / 'results' / f"{commit}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\nResults saved to: {output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text(encoding='utf-8')),
+                              args.threshold, args.min_seconds, args.min_bytes)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
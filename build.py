@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Build orchestrator for the whole toolchain.
+
+Models each step (per-section extraction, merge, cross-chapter links, evidence
+fixing/validation, analytics, search index) as a target with declared inputs,
+outputs and dependencies. A target runs only when the content hashes of its
+inputs differ from the last successful run or an output is missing; targets
+whose dependencies are done run in parallel. Ends with a critical-path report.
+
+Targets that already have their outputs but were never built by this tool
+(e.g. a fresh checkout) are adopted as up to date when no output is older
+than its inputs, so a first `build` doesn't re-extract every section with the LLM.
+
+    python build.py                 # everything that is stale
+    python build.py search_index    # one target and what it depends on
+    python build.py --list
+    python build.py cross_links     # opt-in: paid LLM run that rewrites the curated links
+    python build.py merge --force
+"""
+
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from manifest import GRAPH_DIRS, SOURCE_DIRS, graph_file_name, record_section, section_id_from_source
+from merge_graphs import file_hash as graph_content_hash
+from process_individual_files import process_single_file
+
+DEFAULT_STATE_PATH = Path(".build_state.json")
+WEBUI_PUBLIC = GRAPH_DIRS[0]
+
+
+@dataclass
+class Target:
+    name: str
+    run: Callable[[], None]
+    inputs: List[str] = field(default_factory=list)   # glob patterns, expanded when the target is checked
+    outputs: List[str] = field(default_factory=list)  # paths that must exist afterwards
+    deps: List[str] = field(default_factory=list)
+    default: bool = True  # part of a plain `build.py` run; opt-in targets must be named explicitly
+    # filled in while building
+    status: str = "pending"
+    duration: float = 0.0
+    start: float = 0.0
+
+
+def content_hash(path: Path) -> str:
+    """sha256 of a file; graph JSON ignores the "analytics" key written by graph_analytics.py."""
+    if path.suffix == ".json" and path.name.startswith("graph_"):
+        return graph_content_hash(path)
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def expand_inputs(patterns: List[str]) -> List[Path]:
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in Path(".").glob(pattern) if path.is_file())
+    return sorted(paths)
+
+
+def input_hashes(target: Target) -> Dict[str, str]:
+    return {path.as_posix(): content_hash(path) for path in expand_inputs(target.inputs)}
+
+
+def command(*argv: str) -> Callable[[], None]:
+    """Action that runs a repo script and raises with its output on failure."""
+    def run():
+        result = subprocess.run([sys.executable, *argv], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(argv)} exited with {result.returncode}\n"
+                               f"{result.stdout[-2000:]}{result.stderr[-2000:]}")
+    return run
+
+
+def extraction(source: Path, section_id: str, model: str, max_concepts: int,
+               output_base: Path) -> Callable[[], None]:
+    """Action that re-extracts one section and publishes its graph to webui/public."""
+    def run():
+        output_dir = output_base / f"output-{section_id}"
+        if not process_single_file(source, output_dir, section_id, model=model, max_concepts=max_concepts):
+            raise RuntimeError(f"extraction of {source} failed")
+        published = WEBUI_PUBLIC / graph_file_name(section_id)
+        shutil.copyfile(output_dir / "graph.json", published)
+        record_section(section_id, source=source, graphs=[published, output_dir / "graph.json"])
+    return run
+
+
+def define_targets(model: str, max_concepts: int, output_base: Path) -> Dict[str, Target]:
+    public = WEBUI_PUBLIC.as_posix()
+    targets: List[Target] = []
+
+    extract_sec, extract_extra = [], []
+    for source_dir in SOURCE_DIRS:
+        for source in sorted(source_dir.glob("*.md")) if source_dir.is_dir() else []:
+            section_id = section_id_from_source(source)
+            if not section_id:
+                continue
+            name = f"extract:{section_id}"
+            # Only the source text is an input: prompt/code edits don't silently re-run the LLM (use --force)
+            targets.append(Target(name, extraction(source, section_id, model, max_concepts, output_base),
+                                  inputs=[source.as_posix()], outputs=[f"{public}/{graph_file_name(section_id)}"]))
+            (extract_extra if section_id.startswith("extra-") else extract_sec).append(name)
+
+    targets += [
+        Target("merge", command("merge_graphs.py", "--incremental"),
+               inputs=[f"{public}/graph_sec*.json", "merge_graphs.py"],
+               outputs=[f"{public}/graph_merged.json"], deps=extract_sec),
+        # Opt-in: it replaces the hand-curated links with a paid LLM run, so a section edit alone must not trigger it
+        Target("cross_links", command("create_cross_chapter_links.py", "--auto", "--model", model,
+                                      "--output", f"{public}/cross_chapter_links.json"),
+               inputs=[f"{public}/graph_merged.json"],
+               outputs=[f"{public}/cross_chapter_links.json"], deps=["merge"], default=False),
+        Target("fix_evidence", command("fix_evidence.py"),
+               inputs=[f"{public}/graph_extra-*.json", "extra-input/*.md", "fix_evidence.py"],
+               deps=extract_extra),
+        Target("validate_evidence", command("validate_evidence.py"),
+               inputs=[f"{public}/graph_extra-*.json", "extra-input/*.md", "validate_evidence.py"],
+               deps=["fix_evidence"]),
+        Target("analytics", command("graph_analytics.py"),
+               inputs=[f"{public}/graph_sec*.json", f"{public}/graph_extra-*.json",
+                       f"{public}/graph_merged.json", "graph_analytics.py"],
+               deps=["merge", "fix_evidence"]),
+        Target("search_index", command("build_search_index.py"),
+               inputs=[f"{public}/graph_sec*.json", f"{public}/graph_extra-*.json",
+                       f"{public}/graph_merged.json", "build_search_index.py"],
+               outputs=[f"{public}/search/manifest.json"], deps=["analytics"]),
+    ]
+    return {target.name: target for target in targets}
+
+
+def select(targets: Dict[str, Target], names: List[str]) -> Dict[str, Target]:
+    """The named targets plus everything they depend on."""
+    selected: Dict[str, Target] = {}
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name in selected:
+            continue
+        if name not in targets:
+            raise KeyError(f"unknown target: {name}")
+        selected[name] = targets[name]
+        stack.extend(targets[name].deps)
+    return {name: target for name, target in targets.items() if name in selected}
+
+
+class Builder:
+    def __init__(self, targets: Dict[str, Target], state_path: Path, jobs: int = 4,
+                 force: Optional[List[str]] = None, dry_run: bool = False):
+        self.targets = targets
+        self.state_path = state_path
+        self.state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+        self.jobs = jobs
+        self.force = set(force or [])
+        self.dry_run = dry_run
+
+    def is_stale(self, target: Target) -> bool:
+        if target.name in self.force:
+            return True
+        if any(not Path(output).exists() for output in target.outputs):
+            return True
+        recorded = self.state.get(target.name)
+        return recorded is None or recorded.get("inputs") != input_hashes(target)
+
+    def adopt_existing_outputs(self):
+        """Record never-built targets whose outputs are not older than their inputs as up to date.
+
+        Done for all targets before anything runs, so a rebuilt upstream output with unchanged
+        content (newer mtime, same hash) doesn't make its dependents look stale.
+        """
+        for target in self.targets.values():
+            if target.name in self.state or not target.outputs or target.name in self.force:
+                continue
+            if any(not Path(output).exists() for output in target.outputs):
+                continue
+            newest_input = max((path.stat().st_mtime for path in expand_inputs(target.inputs)), default=0.0)
+            if min(Path(output).stat().st_mtime for output in target.outputs) >= newest_input:
+                self.state[target.name] = {"inputs": input_hashes(target), "adopted": True}
+
+    def execute(self, target: Target) -> Target:
+        target.start = time.perf_counter()
+        if self.is_stale(target):
+            if not self.dry_run:
+                target.run()
+                # Hash after running so targets that rewrite their inputs in place stay up to date
+                self.state[target.name] = {"inputs": input_hashes(target), "built_at": time.time()}
+            target.status = "built"
+        else:
+            target.status = "up-to-date"
+        target.duration = time.perf_counter() - target.start
+        return target
+
+    def build(self) -> bool:
+        self.adopt_existing_outputs()
+        remaining = dict(self.targets)
+        running = {}
+        ok = True
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as executor:
+            while remaining or running:
+                for name, target in list(remaining.items()):
+                    deps = [self.targets[dep] for dep in target.deps if dep in self.targets]
+                    if any(dep.status in ("failed", "skipped") for dep in deps):
+                        target.status = "skipped"
+                        del remaining[name]
+                    elif all(dep.status in ("built", "up-to-date") for dep in deps):
+                        running[executor.submit(self.execute, target)] = target
+                        del remaining[name]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = running.pop(future)
+                    try:
+                        future.result()
+                        if target.status == "built" and self.dry_run:
+                            print(f"  would rebuild {target.name}")
+                        elif target.status == "built":
+                            print(f"  ✓ {target.name} ({target.duration:.2f}s)")
+                    except Exception as e:
+                        target.status = "failed"
+                        target.duration = time.perf_counter() - target.start
+                        ok = False
+                        print(f"  ✗ {target.name}: {e}")
+                    self.save_state()
+        return ok
+
+    def save_state(self):
+        if not self.dry_run:
+            self.state_path.write_text(json.dumps(self.state, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def report(self, wall: float):
+        """Per-target timings and the critical path (longest chain of dependent durations)."""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in self.order():
+            target = self.targets[name]
+            deps = [dep for dep in target.deps if dep in self.targets]
+            slowest = max(deps, key=lambda dep: finish[dep], default=None)
+            previous[name] = slowest
+            finish[name] = target.duration + (finish[slowest] if slowest else 0.0)
+
+        counts: Dict[str, int] = {}
+        for target in self.targets.values():
+            counts[target.status] = counts.get(target.status, 0) + 1
+        busy = sum(target.duration for target in self.targets.values())
+        print(f"\n{', '.join(f'{count} {status}' for status, count in sorted(counts.items()))}")
+        print(f"Wall time {wall:.2f}s, summed target time {busy:.2f}s")
+
+        built = sorted((t for t in self.targets.values() if t.status != "up-to-date"),
+                       key=lambda t: -t.duration)
+        if built:
+            print("\nSlowest targets:")
+            for target in built[:10]:
+                print(f"  {target.name:<24} {target.status:<10} {target.duration:7.2f}s")
+
+        end = max(finish, key=finish.get, default=None)
+        path = []
+        while end:
+            path.append(end)
+            end = previous[end]
+        if path:
+            print(f"\nCritical path ({finish[path[0]]:.2f}s):")
+            for name in reversed(path):
+                target = self.targets[name]
+                print(f"  {name:<24} {target.status:<10} {target.duration:7.2f}s")
+
+    def order(self) -> List[str]:
+        """Targets in dependency order."""
+        ordered, seen = [], set()
+
+        def visit(name: str):
+            stack = [(name, False)]
+            while stack:
+                current, expanded = stack.pop()
+                if current in seen:
+                    continue
+                if expanded:
+                    seen.add(current)
+                    ordered.append(current)
+                    continue
+                stack.append((current, True))
+                stack.extend((dep, False) for dep in self.targets[current].deps
+                             if dep in self.targets and dep not in seen)
+
+        for name in self.targets:
+            visit(name)
+        return ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild stale toolchain targets")
+    parser.add_argument("targets", nargs="*", help="Targets to build (default: all except opt-in ones)")
+    parser.add_argument("--jobs", "-j", type=int, default=4, help="Targets run in parallel")
+    parser.add_argument("--force", nargs="?", const="*", action="append", default=None,
+                        help="Rebuild the given target (or every selected target) even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which targets are stale")
+    parser.add_argument("--list", action="store_true", help="List targets and their dependencies")
+    parser.add_argument("--state", type=Path, default=DEFAULT_STATE_PATH)
+    parser.add_argument("--model", type=str, default="gpt-4o-mini")
+    parser.add_argument("--max-concepts", type=int, default=15)
+    parser.add_argument("--output-base", type=Path, default=Path("individual-outputs"))
+    args = parser.parse_args()
+
+    targets = define_targets(args.model, args.max_concepts, args.output_base)
+    if args.list:
+        for target in targets.values():
+            deps = f" <- {', '.join(target.deps)}" if target.deps else ""
+            opt_in = "" if target.default else " (opt-in)"
+            print(f"{target.name}{deps}{opt_in}")
+        return 0
+    try:
+        targets = select(targets, args.targets or [name for name, target in targets.items() if target.default])
+    except KeyError as e:
+        print(f"Error: {e.args[0]}")
+        return 1
+
+    force = args.force or []
+    if "*" in force:
+        force = list(targets)
+    builder = Builder(targets, args.state, args.jobs, force, args.dry_run)
+    start = time.perf_counter()
+    ok = builder.build()
+    if args.dry_run:
+        stale = [name for name, target in targets.items() if target.status == "built"]
+        print(f"{len(stale)} stale: {', '.join(stale) or '-'}")
+        return 0
+    builder.report(time.perf_counter() - start)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
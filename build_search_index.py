@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+WebUI用の全文検索インデックスを事前生成するスクリプト
+
+全セクショングラフと結合グラフの概念（ラベル・エイリアス・定義・証拠）を
+文字バイグラムで転置索引にし、バイグラムごとにシャードへ振り分けて書き出す。
+ブラウザは検索語のバイグラムが属するシャードだけを取得すればよく、
+全グラフJSONを先に読み込む必要がない。
+
+出力（--out-dir、既定 webui/public/search）:
+  manifest.json   シャード数・シャード関数・フィールド定義
+  docs.json       文書表 [グラフ名, ノードID, セクションID, ラベル] の配列（添字が文書番号）
+  shard_XX.json   {バイグラム: [文書番号の差分, フィールドビット, ...]}
+
+    python build_search_index.py
+    python build_search_index.py query 投票
+"""
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from graph_store import evidence_text_of, fts_tokens
+from utils import section_id_from_graph_file
+
+DEFAULT_OUT_DIR = Path('webui/public/search')
+DEFAULT_SHARDS = 64
+FIELDS = ['label', 'aliases', 'definition', 'evidence']
+SHARD_FUNCTION = ("(codePointAt(0) * 65599 + (codePointAt(1) || 0)) % num_shards "
+                  "over the NFKC-lowercased gram")
+
+
+def shard_of(gram: str, num_shards: int) -> int:
+    """バイグラムのシャード番号（manifest の shard_function と同じ計算）"""
+    second = ord(gram[1]) if len(gram) > 1 else 0
+    return (ord(gram[0]) * 65599 + second) % num_shards
+
+
+def iter_graph_files(graph_dir: Path) -> List[Tuple[str, Path]]:
+    """索引対象のグラフ（セクショングラフと結合グラフ）を列挙"""
+    files = []
+    for graph_file in sorted(graph_dir.glob('graph_*.json')):
+        if section_id_from_graph_file(graph_file.name) or graph_file.name == 'graph_merged.json':
+            files.append((graph_file.stem, graph_file))
+    return files
+
+
+def build_index(graph_dir: Path) -> Tuple[List[List[str]], Dict[str, Dict[int, int]]]:
+    """文書表と バイグラム -> {文書番号: フィールドビット} の転置索引を作る"""
+    docs: List[List[str]] = []
+    postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+    for graph_name, graph_file in iter_graph_files(graph_dir):
+        with open(graph_file, 'r', encoding='utf-8') as f:
+            graph = json.load(f)
+        section_id = section_id_from_graph_file(graph_file.name)
+        for node in graph.get('nodes', []):
+            doc = len(docs)
+            docs.append([graph_name, node['id'], node.get('source_section') or section_id, node.get('label', '')])
+            field_texts = {
+                'label': node.get('label', ''),
+                'aliases': ' '.join(node.get('aliases') or []),
+                'definition': node.get('definition') or '',
+                'evidence': ' '.join(evidence_text_of(item) for item in node.get('evidence', [])),
+            }
+            for bit, field in enumerate(FIELDS):
+                for gram in set(fts_tokens(field_texts[field])):
+                    postings[gram][doc] = postings[gram].get(doc, 0) | (1 << bit)
+    return docs, postings
+
+
+def encode_postings(doc_masks: Dict[int, int]) -> List[int]:
+    """文書番号を差分符号化して [差分, ビット, 差分, ビット, ...] にする"""
+    encoded = []
+    previous = 0
+    for doc in sorted(doc_masks):
+        encoded.extend([doc - previous, doc_masks[doc]])
+        previous = doc
+    return encoded
+
+
+def decode_postings(encoded: List[int]) -> Dict[int, int]:
+    doc_masks = {}
+    doc = 0
+    for i in range(0, len(encoded), 2):
+        doc += encoded[i]
+        doc_masks[doc] = encoded[i + 1]
+    return doc_masks
+
+
+def write_index(out_dir: Path, docs: List[List[str]], postings: Dict[str, Dict[int, int]],
+                num_shards: int) -> Dict:
+    """索引をシャードに分けて書き出し、manifest を返す"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for stale in out_dir.glob('shard_*.json'):
+        stale.unlink()
+
+    shards: Dict[int, Dict[str, List[int]]] = defaultdict(dict)
+    for gram, doc_masks in postings.items():
+        shards[shard_of(gram, num_shards)][gram] = encode_postings(doc_masks)
+
+    compact = {'ensure_ascii': False, 'separators': (',', ':')}
+    shard_sizes = {}
+    for shard, grams in sorted(shards.items()):
+        name = f"shard_{shard:02x}.json"
+        text = json.dumps(dict(sorted(grams.items())), **compact)
+        (out_dir / name).write_text(text, encoding='utf-8')
+        shard_sizes[name] = len(text.encode('utf-8'))
+    (out_dir / 'docs.json').write_text(json.dumps(docs, **compact), encoding='utf-8')
+
+    manifest = {
+        'version': 1,
+        'gram_size': 2,
+        'normalization': 'NFKC, lowercase, bigrams within runs of word characters (single-char runs kept)',
+        'num_shards': num_shards,
+        'shard_function': SHARD_FUNCTION,
+        'shard_file': 'shard_{shard:02x}.json',
+        'fields': FIELDS,
+        'postings': 'flat [doc_delta, field_bits, ...] with doc ids delta-encoded',
+        'num_docs': len(docs),
+        'num_grams': len(postings),
+        'shard_bytes': shard_sizes,
+    }
+    (out_dir / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    return manifest
+
+
+def query_index(out_dir: Path, query: str) -> Tuple[List[Tuple[List[str], List[str]]], List[str]]:
+    """UIと同じ手順で検索する（必要なシャードだけ読む）。(結果, 読んだシャード) を返す"""
+    manifest = json.loads((out_dir / 'manifest.json').read_text(encoding='utf-8'))
+    grams = list(dict.fromkeys(fts_tokens(query)))
+    if not grams:
+        return [], []
+    shard_cache: Dict[str, Dict] = {}
+    result = None
+    for gram in grams:
+        name = f"shard_{shard_of(gram, manifest['num_shards']):02x}.json"
+        if name not in shard_cache:
+            path = out_dir / name
+            shard_cache[name] = json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+        doc_masks = decode_postings(shard_cache[name].get(gram, []))
+        if result is None:
+            result = doc_masks
+        else:
+            result = {doc: result[doc] & mask for doc, mask in doc_masks.items() if doc in result}
+    docs = json.loads((out_dir / 'docs.json').read_text(encoding='utf-8'))
+    hits = [(docs[doc], [field for bit, field in enumerate(manifest['fields']) if mask & (1 << bit)] or ['(mixed)'])
+            for doc, mask in sorted((result or {}).items())]
+    return hits, sorted(shard_cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WebUI用の全文検索インデックスを生成')
+    parser.add_argument('command', nargs='?', choices=['build', 'query'], default='build')
+    parser.add_argument('query', nargs='?', help='query で検索する文字列')
+    parser.add_argument('--graph-dir', type=Path, default=Path('webui/public'))
+    parser.add_argument('--out-dir', type=Path, default=DEFAULT_OUT_DIR)
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    args = parser.parse_args()
+
+    if args.command == 'query':
+        if not args.query:
+            print("Error: 検索する文字列を指定してください")
+            return 1
+        hits, shards = query_index(args.out_dir, args.query)
+        print(f"{len(hits)} candidates for '{args.query}' (loaded {len(shards)} shards: {', '.join(shards)})")
+        for (graph_name, node_id, section_id, label), fields in hits[:30]:
+            print(f"  [{graph_name}] {label} (sec{section_id}) - {', '.join(fields)}")
+        return 0
+
+    docs, postings = build_index(args.graph_dir)
+    manifest = write_index(args.out_dir, docs, postings, args.shards)
+    total = sum(manifest['shard_bytes'].values())
+    print(f"Indexed {manifest['num_docs']} concepts, {manifest['num_grams']} grams "
+          f"into {len(manifest['shard_bytes'])} shards ({total / 1024:.0f} KiB, "
+          f"largest {max(manifest['shard_bytes'].values()) / 1024:.0f} KiB): {args.out_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+概念のローカル埋め込みと近傍探索（章間リンク候補の生成用）
+
+ラベル＋定義の文字バイグラムをハッシュしたTF-IDFベクトルを作り、
+ランダム化SVDで低次元に圧縮（LSA）したうえで、正規化済み行列に対する
+内積のフラット索引で近傍を引く。外部APIもGPUも使わずCPUだけで動く。
+
+    python concept_embeddings.py build
+    python concept_embeddings.py query "二次の投票"
+    python concept_embeddings.py candidates --top-k 5
+"""
+import argparse
+import json
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import char_ngrams, normalize_label
+
+DEFAULT_INDEX_PATH = Path('concept_embeddings.npz')
+DEFAULT_DIM = 64
+DEFAULT_FEATURES = 4096
+LABEL_WEIGHT = 2  # ラベルのバイグラムは定義より重く数える
+
+
+def concept_text_features(node: Dict, n_features: int = DEFAULT_FEATURES) -> Counter:
+    """ラベル＋定義の文字バイグラムをハッシュした特徴量の出現回数"""
+    counts: Counter = Counter()
+    for gram in char_ngrams(normalize_label(node.get('label', '')), 2):
+        counts[zlib.crc32(gram.encode('utf-8')) % n_features] += LABEL_WEIGHT
+    for gram in char_ngrams(normalize_label(node.get('definition') or ''), 2):
+        counts[zlib.crc32(gram.encode('utf-8')) % n_features] += 1
+    return counts
+
+
+class ConceptEmbeddingIndex:
+    """TF-IDF + SVD ベクトルのフラット近傍探索索引"""
+
+    def __init__(self, idf: np.ndarray, components: np.ndarray, vectors: np.ndarray, meta: List[Dict]):
+        self.idf = idf                  # (n_features,)
+        self.components = components    # (dim, n_features)
+        self.vectors = vectors          # (n, dim) L2正規化済み
+        self.meta = meta                # 各行の {'id', 'label', 'section'}
+        self._sections = np.array([m['section'] for m in meta], dtype=object)
+
+    @property
+    def n_features(self) -> int:
+        return self.idf.shape[0]
+
+    @staticmethod
+    def _tf_matrix(nodes: List[Dict], n_features: int) -> np.ndarray:
+        matrix = np.zeros((len(nodes), n_features), dtype=np.float32)
+        for row, node in enumerate(nodes):
+            for feature, count in concept_text_features(node, n_features).items():
+                matrix[row, feature] = 1.0 + np.log(count)
+        return matrix
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @classmethod
+    def build(cls, nodes: List[Dict], dim: int = DEFAULT_DIM, n_features: int = DEFAULT_FEATURES,
+              seed: int = 0) -> 'ConceptEmbeddingIndex':
+        """ノード群から索引を作る（ランダム化SVDで dim 次元に圧縮）"""
+        tf = cls._tf_matrix(nodes, n_features)
+        df = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1 + len(nodes)) / (1 + df)) + 1).astype(np.float32)
+        tfidf = cls._normalize(tf * idf)
+
+        rank = max(1, min(dim, len(nodes) - 1, n_features))
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((n_features, rank + 10)).astype(np.float32)
+        q, _ = np.linalg.qr(tfidf @ omega)
+        _, _, vt = np.linalg.svd(q.T @ tfidf, full_matrices=False)
+        components = vt[:rank].astype(np.float32)
+
+        vectors = cls._normalize(tfidf @ components.T)
+        meta = [{'id': n['id'], 'label': n.get('label', ''), 'section': n.get('source_section', '')}
+                for n in nodes]
+        return cls(idf, components, vectors, meta)
+
+    def embed(self, nodes: List[Dict]) -> np.ndarray:
+        """索引外のノード（またはクエリ）を同じ空間に射影"""
+        tfidf = self._normalize(self._tf_matrix(nodes, self.n_features) * self.idf)
+        return self._normalize(tfidf @ self.components.T)
+
+    def search(self, vector: np.ndarray, k: int = 10,
+               exclude_section: Optional[str] = None) -> List[Tuple[int, float]]:
+        """コサイン類似度の上位 k 件を (行番号, 類似度) で返す"""
+        scores = self.vectors @ vector
+        if exclude_section is not None:
+            scores = np.where(self._sections == exclude_section, -np.inf, scores)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def save(self, path: Path):
+        np.savez_compressed(path, idf=self.idf, components=self.components, vectors=self.vectors,
+                            meta=np.array(json.dumps(self.meta, ensure_ascii=False)))
+
+    @classmethod
+    def load(cls, path: Path) -> 'ConceptEmbeddingIndex':
+        with np.load(path) as data:
+            return cls(data['idf'], data['components'], data['vectors'], json.loads(str(data['meta'])))
+
+
+def semantic_link_candidates(graph: Dict, top_k: int = 5, min_similarity: float = 0.3,
+                             index: Optional[ConceptEmbeddingIndex] = None) -> Dict[str, List[Dict]]:
+    """セクションごとに、他セクションの意味的に近い概念を候補リンクとして返す
+
+    戻り値の各要素は analyze_concept_relationships の cross_section_links と同じ形式。
+    """
+    nodes = [node for node in graph['nodes'] if node.get('source_section')]
+    if len(nodes) < 2:
+        return {}
+    if index is None:
+        index = ConceptEmbeddingIndex.build(nodes)
+    by_id = {node['id']: node for node in nodes}
+
+    candidates = defaultdict(list)
+    for row, meta in enumerate(index.meta):
+        for other, similarity in index.search(index.vectors[row], top_k, exclude_section=meta['section']):
+            if similarity < min_similarity:
+                continue
+            target = index.meta[other]
+            candidates[meta['section']].append({
+                'from_section': meta['section'],
+                'from_concept': meta['label'],
+                'from_id': meta['id'],
+                'to_section': target['section'],
+                'to_concept': target['label'],
+                'to_id': target['id'],
+                'to_definition': (by_id.get(target['id']) or {}).get('definition', ''),
+                'similarity': similarity,
+            })
+    for links in candidates.values():
+        links.sort(key=lambda link: -link['similarity'])
+    return dict(candidates)
+
+
+def load_merged_nodes(merged_graph_path: Path) -> List[Dict]:
+    with open(merged_graph_path, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    return [node for node in graph['nodes'] if node.get('source_section')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='概念の埋め込み索引の作成と検索')
+    parser.add_argument('command', choices=['build', 'query', 'candidates'])
+    parser.add_argument('text', nargs='?', help='query で検索する文字列')
+    parser.add_argument('--merged-graph', type=Path, default=Path('webui/public/graph_merged.json'))
+    parser.add_argument('--index', type=Path, default=DEFAULT_INDEX_PATH)
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--min-similarity', type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        nodes = load_merged_nodes(args.merged_graph)
+        index = ConceptEmbeddingIndex.build(nodes, dim=args.dim)
+        index.save(args.index)
+        print(f"Embedded {len(nodes)} concepts into {index.vectors.shape[1]} dims: {args.index}")
+        return 0
+
+    if args.command == 'query':
+        if not args.text:
+            print("Error: 検索する文字列を指定してください")
+            return 1
+        if not args.index.exists():
+            print(f"Error: {args.index} not found. Run 'build' first.")
+            return 1
+        index = ConceptEmbeddingIndex.load(args.index)
+        vector = index.embed([{'label': args.text}])[0]
+        for row, similarity in index.search(vector, args.top_k):
+            meta = index.meta[row]
+            print(f"  {meta['label']} (sec{meta['section']}) [{similarity:.2f}]")
+        return 0
+
+    with open(args.merged_graph, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    index = ConceptEmbeddingIndex.load(args.index) if args.index.exists() else None
+    candidates = semantic_link_candidates(graph, args.top_k, args.min_similarity, index)
+    for section, links in sorted(candidates.items()):
+        print(f"セクション {section}: {len(links)} candidates")
+        for link in links[:args.top_k]:
+            print(f"  {link['from_concept']} ⟷ {link['to_concept']} (sec{link['to_section']}) "
+                  f"[{link['similarity']:.2f}]")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+MinHash/LSHによるセクション横断の重複概念検出
+
+ラベル・エイリアス・定義の文字シングルからMinHash署名を作り、
+バンド分割したLSHバケットで候補を絞り込むので、全ペア比較をせずに
+「プルラリティ」と「プルラリティ（多元性）」のような近似重複を見つけられる。
+署名は索引ファイルに保存され、新しいセクションは既存の索引に対して
+追加・問い合わせできる。
+
+    python concept_lsh.py build
+    python concept_lsh.py query --graph output/graph.json --section 8-0
+    python concept_lsh.py add --graph webui/public/graph_sec8-0.json
+    python concept_lsh.py pairs --threshold 0.4
+"""
+import argparse
+import json
+import random
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import char_ngrams, normalize_label, section_id_from_graph_file
+
+DEFAULT_INDEX_PATH = Path('concept_lsh_index.json')
+DEFAULT_BANDS = 32
+DEFAULT_ROWS = 4
+DEFAULT_SHINGLE_SIZE = 2
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def concept_shingles(node: Dict, shingle_size: int = DEFAULT_SHINGLE_SIZE) -> Set[str]:
+    """ラベル・エイリアス・定義から文字シングル集合を作る"""
+    parts = [node.get('label', '')] + list(node.get('aliases') or []) + [node.get('definition') or '']
+    shingles: Set[str] = set()
+    for part in parts:
+        shingles |= char_ngrams(normalize_label(part), shingle_size)
+    return shingles
+
+
+class ConceptLSHIndex:
+    """MinHash署名とLSHバケットを保持する索引
+
+    bands × rows 個のハッシュ関数を使う。ジャッカード類似度 s のペアが
+    少なくとも1つのバンドで衝突する確率は 1 - (1 - s^rows)^bands なので、
+    rows を増やすと閾値が上がり（精度重視）、bands を増やすと再現率が上がる。
+    """
+
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS,
+                 shingle_size: int = DEFAULT_SHINGLE_SIZE, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = random.Random(seed)
+        self._coefficients = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(bands * rows)
+        ]
+        # key -> {'section', 'id', 'label', 'signature'}
+        self.entries: Dict[str, Dict] = {}
+        self._buckets: List[Dict[Tuple[int, ...], Set[str]]] = [defaultdict(set) for _ in range(bands)]
+
+    @property
+    def num_perm(self) -> int:
+        return self.bands * self.rows
+
+    def threshold(self) -> float:
+        """衝突確率が約1/2になるジャッカード類似度の目安"""
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def signature(self, node: Dict) -> List[int]:
+        """ノードのMinHash署名を計算"""
+        hashed = [zlib.crc32(s.encode('utf-8')) for s in concept_shingles(node, self.shingle_size)]
+        if not hashed:
+            return [MAX_HASH] * self.num_perm
+        return [min((a * x + b) % MERSENNE_PRIME for x in hashed) & MAX_HASH
+                for a, b in self._coefficients]
+
+    def _band_keys(self, signature: List[int]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def _insert(self, key: str, entry: Dict):
+        self.entries[key] = entry
+        for band, band_key in self._band_keys(entry['signature']):
+            self._buckets[band][band_key].add(key)
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for band, band_key in self._band_keys(entry['signature']):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def remove_section(self, section_id: str) -> int:
+        keys = [key for key, entry in self.entries.items() if entry['section'] == section_id]
+        for key in keys:
+            self.remove(key)
+        return len(keys)
+
+    def add(self, section_id: str, node: Dict) -> str:
+        """ノードを索引に追加してキーを返す"""
+        key = f"{section_id}/{node['id']}"
+        self.remove(key)
+        self._insert(key, {
+            'section': section_id,
+            'id': node['id'],
+            'label': node.get('label', ''),
+            'signature': self.signature(node),
+        })
+        return key
+
+    def add_graph(self, section_id: str, graph: Dict) -> int:
+        """セクショングラフの全ノードを追加（同じセクションの既存エントリは置き換える）"""
+        self.remove_section(section_id)
+        count = 0
+        for node in graph.get('nodes', []):
+            if node.get('id'):
+                self.add(section_id, node)
+                count += 1
+        return count
+
+    def estimate_similarity(self, sig1: List[int], sig2: List[int]) -> float:
+        return sum(1 for a, b in zip(sig1, sig2) if a == b) / self.num_perm
+
+    def candidates(self, signature: List[int]) -> Set[str]:
+        found: Set[str] = set()
+        for band, band_key in self._band_keys(signature):
+            found |= self._buckets[band].get(band_key, set())
+        return found
+
+    def query(self, node: Dict, exclude_section: Optional[str] = None,
+              min_similarity: float = 0.0) -> List[Tuple[Dict, float]]:
+        """ノードに近い索引内の概念を (エントリ, 推定類似度) の降順で返す"""
+        signature = self.signature(node)
+        results = []
+        for key in self.candidates(signature):
+            entry = self.entries[key]
+            if exclude_section is not None and entry['section'] == exclude_section:
+                continue
+            similarity = self.estimate_similarity(signature, entry['signature'])
+            if similarity >= min_similarity:
+                results.append((entry, similarity))
+        return sorted(results, key=lambda x: (-x[1], x[0]['section'], x[0]['id']))
+
+    def query_graph(self, section_id: str, graph: Dict,
+                    min_similarity: float = 0.0) -> List[Tuple[Dict, Dict, float]]:
+        """新しいセクショングラフの各ノードを索引内の他セクションと照合"""
+        results = []
+        for node in graph.get('nodes', []):
+            for entry, similarity in self.query(node, exclude_section=section_id,
+                                                min_similarity=min_similarity):
+                results.append((node, entry, similarity))
+        return sorted(results, key=lambda x: -x[2])
+
+    def near_duplicates(self, min_similarity: float = 0.0) -> List[Tuple[Dict, Dict, float]]:
+        """索引内の異なるセクション間の近似重複ペアを列挙"""
+        seen: Set[Tuple[str, str]] = set()
+        pairs = []
+        for band_buckets in self._buckets:
+            for bucket in band_buckets.values():
+                if len(bucket) < 2:
+                    continue
+                members = sorted(bucket)
+                for i, key1 in enumerate(members):
+                    for key2 in members[i+1:]:
+                        if (key1, key2) in seen:
+                            continue
+                        seen.add((key1, key2))
+                        entry1, entry2 = self.entries[key1], self.entries[key2]
+                        if entry1['section'] == entry2['section']:
+                            continue
+                        similarity = self.estimate_similarity(entry1['signature'], entry2['signature'])
+                        if similarity >= min_similarity:
+                            pairs.append((entry1, entry2, similarity))
+        return sorted(pairs, key=lambda x: (-x[2], x[0]['section'], x[0]['id']))
+
+    def save(self, path: Path):
+        """索引をJSONに保存（バケットは読み込み時に署名から再構築する）"""
+        data = {
+            'params': {
+                'bands': self.bands,
+                'rows': self.rows,
+                'shingle_size': self.shingle_size,
+                'seed': self.seed,
+            },
+            'entries': self.entries,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Path) -> 'ConceptLSHIndex':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(**data['params'])
+        for key, entry in data['entries'].items():
+            index._insert(key, entry)
+        return index
+
+
+def build_index_from_dir(graph_dir: Path, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS,
+                         shingle_size: int = DEFAULT_SHINGLE_SIZE) -> ConceptLSHIndex:
+    """ディレクトリ内のすべてのセクショングラフから索引を作る"""
+    index = ConceptLSHIndex(bands=bands, rows=rows, shingle_size=shingle_size)
+    for graph_file in sorted(graph_dir.glob('graph_*.json')):
+        section_id = section_id_from_graph_file(graph_file.name)
+        if not section_id:
+            continue
+        with open(graph_file, 'r', encoding='utf-8') as f:
+            index.add_graph(section_id, json.load(f))
+    return index
+
+
+def load_or_create_index(path: Path, bands: int, rows: int, shingle_size: int) -> ConceptLSHIndex:
+    if path.exists():
+        return ConceptLSHIndex.load(path)
+    return ConceptLSHIndex(bands=bands, rows=rows, shingle_size=shingle_size)
+
+
+def print_pairs(pairs: List[Tuple[Dict, Dict, float]], limit: int):
+    for node, entry, similarity in pairs[:limit]:
+        node_section = node.get('section', '')
+        node_text = f"{node['label']} (sec{node_section})" if node_section else node['label']
+        print(f"  {node_text} ⟷ {entry['label']} (sec{entry['section']}) [{similarity:.2f}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MinHash/LSHによる近似重複概念の検出')
+    parser.add_argument('command', choices=['build', 'add', 'query', 'pairs'])
+    parser.add_argument('--index', type=Path, default=DEFAULT_INDEX_PATH, help='索引ファイル')
+    parser.add_argument('--graph-dir', type=Path, default=Path('webui/public'),
+                        help='build で読み込むセクショングラフのディレクトリ')
+    parser.add_argument('--graph', type=Path, help='add / query 対象のグラフファイル')
+    parser.add_argument('--section', help='add / query 対象のセクションID（省略時はファイル名から推定）')
+    parser.add_argument('--bands', type=int, default=DEFAULT_BANDS)
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--shingle-size', type=int, default=DEFAULT_SHINGLE_SIZE)
+    parser.add_argument('--threshold', type=float, default=0.3, help='表示する推定類似度の下限')
+    parser.add_argument('--limit', type=int, default=30, help='表示件数')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = build_index_from_dir(args.graph_dir, args.bands, args.rows, args.shingle_size)
+        index.save(args.index)
+        sections = {entry['section'] for entry in index.entries.values()}
+        print(f"Indexed {len(index.entries)} concepts from {len(sections)} sections "
+              f"(bands={index.bands}, rows={index.rows}, threshold≈{index.threshold():.2f})")
+        print(f"Index saved to: {args.index}")
+        return 0
+
+    if args.command == 'pairs':
+        if not args.index.exists():
+            print(f"Error: {args.index} not found. Run 'build' first.")
+            return 1
+        index = ConceptLSHIndex.load(args.index)
+        pairs = index.near_duplicates(args.threshold)
+        print(f"Found {len(pairs)} near-duplicate pairs (similarity >= {args.threshold})")
+        print_pairs(pairs, args.limit)
+        return 0
+
+    if not args.graph or not args.graph.exists():
+        print("Error: --graph に既存のグラフファイルを指定してください")
+        return 1
+    section_id = args.section or section_id_from_graph_file(args.graph.name)
+    if not section_id:
+        print("Error: セクションIDをファイル名から推定できません。--section を指定してください")
+        return 1
+    with open(args.graph, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+
+    index = load_or_create_index(args.index, args.bands, args.rows, args.shingle_size)
+    matches = index.query_graph(section_id, graph, args.threshold)
+    print(f"Section {section_id}: {len(matches)} near-duplicate candidates in index")
+    print_pairs(matches, args.limit)
+
+    if args.command == 'add':
+        added = index.add_graph(section_id, graph)
+        index.save(args.index)
+        print(f"Added {added} concepts from section {section_id} to {args.index}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+グラフの連結性分析（配列ベースの Union-Find）
+
+ノードIDを整数の添字に置き換え、親配列とサイズ配列だけで連結成分を管理する。
+再帰を使わないので大きな結合グラフの長い鎖でも再帰制限に当たらず、
+ほぼ線形時間で連結成分・孤立ノード・成分サイズを求められる。
+add_edge で辺を1本ずつ追加できるので、修正案（新しい概念やエッジ）の
+効果をグラフ全体を作り直さずに評価できる。
+
+    python connectivity.py
+    python connectivity.py --graph webui/public/graph_sec3-0.json --no-links
+"""
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils import normalize_label
+
+
+class UnionFind:
+    """整数 0..n-1 上の Union-Find（経路半減 + サイズ併合）"""
+
+    def __init__(self, n: int = 0):
+        self.parent = list(range(n))
+        self.size = [1] * n
+        self.num_components = n
+
+    def add(self) -> int:
+        """要素を1つ追加して添字を返す"""
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        self.num_components += 1
+        return len(self.parent) - 1
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> bool:
+        """i と j の成分を併合する。別々の成分だった場合に True"""
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j:
+            return False
+        if self.size[root_i] < self.size[root_j]:
+            root_i, root_j = root_j, root_i
+        self.parent[root_j] = root_i
+        self.size[root_i] += self.size[root_j]
+        self.num_components -= 1
+        return True
+
+    def connected(self, i: int, j: int) -> bool:
+        return self.find(i) == self.find(j)
+
+    def groups(self) -> List[List[int]]:
+        """成分ごとの要素リスト（各成分の最小要素の順、成分内は昇順）"""
+        members: Dict[int, List[int]] = {}
+        for i in range(len(self.parent)):
+            members.setdefault(self.find(i), []).append(i)
+        return list(members.values())
+
+    def copy(self) -> 'UnionFind':
+        other = UnionFind()
+        other.parent = self.parent[:]
+        other.size = self.size[:]
+        other.num_components = self.num_components
+        return other
+
+
+class GraphConnectivity:
+    """ノードIDで扱える連結性の索引（エッジは無向として扱う）"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.degree: List[int] = []
+        self.uf = UnionFind()
+
+    @classmethod
+    def from_graph(cls, graph: Dict[str, Any]) -> 'GraphConnectivity':
+        connectivity = cls()
+        for node in graph.get('nodes', []):
+            connectivity.add_node(node['id'])
+        for edge in graph.get('edges', []):
+            connectivity.add_edge(edge.get('source'), edge.get('target'))
+        return connectivity
+
+    def add_node(self, node_id: str) -> int:
+        if node_id not in self.index:
+            self.index[node_id] = self.uf.add()
+            self.ids.append(node_id)
+            self.degree.append(0)
+        return self.index[node_id]
+
+    def add_edge(self, source: Optional[str], target: Optional[str]) -> bool:
+        """既存ノード間のエッジを追加する。2つの成分が繋がった場合に True
+
+        どちらかの端点がグラフにないエッジは（元の分析と同じく）無視する。
+        """
+        i, j = self.index.get(source), self.index.get(target)
+        if i is None or j is None:
+            return False
+        self.degree[i] += 1
+        if i != j:
+            self.degree[j] += 1
+        return self.uf.union(i, j)
+
+    def connected(self, source: str, target: str) -> bool:
+        return self.uf.connected(self.index[source], self.index[target])
+
+    @property
+    def num_components(self) -> int:
+        return self.uf.num_components
+
+    def components(self) -> List[List[str]]:
+        return [[self.ids[i] for i in group] for group in self.uf.groups()]
+
+    def component_sizes(self) -> List[int]:
+        return sorted((len(group) for group in self.uf.groups()), reverse=True)
+
+    def isolated_nodes(self) -> List[str]:
+        return [node_id for node_id, degree in zip(self.ids, self.degree) if degree == 0]
+
+    def copy(self) -> 'GraphConnectivity':
+        """修正案を試すための複製（元の索引は変わらない）"""
+        other = GraphConnectivity()
+        other.ids = self.ids[:]
+        other.index = dict(self.index)
+        other.degree = self.degree[:]
+        other.uf = self.uf.copy()
+        return other
+
+
+def cross_link_endpoints(graph: Dict[str, Any], links: Iterable[Dict[str, Any]]) -> List[tuple]:
+    """章間リンク（セクション＋概念名）を結合グラフのノードIDの組に解決する"""
+    lookup: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for node in graph.get('nodes', []):
+        sections = node.get('source_sections') or [node.get('source_section', '')]
+        forms = list(node.get('aliases') or []) + [node.get('original_id') or node['id'], node.get('label', '')]
+        for section in sections:
+            for form in forms:
+                key = normalize_label(form) if form else ''
+                # 記号だけの表記（⿻ など）は空キーになり、空の概念名と一致してしまうので使わない
+                if key:
+                    lookup[str(section)][key] = node['id']
+
+    endpoints = []
+    for link in links:
+        source = lookup[str(link.get('source_section', ''))].get(normalize_label(str(link.get('source_concept') or '')))
+        target = lookup[str(link.get('target_section', ''))].get(normalize_label(str(link.get('target_concept') or '')))
+        if source and target:
+            endpoints.append((source, target))
+    return endpoints
+
+
+def connectivity_report(graph: Dict[str, Any], cross_links: Optional[Iterable[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """連結性の分析結果（cross_links を渡すと章間リンクを重ねた状態で分析する）"""
+    connectivity = GraphConnectivity.from_graph(graph)
+    resolved = 0
+    if cross_links is not None:
+        for source, target in cross_link_endpoints(graph, cross_links):
+            connectivity.add_edge(source, target)
+            resolved += 1
+    components = connectivity.components()
+    report = {
+        "total_nodes": len(graph.get("nodes", [])),
+        "total_edges": len(graph.get("edges", [])),
+        "num_components": len(components),
+        "components": components,
+        "component_sizes": connectivity.component_sizes(),
+        "isolated_nodes": connectivity.isolated_nodes(),
+        "is_connected": len(components) == 1,
+    }
+    if cross_links is not None:
+        report["cross_links_applied"] = resolved
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='グラフの連結成分・孤立ノードを分析')
+    parser.add_argument('--graph', type=Path, default=Path('webui/public/graph_merged.json'))
+    parser.add_argument('--links', type=Path, default=Path('webui/public/cross_chapter_links.json'),
+                        help='重ねて分析する章間リンク')
+    parser.add_argument('--no-links', action='store_true', help='章間リンクを重ねない')
+    args = parser.parse_args()
+
+    with open(args.graph, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    cross_links = None
+    if not args.no_links and args.links.exists():
+        with open(args.links, 'r', encoding='utf-8') as f:
+            cross_links = json.load(f).get('cross_chapter_links', [])
+
+    report = connectivity_report(graph)
+    print(f"{args.graph.name}: {report['total_nodes']} nodes, {report['total_edges']} edges")
+    print(f"  Components: {report['num_components']} (largest: {report['component_sizes'][:5]})")
+    print(f"  Isolated nodes: {len(report['isolated_nodes'])}")
+    if cross_links is not None:
+        overlay = connectivity_report(graph, cross_links)
+        print(f"With {overlay['cross_links_applied']}/{len(cross_links)} cross-chapter links:")
+        print(f"  Components: {overlay['num_components']} (largest: {overlay['component_sizes'][:5]})")
+        print(f"  Isolated nodes: {len(overlay['isolated_nodes'])}")
+
+
+if __name__ == '__main__':
+    main()
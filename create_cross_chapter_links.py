@@ -2,11 +2,22 @@
 """
 章間の関連概念リンクを発見するためのプロンプトを生成するスクリプト
 """
+import argparse
+import hashlib
 import json
+import os
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
+import sys
+
+import numpy as np
+
+from concept_embeddings import semantic_link_candidates
+from llm import ChatCompletionsClient
+from utils import char_ngrams, extract_json_block, normalize_label
 
 
 def load_merged_graph(filepath: Path) -> Dict:
@@ -30,39 +41,134 @@ def group_nodes_by_section(graph: Dict) -> Dict[str, List[Dict]]:
     return dict(section_nodes)
 
 
-def find_similar_concepts(graph: Dict) -> List[Tuple[Dict, Dict, float]]:
-    """類似概念のペアを見つける（異なるセクション間）"""
-    similar_pairs = []
+GRAM_SIZE = 2  # ラベル索引に使う文字n-gramの長さ（日本語の短いラベル向けにバイグラム）
+
+
+def _node_forms(node: Dict, use_aliases: bool = False) -> List[str]:
+    """類似度比較に使う表記（小文字化したラベルと、指定時はエイリアス）を返す"""
+    forms = [node.get('label', '').lower()]
+    if use_aliases:
+        forms.extend(alias.lower() for alias in node.get('aliases') or [] if alias)
+    return [form for form in dict.fromkeys(forms) if form]
+
+
+def build_gram_index(forms: List[str], n: int = GRAM_SIZE) -> Dict[str, List[int]]:
+    """表記リストから文字n-gram → 表記インデックスの転置索引を作る
+
+    各ポスティングは表記の長さ順に並べるので、長さ条件で二分探索できる。
+    n文字未満の表記がある場合は、それを部分文字列として含む表記も索引に載せる。
+    """
+    index = defaultdict(list)
+    short_forms = {form for form in forms if len(form) < n}
+    for form_idx, form in enumerate(forms):
+        grams = char_ngrams(form, n)
+        if short_forms:
+            for k in range(1, n):
+                grams |= char_ngrams(form, k) & short_forms
+        for gram in grams:
+            index[gram].append(form_idx)
+    for postings in index.values():
+        postings.sort(key=lambda i: len(forms[i]))
+    return dict(index)
+
+
+def find_similar_concepts(graph: Dict, min_similarity: float = 0.7,
+                          use_aliases: bool = False) -> List[Tuple[Dict, Dict, float]]:
+    """類似概念のペアを見つける（異なるセクション間）
+
+    全ペア比較の代わりに、original_id によるブロッキングと文字n-gramの転置索引で
+    候補ペアを絞り込む。部分一致は短い方の表記のn-gramをすべて含む必要があるので、
+    最も出現の少ないn-gramのポスティングだけを長さ条件付きで走査すれば足りる。
+    長さの窓の展開・同一ノード/同一セクションの除外・類似度の計算とペアごとの最大値は
+    NumPy の配列演算でまとめて行い、Python で回すのは部分文字列の判定だけにする。
+    """
     nodes = graph['nodes']
-    
-    for i, node1 in enumerate(nodes):
-        section1 = extract_section_from_node(node1)
-        if not section1:
+    sections = [extract_section_from_node(node) for node in nodes]
+    pair_scores: Dict[Tuple[int, int], float] = {}
+
+    # 完全一致（元のIDが同じ = 衝突解決されたペア）
+    by_original_id = defaultdict(list)
+    for i, node in enumerate(nodes):
+        original_id = node.get('original_id', '').lower()
+        if sections[i] and original_id:
+            by_original_id[original_id].append(i)
+    for members in by_original_id.values():
+        for a, i in enumerate(members):
+            for j in members[a+1:]:
+                if sections[i] != sections[j]:
+                    pair_scores[(i, j)] = 1.0
+
+    # 部分一致（ラベル、指定時はエイリアスも）
+    forms: List[str] = []
+    owners: List[int] = []
+    for i, node in enumerate(nodes):
+        if not sections[i]:
             continue
-            
-        for node2 in nodes[i+1:]:
-            section2 = extract_section_from_node(node2)
-            if not section2 or section1 == section2:
-                continue
-            
-            # 類似度を計算（シンプルな文字列比較）
-            label1 = node1.get('label', '').lower()
-            label2 = node2.get('label', '').lower()
-            original1 = node1.get('original_id', '').lower()
-            original2 = node2.get('original_id', '').lower()
-            
-            # 完全一致（元のIDが同じ = 衝突解決されたペア）
-            if original1 and original1 == original2:
-                similar_pairs.append((node1, node2, 1.0))
-            # 部分一致
-            elif label1 in label2 or label2 in label1:
-                similarity = min(len(label1), len(label2)) / max(len(label1), len(label2))
-                if similarity > 0.7:  # 70%以上の類似度
-                    similar_pairs.append((node1, node2, similarity))
-    
+        for form in _node_forms(node, use_aliases):
+            forms.append(form)
+            owners.append(i)
+
+    if forms:
+        for (i, j), similarity in _score_containment_pairs(forms, owners, sections, min_similarity).items():
+            if similarity > pair_scores.get((i, j), 0.0):
+                pair_scores[(i, j)] = similarity
+
+    # 元の全ペア走査と同じ並び（ノード順 → 類似度の降順で安定ソート）で返す
+    ordered = sorted(pair_scores.items())
+    similar_pairs = [(nodes[i], nodes[j], similarity) for (i, j), similarity in ordered]
     return sorted(similar_pairs, key=lambda x: x[2], reverse=True)
 
 
+def _score_containment_pairs(forms: List[str], owners: List[int], sections: List[str],
+                             min_similarity: float) -> Dict[Tuple[int, int], float]:
+    """部分一致する表記の組を探し、ノードの組 (i < j) ごとの最大類似度を返す"""
+    index = build_gram_index(forms)
+    lengths = np.array([len(form) for form in forms], dtype=np.int64)
+    owner_ids = np.array(owners, dtype=np.int64)
+    section_codes = {section: k for k, section in enumerate(dict.fromkeys(sections))}
+    form_sections = np.array([section_codes[sections[i]] for i in owners], dtype=np.int64)
+
+    # 全ポスティングを (n-gram番号, 表記の長さ) の順に1本の配列に並べ、キーで窓を二分探索する
+    span = int(lengths.max()) + 2
+    gram_ids = {gram: g for g, gram in enumerate(index)}
+    flat_forms = np.array([f for postings in index.values() for f in postings], dtype=np.int64)
+    flat_keys = (np.repeat(np.arange(len(index), dtype=np.int64), [len(p) for p in index.values()]) * span
+                 + lengths[flat_forms])
+
+    rarest = np.array([gram_ids[min(char_ngrams(form, GRAM_SIZE), key=lambda g: len(index[g]))]
+                       for form in forms], dtype=np.int64)
+    # 類似度 = len(短) / len(長) > min_similarity となる長さ [len_a, len_a / min_similarity) だけを見る
+    if min_similarity > 0:
+        upper = np.minimum(np.ceil(lengths / min_similarity).astype(np.int64), span - 1)
+    else:
+        upper = np.full(len(forms), span - 1, dtype=np.int64)
+    lo = np.searchsorted(flat_keys, rarest * span + lengths, side='left')
+    hi = np.searchsorted(flat_keys, rarest * span + upper, side='left')
+
+    counts = np.maximum(hi - lo, 0)
+    form_a = np.repeat(np.arange(len(forms), dtype=np.int64), counts)
+    offsets = np.arange(counts.sum(), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+    form_b = flat_forms[offsets]
+    keep = (owner_ids[form_a] != owner_ids[form_b]) & (form_sections[form_a] != form_sections[form_b])
+    form_a, form_b = form_a[keep], form_b[keep]
+
+    contained = np.fromiter((forms[a] in forms[b] for a, b in zip(form_a.tolist(), form_b.tolist())),
+                            dtype=bool, count=len(form_a))
+    form_a, form_b = form_a[contained], form_b[contained]
+
+    similarity = lengths[form_a] / lengths[form_b]
+    keep = similarity > min_similarity
+    node_a, node_b, similarity = owner_ids[form_a][keep], owner_ids[form_b][keep], similarity[keep]
+    first, second = np.minimum(node_a, node_b), np.maximum(node_a, node_b)
+    # ノードの組ごとに最大の類似度を1つ残す
+    order = np.lexsort((-similarity, second, first))
+    first, second, similarity = first[order], second[order], similarity[order]
+    head = np.ones(len(first), dtype=bool)
+    head[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1])
+    return {(i, j): score for i, j, score in zip(first[head].tolist(), second[head].tolist(),
+                                                  similarity[head].tolist())}
+
+
 def analyze_concept_relationships(graph: Dict) -> Dict:
     """概念間の関係性を分析"""
     section_nodes = group_nodes_by_section(graph)
@@ -122,6 +228,13 @@ def create_link_discovery_prompt(analysis: Dict, target_section: str) -> str:
     related_concepts_by_section = defaultdict(list)
     for link in cross_links:
         related_concepts_by_section[link['to_section']].append(link)
+    # 埋め込みによる意味的候補は、文字列類似で既に挙がった概念を除いて補う
+    seen_targets = {link['to_id'] for link in cross_links}
+    for link in analysis.get('semantic_links', {}).get(target_section, []):
+        if link['to_id'] in seen_targets:
+            continue
+        seen_targets.add(link['to_id'])
+        related_concepts_by_section[link['to_section']].append(link)
     
     related_sections_text = []
     for section, links in related_concepts_by_section.items():
@@ -187,14 +300,7 @@ def create_batch_prompt_for_all_sections(analysis: Dict) -> str:
     """全セクション間のリンク発見用バッチプロンプトを生成"""
     
     section_nodes = analysis['section_nodes']
-    
-    # 各セクションの概念サマリーを作成
-    section_summaries = []
-    for section, nodes in sorted(section_nodes.items()):
-        concepts = [f"  - {node['label']}" for node in nodes[:10]]  # 上位10概念
-        section_summaries.append(f"セクション {section}:\n" + '\n'.join(concepts))
-    
-    all_sections_text = '\n\n'.join(section_summaries)
+    semantic_links = analysis.get('semantic_links')
     
     # 既に検出された類似概念
     similar_pairs = analysis['similar_concepts'][:20]  # 上位20ペア
@@ -205,9 +311,37 @@ def create_batch_prompt_for_all_sections(analysis: Dict) -> str:
         for node1, node2, sim in similar_pairs
     ])
     
+    # 各セクションの概念サマリーを作成
+    section_summaries = []
+    if semantic_links is not None:
+        # 概念の羅列の代わりに、埋め込みで選んだ他セクションとの候補ペアだけを載せる
+        seen_pairs = {frozenset((node1['id'], node2['id'])) for node1, node2, _ in similar_pairs}
+        per_section = analysis.get('semantic_per_section', 3)
+        for section in sorted(section_nodes):
+            lines = []
+            for link in semantic_links.get(section, []):
+                pair = frozenset((link['from_id'], link['to_id']))
+                if pair in seen_pairs:
+                    continue
+                seen_pairs.add(pair)
+                lines.append(f"  - {link['from_concept']} ⟷ {link['to_concept']} "
+                             f"(sec{link['to_section']}) [{link['similarity']:.2f}]")
+                if len(lines) >= per_section:
+                    break
+            if lines:
+                section_summaries.append(f"セクション {section}:\n" + '\n'.join(lines))
+        sections_heading = "全セクションの意味的リンク候補（埋め込み近傍）"
+    else:
+        for section, nodes in sorted(section_nodes.items()):
+            concepts = [f"  - {node['label']}" for node in nodes[:10]]  # 上位10概念
+            section_summaries.append(f"セクション {section}:\n" + '\n'.join(concepts))
+        sections_heading = "全セクションの概念一覧"
+    
+    all_sections_text = '\n\n'.join(section_summaries)
+    
     prompt = f"""# Plurality概念マップ: 章間リンクの包括的発見
 
-## 全セクションの概念一覧:
+## {sections_heading}:
 
 {all_sections_text}
 
@@ -271,13 +405,192 @@ Pluralityの文書全体を通じて、異なる章（セクション）間で
     return prompt
 
 
+def prompt_cache_key(prompt: str, model: str) -> str:
+    """プロンプトとモデルからキャッシュキーを作る"""
+    return hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+def load_cached_links(cache_dir: Path, section: str, cache_key: str) -> Optional[List[Dict]]:
+    """プロンプトが前回と同じセクションのキャッシュ済み応答を返す"""
+    cache_file = cache_dir / f"{section}.json"
+    if not cache_file.exists():
+        return None
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        cached = json.load(f)
+    if cached.get('cache_key') != cache_key:
+        return None
+    return cached.get('links', [])
+
+
+def save_cached_links(cache_dir: Path, section: str, cache_key: str, links: List[Dict]):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(cache_dir / f"{section}.json", 'w', encoding='utf-8') as f:
+        json.dump({'cache_key': cache_key, 'links': links}, f, ensure_ascii=False, indent=2)
+
+
+def request_section_links(client: ChatCompletionsClient, prompt: str) -> List[Dict]:
+    """LLMにセクションの章間リンクを問い合わせ、リンクのリストを返す"""
+    text = client.complete(prompt, expect_json=True)
+    data = extract_json_block(text)
+    if isinstance(data, dict):
+        links = data.get('cross_chapter_links', [])
+    elif isinstance(data, list):
+        links = data
+    else:
+        links = []
+    return [link for link in links if isinstance(link, dict)]
+
+
+def build_label_lookup(section_nodes: Dict[str, List[Dict]]) -> Dict[str, Dict[str, str]]:
+    """セクションごとに 正規化した表記 → 正式ラベル の対応表を作る"""
+    lookup = {}
+    for section, nodes in section_nodes.items():
+        labels = {}
+        for node in nodes:
+            for form in [node['label']] + list(node.get('aliases') or []):
+                labels.setdefault(normalize_label(form), node['label'])
+        # ラベル自体の一致をエイリアスより優先する
+        labels.update({normalize_label(node['label']): node['label'] for node in nodes})
+        # 記号だけの表記（⿻ など）は正規化すると空になり、空の概念名と一致してしまう
+        labels.pop('', None)
+        lookup[section] = labels
+    return lookup
+
+
+def validate_links(links: List[Dict], label_lookup: Dict[str, Dict[str, str]]) -> Tuple[List[Dict], List[Dict]]:
+    """リンクの概念名を結合グラフのラベルと照合し、(有効, 却下) に分ける"""
+    valid, rejected = [], []
+    for link in links:
+        source_section = str(link.get('source_section', ''))
+        target_section = str(link.get('target_section', ''))
+        source_key = normalize_label(str(link.get('source_concept') or ''))
+        target_key = normalize_label(str(link.get('target_concept') or ''))
+        source_label = label_lookup.get(source_section, {}).get(source_key) if source_key else None
+        target_label = label_lookup.get(target_section, {}).get(target_key) if target_key else None
+        if not source_label or not target_label or source_section == target_section or not link.get('relation'):
+            rejected.append(link)
+            continue
+        try:
+            confidence = min(1.0, max(0.0, float(link.get('confidence', 0.7))))
+        except (TypeError, ValueError):
+            confidence = 0.7
+        fixed = dict(link)
+        fixed.update({
+            'source_section': source_section,
+            'source_concept': source_label,
+            'target_section': target_section,
+            'target_concept': target_label,
+            'confidence': confidence,
+        })
+        valid.append(fixed)
+    return valid, rejected
+
+
+def dedupe_links(links: List[Dict]) -> List[Dict]:
+    """向きだけが異なる対称なリンクを含めて重複を除き、確信度の高いものを残す"""
+    best: Dict[frozenset, Dict] = {}
+    for link in links:
+        key = frozenset([(link['source_section'], link['source_concept']),
+                         (link['target_section'], link['target_concept'])])
+        if key not in best or link['confidence'] > best[key]['confidence']:
+            best[key] = link
+    return sorted(best.values(), key=lambda link: (link['source_section'], -link['confidence']))
+
+
+def generate_links_automatically(analysis: Dict, model: str, workers: int, cache_dir: Path,
+                                 force: bool = False) -> Tuple[Dict, List[str]]:
+    """全セクションの個別プロンプトを並列にLLMへ送り、検証済みの章間リンクを集める
+
+    戻り値は (出力するリンク集, 問い合わせに失敗したセクション)。
+    """
+    client = ChatCompletionsClient(model=model)
+    sections = sorted(analysis['section_nodes'])
+    prompts = {section: create_link_discovery_prompt(analysis, section) for section in sections}
+    cache_keys = {section: prompt_cache_key(prompts[section], model) for section in sections}
+
+    responses: Dict[str, List[Dict]] = {}
+    pending = []
+    for section in sections:
+        cached = None if force else load_cached_links(cache_dir, section, cache_keys[section])
+        if cached is None:
+            pending.append(section)
+        else:
+            responses[section] = cached
+    print(f"Requesting {len(pending)} sections ({len(sections) - len(pending)} cached) with {model}")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(request_section_links, client, prompts[section]): section
+                   for section in pending}
+        for future in as_completed(futures):
+            section = futures[future]
+            try:
+                links = future.result()
+            except Exception as e:
+                print(f"  ✗ {section}: {e}")
+                failed.append(section)
+                continue
+            responses[section] = links
+            save_cached_links(cache_dir, section, cache_keys[section], links)
+            print(f"  ✓ {section}: {len(links)} links")
+
+    label_lookup = build_label_lookup(analysis['section_nodes'])
+    all_valid, all_rejected = [], []
+    for section in sections:
+        valid, rejected = validate_links(responses.get(section, []), label_lookup)
+        all_valid.extend(valid)
+        all_rejected.extend(rejected)
+    links = dedupe_links(all_valid)
+
+    concept_counts = defaultdict(int)
+    for link in links:
+        concept_counts[link['source_concept']] += 1
+        concept_counts[link['target_concept']] += 1
+    bridge_concepts = sorted(concept_counts, key=lambda label: -concept_counts[label])[:15]
+
+    result = {
+        'cross_chapter_links': links,
+        'summary': {
+            'total_links': len(links),
+            'key_bridge_concepts': bridge_concepts,
+            'network_insights': (f"{len(sections)}セクションから自動生成（{model}）。"
+                                 f"却下 {len(all_rejected)} 件。"),
+        },
+    }
+    return result, sorted(failed)
+
+
 def main():
+    parser = argparse.ArgumentParser(description='章間リンク発見用プロンプトを生成')
+    parser.add_argument('--merged-graph', type=Path, default=Path('webui/public/graph_merged.json'),
+                        help='結合グラフのパス')
+    parser.add_argument('--semantic', action='store_true',
+                        help='埋め込み索引による意味的な候補ペアでプロンプトを構成する')
+    parser.add_argument('--top-k', type=int, default=5,
+                        help='概念ごとに探す他セクションの近傍数（--semantic 時）')
+    parser.add_argument('--per-section', type=int, default=3,
+                        help='バッチプロンプトに載せるセクションごとの意味的候補数（--semantic 時）')
+    parser.add_argument('--min-similarity', type=float, default=0.3,
+                        help='意味的候補とみなすコサイン類似度の下限（--semantic 時）')
+    parser.add_argument('--auto', action='store_true',
+                        help='全セクションのプロンプトをLLMに送り、章間リンクを直接生成する')
+    parser.add_argument('--model', default=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'),
+                        help='--auto で使うモデル')
+    parser.add_argument('--workers', type=int, default=4, help='--auto の同時リクエスト数')
+    parser.add_argument('--output', type=Path, default=Path('cross_chapter_links.json'),
+                        help='--auto の出力先')
+    parser.add_argument('--cache-dir', type=Path, default=Path('.cross_chapter_cache'),
+                        help='--auto のセクション別応答キャッシュ')
+    parser.add_argument('--force', action='store_true',
+                        help='キャッシュを無視して全セクションを再問い合わせする')
+    args = parser.parse_args()
+
     # 結合グラフを読み込み
-    merged_graph_path = Path('webui/public/graph_merged.json')
+    merged_graph_path = args.merged_graph
     
     if not merged_graph_path.exists():
         print(f"Error: {merged_graph_path} not found. Run merge_graphs.py first.")
-        return
+        return 1
     
     graph = load_merged_graph(merged_graph_path)
     print(f"Loaded merged graph with {len(graph['nodes'])} nodes")
@@ -289,6 +602,12 @@ def main():
     print(f"\nAnalysis Results:")
     print(f"- Sections found: {len(analysis['section_nodes'])}")
     print(f"- Similar concept pairs: {len(analysis['similar_concepts'])}")
+
+    if args.semantic:
+        analysis['semantic_links'] = semantic_link_candidates(graph, args.top_k, args.min_similarity)
+        analysis['semantic_per_section'] = args.per_section
+        total = sum(len(links) for links in analysis['semantic_links'].values())
+        print(f"- Semantic candidate links: {total}")
     
     # 類似概念の上位を表示
     print("\nTop Similar Concepts Across Chapters:")
@@ -297,6 +616,21 @@ def main():
               f"{node2['label']} (sec{extract_section_from_node(node2)}) "
               f"[{similarity:.2f}]")
     
+    if args.auto:
+        result, failed = generate_links_automatically(analysis, args.model, args.workers, args.cache_dir,
+                                                      args.force)
+        if failed:
+            # 一部だけのリンク集で既存の（手で整えた）ファイルを上書きしない
+            print(f"\nError: {len(failed)} sections failed: {', '.join(failed)}")
+            print(f"{args.output} was not written. Re-run to retry (successful sections are cached).")
+            return 1
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nCross-chapter links saved to: {args.output}")
+        print(f"  Total links: {result['summary']['total_links']}")
+        print(f"  {result['summary']['network_insights']}")
+        return 0
+
     # バッチプロンプトを生成
     batch_prompt = create_batch_prompt_for_all_sections(analysis)
     
@@ -318,4 +652,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
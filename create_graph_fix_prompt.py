@@ -6,94 +6,46 @@
 
 import json
 import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 import sys
 
+from connectivity import GraphConnectivity, connectivity_report
+from llm import ChatCompletionsClient
+from manifest import resolve_graph, resolve_source
+from utils import extract_json_block, normalize_label, section_id_from_graph_file, slugify_id
+from validate_evidence import normalize_text
+
+# --auto でLLMに送るときにプロンプト末尾へ付ける出力形式の指示
+AUTO_RESPONSE_INSTRUCTION = """
+## 出力形式（自動適用）
+上記2つのJSONを1つにまとめ、次の形式のJSONオブジェクトだけを返してください：
+{"new_concepts": [...], "new_edges": [...]}
+エッジの source / target には既存概念のID、または new_concepts の id を使ってください。
+"""
 
-def find_graph_file(base_dir: Path, section_id: str) -> Path:
-    """セクションIDに対応するグラフファイルを探す"""
-    # 複数のパターンで探す
-    patterns = [
-        f"graph_{section_id}.json",
-        f"graph_sec{section_id}.json",
-        f"graph_{section_id}-*.json",
-    ]
-
-    # 複数のディレクトリで探す
-    search_dirs = [
-        base_dir,
-        base_dir / "output_all_sections",
-        base_dir / "webui/public",
-        Path(".") / "output_all_sections",
-        Path(".") / "webui/public",
-    ]
-
-    for search_dir in search_dirs:
-        if not search_dir.exists():
-            continue
-
-        for pattern in patterns:
-            # 完全一致
-            file_path = search_dir / pattern
-            if file_path.exists():
-                return file_path
-
-            # glob パターンマッチング
-            if "*" in pattern:
-                import glob
-
-                matches = list(search_dir.glob(pattern))
-                if matches:
-                    return Path(matches[0])
-
-    # 最後の手段として、全体を検索
-    import glob
 
-    all_matches = glob.glob(f"**/graph*{section_id}*.json", recursive=True)
-    if all_matches:
-        return Path(all_matches[0])
+def find_graph_file(base_dir: Path, section_id: str) -> Path:
+    """セクションIDに対応するグラフファイルを探す（base_dir 直下になければマニフェストで引く）"""
+    for pattern in (f"graph_{section_id}.json", f"graph_sec{section_id}.json"):
+        file_path = base_dir / pattern
+        if file_path.exists():
+            return file_path
 
-    raise FileNotFoundError(f"Graph file for section {section_id} not found")
+    file_path = resolve_graph(section_id)
+    if file_path is None:
+        raise FileNotFoundError(f"Graph file for section {section_id} not found")
+    return file_path
 
 
 def find_markdown_file(section_id: str) -> Path:
-    """セクションIDに対応するMarkdownファイルを探す"""
-    # extra-1 -> 1.md のマッピング
-    if section_id.startswith("extra-"):
-        file_num = section_id.split("-")[1]
-        patterns = [f"{file_num}.md"]
-    else:
-        patterns = [f"{section_id}*.md", f"section_{section_id}.md"]
-
-    # 複数のディレクトリで探す
-    search_dirs = [
-        Path("./input"),
-        Path("./contents/japanese"),
-        Path("./temp_0-2"),
-        Path("./test_input_sec3-0"),
-        Path("./extra-input"),  # extra-input ディレクトリを追加
-    ]
-
-    for search_dir in search_dirs:
-        if not search_dir.exists():
-            continue
-
-        for pattern in patterns:
-            import glob
-
-            matches = list(search_dir.glob(pattern))
-            if matches:
-                return matches[0]
-
-    # 最後の手段として、全体を検索
-    import glob
-
-    all_matches = glob.glob(f"**/{section_id}*.md", recursive=True)
-    if all_matches:
-        return Path(all_matches[0])
-
-    raise FileNotFoundError(f"Markdown file for section {section_id} not found")
+    """セクションIDに対応するMarkdownファイルをマニフェストで引く（extra-1 -> extra-input/1.md）"""
+    file_path = resolve_source(section_id)
+    if file_path is None:
+        raise FileNotFoundError(f"Markdown file for section {section_id} not found")
+    return file_path
 
 
 def load_markdown_file(filepath: Path) -> str:
@@ -172,50 +124,15 @@ Rules:
 
 
 def analyze_graph_connectivity(graph_data: Dict[str, Any]) -> Dict[str, Any]:
-    """グラフの連結性を分析"""
-    nodes = graph_data.get("nodes", [])
-    edges = graph_data.get("edges", [])
-
-    # ノードIDのセットを作成
-    node_ids = {node["id"] for node in nodes}
-
-    # 各ノードの接続を追跡
-    connections = {node_id: set() for node_id in node_ids}
-
-    for edge in edges:
-        source = edge["source"]
-        target = edge["target"]
-        if source in node_ids and target in node_ids:
-            connections[source].add(target)
-            connections[target].add(source)
-
-    # 連結成分を見つける
-    visited = set()
-    components = []
-
-    def dfs(node, component):
-        visited.add(node)
-        component.add(node)
-        for neighbor in connections[node]:
-            if neighbor not in visited:
-                dfs(neighbor, component)
-
-    for node_id in node_ids:
-        if node_id not in visited:
-            component = set()
-            dfs(node_id, component)
-            components.append(component)
-
-    # 孤立ノードを特定
-    isolated_nodes = [node_id for node_id in node_ids if len(connections[node_id]) == 0]
-
+    """グラフの連結性を分析（Union-Find なので大きなグラフでも再帰制限に当たらない）"""
+    report = connectivity_report(graph_data)
     return {
-        "total_nodes": len(nodes),
-        "total_edges": len(edges),
-        "num_components": len(components),
-        "components": [list(comp) for comp in components],
-        "isolated_nodes": isolated_nodes,
-        "is_connected": len(components) == 1,
+        "total_nodes": report["total_nodes"],
+        "total_edges": report["total_edges"],
+        "num_components": report["num_components"],
+        "components": report["components"],
+        "isolated_nodes": report["isolated_nodes"],
+        "is_connected": report["is_connected"],
     }
 
 
@@ -333,10 +250,207 @@ def save_prompt(prompt: str, output_path: Path):
         sys.exit(1)
 
 
+def iter_section_graph_files(graph_dir: Path) -> List[Tuple[str, Path]]:
+    """ディレクトリ内のセクショングラフを (セクションID, パス) で列挙"""
+    files = []
+    for graph_file in sorted(graph_dir.glob("graph_*.json")):
+        section_id = section_id_from_graph_file(graph_file.name)
+        if section_id:
+            files.append((section_id, graph_file))
+    return files
+
+
+def evidence_in_source(evidence: List[Any], source_text: str) -> List[Dict[str, str]]:
+    """原文に（空白・句読点を正規化して）含まれる証拠だけを返す"""
+    normalized_source = normalize_text(source_text)
+    found = []
+    for item in evidence or []:
+        text = item.get("text", "") if isinstance(item, dict) else str(item)
+        if text.strip() and normalize_text(text) in normalized_source:
+            found.append({"text": text})
+    return found
+
+
+def validate_fix(
+    graph_data: Dict[str, Any], suggestion: Dict[str, Any], source_text: str
+) -> Tuple[List[Dict], List[Dict], List[str]]:
+    """LLMの修正案を検証し、(追加する概念, 追加するエッジ, 却下理由) を返す
+
+    - 新概念: ラベルがあり、既存IDと衝突せず、証拠が原文に含まれること
+    - 新エッジ: 両端が既存概念か採用した新概念で、関係ラベルがあり、証拠が原文に含まれること
+    - どの採用エッジにも使われない新概念は（孤立ノードになるので）追加しない
+    """
+    existing_ids = {node["id"] for node in graph_data.get("nodes", [])}
+    lookup = {}
+    for node in graph_data.get("nodes", []):
+        for form in [node["id"], node.get("label", "")] + list(node.get("aliases") or []):
+            if form:
+                lookup.setdefault(normalize_label(form), node["id"])
+
+    rejected = []
+    candidates = {}
+    for concept in suggestion.get("new_concepts") or []:
+        if not isinstance(concept, dict):
+            continue
+        label = str(concept.get("label") or concept.get("id") or "").strip()
+        concept_id = slugify_id(label)
+        if not concept_id:
+            rejected.append("concept without label")
+            continue
+        if concept_id in existing_ids or concept_id in candidates:
+            rejected.append(f"concept '{label}': id already exists")
+            continue
+        evidence = evidence_in_source(concept.get("evidence"), source_text)
+        if not evidence:
+            rejected.append(f"concept '{label}': evidence not found in source")
+            continue
+        candidates[concept_id] = {
+            "id": concept_id,
+            "label": label,
+            "tier": concept.get("tier", "supplementary"),
+            "definition": concept.get("definition"),
+            "aliases": [alias for alias in concept.get("aliases") or [] if isinstance(alias, str)],
+            "evidence": evidence,
+        }
+        for form in [concept_id, label, str(concept.get("id") or "")]:
+            if form:
+                lookup.setdefault(normalize_label(form), concept_id)
+
+    # 記号だけの表記（⿻ など）は正規化すると空になり、空・欠落した端点と一致してしまう
+    lookup.pop("", None)
+    new_edges = []
+    seen = {(edge.get("source"), edge.get("target"), edge.get("relation")) for edge in graph_data.get("edges", [])}
+    for edge in suggestion.get("new_edges") or []:
+        if not isinstance(edge, dict):
+            continue
+        source = lookup.get(normalize_label(str(edge.get("source") or "")))
+        target = lookup.get(normalize_label(str(edge.get("target") or "")))
+        relation = str(edge.get("relation", "")).strip()
+        if not source or not target or source == target:
+            rejected.append(f"edge {edge.get('source')} -> {edge.get('target')}: unknown endpoint")
+            continue
+        if not relation or (source, target, relation) in seen:
+            rejected.append(f"edge {source} -> {target}: missing or duplicate relation")
+            continue
+        evidence = evidence_in_source(edge.get("evidence"), source_text)
+        if not evidence:
+            rejected.append(f"edge {source} -> {target}: evidence not found in source")
+            continue
+        try:
+            confidence = min(1.0, max(0.0, float(edge.get("confidence", 0.7))))
+        except (TypeError, ValueError):
+            confidence = 0.7
+        seen.add((source, target, relation))
+        new_edges.append({
+            "source": source,
+            "target": target,
+            "relation": relation,
+            "relation_description": edge.get("relation_description", ""),
+            "confidence": confidence,
+            "evidence": evidence,
+        })
+
+    used = {edge["source"] for edge in new_edges} | {edge["target"] for edge in new_edges}
+    new_nodes = [node for concept_id, node in candidates.items() if concept_id in used]
+    rejected.extend(f"concept '{node['label']}': not connected by any edge"
+                    for concept_id, node in candidates.items() if concept_id not in used)
+    return new_nodes, new_edges, rejected
+
+
+def request_fix(client: ChatCompletionsClient, prompt: str) -> Dict[str, Any]:
+    """LLMに修正案を問い合わせる"""
+    data = extract_json_block(client.complete(prompt, expect_json=True))
+    return data if isinstance(data, dict) else {}
+
+
+def repair_graphs_automatically(
+    graph_dir: Path,
+    model: str,
+    workers: int = 4,
+    max_iterations: int = 3,
+    max_concepts: int = 15,
+    dry_run: bool = False,
+) -> List[Dict[str, Any]]:
+    """非連結なセクショングラフの修正案を並列に生成・検証・適用し、連結になるまで繰り返す"""
+    client = ChatCompletionsClient(model=model)
+    targets = {}
+    for section_id, graph_file in iter_section_graph_files(graph_dir):
+        graph_data = load_graph_data(graph_file)
+        components = GraphConnectivity.from_graph(graph_data).num_components
+        if components > 1:
+            targets[section_id] = {"file": graph_file, "graph": graph_data, "before": components,
+                                   "after": components, "concepts": 0, "edges": 0, "rejected": 0}
+    print(f"Found {len(targets)} disconnected section graphs in {graph_dir}")
+
+    sources: Dict[str, str] = {}
+    for section_id in list(targets):
+        try:
+            sources[section_id] = load_markdown_file(find_markdown_file(section_id))
+        except FileNotFoundError as e:
+            print(f"  ✗ {section_id}: {e}")
+            del targets[section_id]
+
+    for iteration in range(1, max_iterations + 1):
+        pending = [section_id for section_id, target in targets.items() if target["after"] > 1]
+        if not pending:
+            break
+        print(f"\nIteration {iteration}: requesting fixes for {len(pending)} sections with {model}")
+        prompts = {
+            section_id: create_fix_prompt(sources[section_id], targets[section_id]["graph"],
+                                          section_id, max_concepts) + AUTO_RESPONSE_INSTRUCTION
+            for section_id in pending
+        }
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(request_fix, client, prompts[section_id]): section_id
+                       for section_id in pending}
+            for future in as_completed(futures):
+                section_id = futures[future]
+                target = targets[section_id]
+                try:
+                    suggestion = future.result()
+                except Exception as e:
+                    print(f"  ✗ {section_id}: {e}")
+                    continue
+                new_nodes, new_edges, rejected = validate_fix(target["graph"], suggestion, sources[section_id])
+                target["graph"]["nodes"].extend(new_nodes)
+                target["graph"]["edges"].extend(new_edges)
+                target["concepts"] += len(new_nodes)
+                target["edges"] += len(new_edges)
+                target["rejected"] += len(rejected)
+                before = target["after"]
+                target["after"] = GraphConnectivity.from_graph(target["graph"]).num_components
+                print(f"  ✓ {section_id}: +{len(new_nodes)} concepts, +{len(new_edges)} edges, "
+                      f"{len(rejected)} rejected, components {before} -> {target['after']}")
+                for reason in rejected[:5]:
+                    print(f"      - {reason}")
+
+    if not dry_run:
+        for target in targets.values():
+            if target["concepts"] or target["edges"]:
+                with open(target["file"], "w", encoding="utf-8") as f:
+                    json.dump(target["graph"], f, ensure_ascii=False, indent=2)
+
+    return [{"section_id": section_id, **{key: value for key, value in target.items() if key != "graph"}}
+            for section_id, target in sorted(targets.items())]
+
+
+def print_repair_summary(results: List[Dict[str, Any]], dry_run: bool = False):
+    """修正前後の連結成分数の一覧を表示"""
+    print("\n" + "=" * 50)
+    print("Repair summary" + (" (dry run, nothing written)" if dry_run else ""))
+    print("=" * 50)
+    for result in results:
+        status = "connected" if result["after"] == 1 else "still disconnected"
+        print(f"  {result['section_id']}: components {result['before']} -> {result['after']} ({status}), "
+              f"+{result['concepts']} concepts, +{result['edges']} edges, {result['rejected']} rejected")
+    fixed = sum(1 for result in results if result["after"] == 1)
+    print(f"\n{fixed}/{len(results)} graphs connected")
+
+
 def main():
     parser = argparse.ArgumentParser(description="グラフデータ修正用のプロンプトを作成")
     parser.add_argument(
-        "--section-id", required=True, help="セクションID（例: 1-0, 0-1など）"
+        "--section-id", help="セクションID（例: 1-0, 0-1など）"
     )
     parser.add_argument(
         "--output",
@@ -348,8 +462,35 @@ def main():
         "--max-concepts", type=int, default=15, help="最大概念数（デフォルト: 15）"
     )
 
+    parser.add_argument(
+        "--auto",
+        action="store_true",
+        help="非連結な全セクショングラフの修正案をLLMで生成・検証して適用する",
+    )
+    parser.add_argument(
+        "--graph-dir", type=Path, default=Path("webui/public"), help="--auto で走査するディレクトリ"
+    )
+    parser.add_argument("--model", default=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), help="--auto で使うモデル")
+    parser.add_argument("--workers", type=int, default=4, help="--auto の並列リクエスト数")
+    parser.add_argument(
+        "--max-iterations", type=int, default=3, help="--auto の修正の繰り返し上限（デフォルト: 3）"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="--auto で修正結果をファイルに書き込まない"
+    )
+
     args = parser.parse_args()
 
+    if args.auto:
+        results = repair_graphs_automatically(
+            args.graph_dir, args.model, args.workers, args.max_iterations, args.max_concepts, args.dry_run
+        )
+        print_repair_summary(results, args.dry_run)
+        return
+
+    if not args.section_id:
+        parser.error("--section-id または --auto を指定してください")
+
     # デフォルトの出力ファイル名を設定
     if args.output is None:
         args.output = Path(f"fix_prompt_{args.section_id}.txt")
@@ -9,6 +9,9 @@ from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from difflib import SequenceMatcher
 
+from manifest import resolve_source
+from utils import section_id_from_graph_file
+
 
 def load_graph_data(graph_file: Path) -> Dict:
     """グラフデータを読み込み"""
@@ -116,16 +119,12 @@ def fix_evidence_in_graph(graph_file: Path, source_dir: Path) -> int:
     """グラフファイル内の証拠テキストを修正"""
     graph_data = load_graph_data(graph_file)
     
-    # ソースファイルを特定
-    if 'extra-1' in str(graph_file):
-        source_file = source_dir / '1.md'
-    elif 'extra-2' in str(graph_file):
-        source_file = source_dir / '2.md'
-    elif 'extra-3' in str(graph_file):
-        source_file = source_dir / '3.md'
-    else:
+    # ソースファイルを特定（source_dir になければマニフェストで引く）
+    section_id = section_id_from_graph_file(graph_file.name)
+    if not section_id:
         print(f"Unknown graph file pattern: {graph_file}")
         return 0
+    source_file = resolve_source(section_id, source_dir)
     
     if not source_file.exists():
         print(f"❌ Source file not found: {source_file}")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+グラフ分析の事前計算（networkx）
+
+各セクショングラフと結合グラフについて、ノードごとの次数・PageRank・
+媒介中心性・連結成分と、グラフ全体の橋・関節点を計算し、グラフJSONの
+トップレベル "analytics" に書き込む。UIはこれを使って重要度による
+サイズ変更やフィルタリングを行える（クライアント側での計算は不要）。
+結果はグラフ構造（ノードIDとエッジ）のハッシュをキーにキャッシュし、
+保存時には今あるグラフのハッシュ以外の結果を捨てる。
+
+    python graph_analytics.py
+    python graph_analytics.py --graph-dir webui/public --no-write
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+from utils import section_id_from_graph_file
+
+DEFAULT_CACHE_PATH = Path('.analytics_cache.json')
+ANALYTICS_VERSION = 1
+BETWEENNESS_EXACT_LIMIT = 2000  # これより大きいグラフは媒介中心性をサンプリングで近似する
+BETWEENNESS_SAMPLES = 500
+
+
+def graph_structure_hash(graph: Dict[str, Any]) -> str:
+    """ノードIDとエッジの端点だけから計算するハッシュ（分析結果以外の変更では変わらない）"""
+    node_ids = sorted(node['id'] for node in graph.get('nodes', []) if node.get('id'))
+    edges = sorted((edge.get('source', ''), edge.get('target', '')) for edge in graph.get('edges', []))
+    payload = json.dumps([ANALYTICS_VERSION, node_ids, edges], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_digraph(graph: Dict[str, Any]) -> nx.DiGraph:
+    """グラフJSONから有向グラフを作る（存在しないノードへのエッジは無視）"""
+    g = nx.DiGraph()
+    g.add_nodes_from(node['id'] for node in graph.get('nodes', []) if node.get('id'))
+    for edge in graph.get('edges', []):
+        source, target = edge.get('source'), edge.get('target')
+        if source in g and target in g and source != target:
+            g.add_edge(source, target)
+    return g
+
+
+def pagerank(g: nx.DiGraph, alpha: float = 0.85, tol: float = 1.0e-10, max_iter: int = 200) -> Dict[str, float]:
+    """PageRankのべき乗法（nx.pagerank と同じ定義だが scipy を必要としない）"""
+    nodes = list(g.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    index = {node: i for i, node in enumerate(nodes)}
+    out_degree = np.array([g.out_degree(node) for node in nodes], dtype=float)
+    sources = np.array([index[u] for u, _ in g.edges()], dtype=int)
+    targets = np.array([index[v] for _, v in g.edges()], dtype=int)
+    dangling = out_degree == 0
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = rank
+        spread = np.zeros(n)
+        if len(sources):
+            np.add.at(spread, targets, previous[sources] / out_degree[sources])
+        rank = alpha * (spread + previous[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(rank - previous).sum() < n * tol:
+            break
+    return {node: float(rank[i]) for i, node in enumerate(nodes)}
+
+
+def compute_analytics(graph: Dict[str, Any]) -> Dict[str, Any]:
+    """1つのグラフの分析結果を計算する"""
+    g = build_digraph(graph)
+    undirected = g.to_undirected()
+    n = undirected.number_of_nodes()
+
+    ranks = pagerank(g)
+    if n > BETWEENNESS_EXACT_LIMIT:
+        betweenness = nx.betweenness_centrality(undirected, k=BETWEENNESS_SAMPLES, seed=0)
+    else:
+        betweenness = nx.betweenness_centrality(undirected)
+
+    components = sorted(nx.connected_components(undirected), key=lambda c: (-len(c), min(c)))
+    component_of = {node: i for i, component in enumerate(components) for node in component}
+    articulation = set(nx.articulation_points(undirected))
+    bridges = sorted(tuple(sorted(edge)) for edge in nx.bridges(undirected))
+    max_rank = max(ranks.values(), default=0.0) or 1.0
+
+    nodes = {}
+    for node in g.nodes():
+        nodes[node] = {
+            'degree': undirected.degree(node),
+            'in_degree': g.in_degree(node),
+            'out_degree': g.out_degree(node),
+            'pagerank': round(ranks.get(node, 0.0), 6),
+            'betweenness': round(betweenness.get(node, 0.0), 6),
+            'importance': round(ranks.get(node, 0.0) / max_rank, 4),
+            'component': component_of[node],
+            'is_articulation_point': node in articulation,
+        }
+
+    return {
+        'version': ANALYTICS_VERSION,
+        'graph_hash': graph_structure_hash(graph),
+        'summary': {
+            'num_nodes': n,
+            'num_edges': undirected.number_of_edges(),
+            'num_components': len(components),
+            'component_sizes': [len(component) for component in components],
+            'isolated_nodes': sum(1 for node in undirected if undirected.degree(node) == 0),
+            'num_bridges': len(bridges),
+            'num_articulation_points': len(articulation),
+            'betweenness_sampled': n > BETWEENNESS_EXACT_LIMIT,
+        },
+        'bridges': [list(edge) for edge in bridges],
+        'articulation_points': sorted(articulation),
+        'nodes': nodes,
+    }
+
+
+def load_cache(cache_path: Path) -> Dict[str, Any]:
+    if not cache_path.exists():
+        return {}
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cache(cache_path: Path, cache: Dict[str, Any], graph_files: List[Path]):
+    """今ある graph_files の構造ハッシュの結果だけを残して保存する（編集のたびに古い結果が溜まらないように）"""
+    current = set()
+    for graph_file in graph_files:
+        if graph_file.exists():
+            with open(graph_file, 'r', encoding='utf-8') as f:
+                current.add(graph_structure_hash(json.load(f)))
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({graph_hash: result for graph_hash, result in cache.items() if graph_hash in current},
+                  f, ensure_ascii=False)
+
+
+def analyze_graph_file(graph_file: Path, cache: Dict[str, Any], write: bool = True) -> Tuple[Dict[str, Any], bool]:
+    """グラフファイルを分析し、必要なら結果を書き込む。(分析結果, キャッシュヒット) を返す"""
+    with open(graph_file, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    graph_hash = graph_structure_hash(graph)
+    cached = graph_hash in cache
+    analytics = cache[graph_hash] if cached else compute_analytics(graph)
+    cache[graph_hash] = analytics
+
+    if write and graph.get('analytics', {}).get('graph_hash') != graph_hash:
+        graph['analytics'] = analytics
+        # 他のツールが読み込み中でも壊れたJSONを見せないよう、一時ファイルから置き換える
+        tmp_file = graph_file.with_name(graph_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(graph, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, graph_file)
+    return analytics, cached
+
+
+def iter_target_files(graph_dir: Path) -> List[Path]:
+    """分析対象のグラフファイル（セクショングラフと結合グラフ）"""
+    return [graph_file for graph_file in sorted(graph_dir.glob('graph_*.json'))
+            if section_id_from_graph_file(graph_file.name) or graph_file.name == 'graph_merged.json']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='グラフ分析（次数・PageRank・媒介中心性・連結成分・橋・関節点）の事前計算')
+    parser.add_argument('--graph-dir', type=Path, default=Path('webui/public'))
+    parser.add_argument('--graph', type=Path, action='append', default=None,
+                        help='分析するグラフファイル（複数指定可、省略時は --graph-dir 内のすべて）')
+    parser.add_argument('--cache', type=Path, default=DEFAULT_CACHE_PATH, help='グラフハッシュ別の結果キャッシュ')
+    parser.add_argument('--no-write', action='store_true', help='グラフファイルに書き込まず表示だけする')
+    args = parser.parse_args()
+
+    graph_files = args.graph or iter_target_files(args.graph_dir)
+    cache = load_cache(args.cache)
+    hits = 0
+    print(f"{'graph':<24} {'nodes':>6} {'edges':>6} {'comps':>6} {'bridges':>8} {'artic.':>7}  top concept")
+    for graph_file in graph_files:
+        analytics, cached = analyze_graph_file(graph_file, cache, write=not args.no_write)
+        hits += cached
+        summary = analytics['summary']
+        top = max(analytics['nodes'].items(), key=lambda item: item[1]['pagerank'], default=(None, None))[0]
+        print(f"{graph_file.stem:<24} {summary['num_nodes']:>6} {summary['num_edges']:>6} "
+              f"{summary['num_components']:>6} {summary['num_bridges']:>8} "
+              f"{summary['num_articulation_points']:>7}  {top or '-'}")
+    save_cache(args.cache, cache, iter_target_files(args.graph_dir) + list(args.graph or []))
+    print(f"\nAnalyzed {len(graph_files)} graphs ({hits} from cache)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+グラフデータのSQLiteストア（FTS5全文検索付き）
+
+セクション・概念・エイリアス・エッジ・証拠（原文中の文字オフセット付き）・
+章間リンクを1つのSQLiteファイルにまとめ、ラベル・定義・証拠テキストを
+FTS5で全文検索できるようにする。日本語は分かち書きせず、文字バイグラムを
+トークンとして索引するので外部のトークナイザは不要。
+既存のJSONファイル（graph_*.json, graph_merged.json, cross_chapter_links.json）は
+エクスポータで再生成できる。
+
+    python graph_store.py import
+    python graph_store.py search 投票
+    python graph_store.py export --out-dir webui/public
+"""
+import argparse
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import section_id_from_graph_file
+
+DEFAULT_DB_PATH = Path('graph_store.sqlite')
+CROSS_LINKS_NAME = 'cross_chapter_links'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS graphs (
+    name TEXT PRIMARY KEY,          -- 例: graph_sec3-0, graph_merged
+    path TEXT,
+    section_id TEXT,
+    extra TEXT NOT NULL DEFAULT '{}' -- nodes / edges 以外のトップレベル要素（metadata など）
+);
+CREATE TABLE IF NOT EXISTS sections (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    source_path TEXT
+);
+CREATE TABLE IF NOT EXISTS concepts (
+    pk INTEGER PRIMARY KEY,
+    graph TEXT NOT NULL REFERENCES graphs(name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    section_id TEXT,
+    label TEXT,
+    tier TEXT,
+    definition TEXT,
+    original_id TEXT,
+    data TEXT NOT NULL              -- 元のノード辞書（エクスポート用）
+);
+CREATE INDEX IF NOT EXISTS idx_concepts_graph ON concepts(graph, position);
+CREATE INDEX IF NOT EXISTS idx_concepts_id ON concepts(id);
+CREATE INDEX IF NOT EXISTS idx_concepts_section ON concepts(section_id);
+CREATE INDEX IF NOT EXISTS idx_concepts_label ON concepts(label);
+CREATE TABLE IF NOT EXISTS aliases (
+    concept_pk INTEGER NOT NULL REFERENCES concepts(pk) ON DELETE CASCADE,
+    alias TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_aliases_alias ON aliases(alias);
+CREATE INDEX IF NOT EXISTS idx_aliases_concept ON aliases(concept_pk);
+CREATE TABLE IF NOT EXISTS edges (
+    pk INTEGER PRIMARY KEY,
+    graph TEXT NOT NULL REFERENCES graphs(name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    relation TEXT,
+    relation_description TEXT,
+    confidence REAL,
+    section_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_edges_graph ON edges(graph, position);
+CREATE INDEX IF NOT EXISTS idx_edges_source ON edges(graph, source);
+CREATE INDEX IF NOT EXISTS idx_edges_target ON edges(graph, target);
+CREATE TABLE IF NOT EXISTS evidence (
+    pk INTEGER PRIMARY KEY,
+    concept_pk INTEGER REFERENCES concepts(pk) ON DELETE CASCADE,
+    edge_pk INTEGER REFERENCES edges(pk) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    source_path TEXT,
+    char_start INTEGER,             -- 原文中の開始位置（見つからなければ NULL）
+    char_end INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_evidence_concept ON evidence(concept_pk);
+CREATE INDEX IF NOT EXISTS idx_evidence_edge ON evidence(edge_pk);
+CREATE TABLE IF NOT EXISTS cross_links (
+    pk INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    source_section TEXT,
+    source_concept TEXT,
+    target_section TEXT,
+    target_concept TEXT,
+    relation TEXT,
+    relation_description TEXT,
+    confidence REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cross_links_source ON cross_links(source_section, source_concept);
+CREATE INDEX IF NOT EXISTS idx_cross_links_target ON cross_links(target_section, target_concept);
+CREATE VIRTUAL TABLE IF NOT EXISTS concepts_fts USING fts5(label, aliases, definition);
+CREATE VIRTUAL TABLE IF NOT EXISTS evidence_fts USING fts5(text);
+"""
+
+SourceResolver = Callable[[Optional[str]], List[Tuple[str, str]]]
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """ストアを開き、必要ならスキーマを作成する"""
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def fts_tokens(text: str) -> List[str]:
+    """FTS用のトークン列（単語文字の連なりごとの文字バイグラム）"""
+    tokens = []
+    for run in re.findall(r'\w+', unicodedata.normalize('NFKC', text or '').lower()):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i+2] for i in range(len(run) - 1))
+    return tokens
+
+
+def fts_text(text: str) -> str:
+    return ' '.join(fts_tokens(text))
+
+
+def fts_query(query: str) -> Optional[str]:
+    """検索語をFTS5のフレーズ検索に変換（1文字の語を含む場合は None）"""
+    phrases = []
+    for run in re.findall(r'\w+', unicodedata.normalize('NFKC', query).lower()):
+        if len(run) < 2:
+            return None
+        phrases.append('"' + ' '.join(fts_tokens(run)) + '"')
+    return ' AND '.join(phrases) if phrases else None
+
+
+def evidence_text_of(item: Any) -> str:
+    return item.get('text', '') if isinstance(item, dict) else str(item)
+
+
+def locate_evidence(text: str, sources: List[Tuple[str, str]]) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+    """証拠テキストの原文中の位置を (ソースパス, 開始, 終了) で返す"""
+    for source_path, source_text in sources:
+        start = source_text.find(text)
+        if start != -1:
+            return source_path, start, start + len(text)
+    return None, None, None
+
+
+def find_section_source(section_id: str, input_dirs: Iterable[Path]) -> Optional[Path]:
+    """セクションIDに対応する原文Markdownを探す（3-0 -> input/3-0-*.md, extra-1 -> extra-input/1.md）"""
+    if section_id.startswith('extra-'):
+        patterns = [f"{section_id.split('-', 1)[1]}.md"]
+    else:
+        patterns = [f"{section_id}-*.md", f"{section_id}.md"]
+    for input_dir in input_dirs:
+        if not input_dir.exists():
+            continue
+        for pattern in patterns:
+            matches = sorted(input_dir.glob(pattern))
+            if matches:
+                return matches[0]
+    return None
+
+
+def section_source_resolver(input_dirs: Iterable[Path]) -> SourceResolver:
+    """セクションID -> [(パス, 本文)] を返す関数（結果はキャッシュする）"""
+    input_dirs = list(input_dirs)
+    cache: Dict[Optional[str], List[Tuple[str, str]]] = {}
+
+    def resolve(section_id: Optional[str]) -> List[Tuple[str, str]]:
+        if section_id not in cache:
+            path = find_section_source(section_id, input_dirs) if section_id else None
+            cache[section_id] = [(str(path), path.read_text(encoding='utf-8'))] if path else []
+        return cache[section_id]
+
+    return resolve
+
+
+def store_section(conn: sqlite3.Connection, section_id: str, title: Optional[str] = None,
+                  source_path: Optional[str] = None):
+    conn.execute(
+        "INSERT INTO sections(id, title, source_path) VALUES (?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET title = COALESCE(excluded.title, title), "
+        "source_path = COALESCE(excluded.source_path, source_path)",
+        (section_id, title, source_path))
+
+
+def _delete_graph(conn: sqlite3.Connection, name: str):
+    conn.execute("DELETE FROM concepts_fts WHERE rowid IN (SELECT pk FROM concepts WHERE graph = ?)", (name,))
+    conn.execute("DELETE FROM evidence_fts WHERE rowid IN (SELECT e.pk FROM evidence e "
+                 "JOIN concepts c ON e.concept_pk = c.pk WHERE c.graph = ?)", (name,))
+    conn.execute("DELETE FROM evidence_fts WHERE rowid IN (SELECT e.pk FROM evidence e "
+                 "JOIN edges d ON e.edge_pk = d.pk WHERE d.graph = ?)", (name,))
+    conn.execute("DELETE FROM graphs WHERE name = ?", (name,))
+
+
+def _insert_evidence(conn: sqlite3.Connection, items: List[Any], sources: List[Tuple[str, str]],
+                     concept_pk: Optional[int] = None, edge_pk: Optional[int] = None):
+    for position, item in enumerate(items):
+        text = evidence_text_of(item)
+        source_path, start, end = locate_evidence(text, sources) if text else (None, None, None)
+        cur = conn.execute(
+            "INSERT INTO evidence(concept_pk, edge_pk, position, text, source_path, char_start, char_end) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (concept_pk, edge_pk, position, text, source_path, start, end))
+        conn.execute("INSERT INTO evidence_fts(rowid, text) VALUES (?, ?)", (cur.lastrowid, fts_text(text)))
+
+
+def store_graph(conn: sqlite3.Connection, name: str, graph: Dict[str, Any], section_id: Optional[str] = None,
+                path: Optional[str] = None, resolve_source: Optional[SourceResolver] = None):
+    """グラフ1つ分をストアに書き込む（同名のグラフは置き換える）"""
+    resolve_source = resolve_source or (lambda _: [])
+    with conn:
+        _delete_graph(conn, name)
+        extra = {key: value for key, value in graph.items() if key not in ('nodes', 'edges')}
+        conn.execute("INSERT INTO graphs(name, path, section_id, extra) VALUES (?, ?, ?, ?)",
+                     (name, path, section_id, json.dumps(extra, ensure_ascii=False)))
+
+        for position, node in enumerate(graph.get('nodes', [])):
+            node_section = node.get('source_section') or section_id
+            aliases = list(node.get('aliases') or [])
+            cur = conn.execute(
+                "INSERT INTO concepts(graph, position, id, section_id, label, tier, definition, original_id, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, position, node.get('id', ''), node_section, node.get('label'), node.get('tier'),
+                 node.get('definition'), node.get('original_id'), json.dumps(node, ensure_ascii=False)))
+            concept_pk = cur.lastrowid
+            conn.executemany("INSERT INTO aliases(concept_pk, alias) VALUES (?, ?)",
+                             [(concept_pk, alias) for alias in aliases])
+            conn.execute("INSERT INTO concepts_fts(rowid, label, aliases, definition) VALUES (?, ?, ?, ?)",
+                         (concept_pk, fts_text(node.get('label', '')), fts_text(' '.join(aliases)),
+                          fts_text(node.get('definition') or '')))
+            _insert_evidence(conn, node.get('evidence', []), resolve_source(node_section), concept_pk=concept_pk)
+
+        for position, edge in enumerate(graph.get('edges', [])):
+            edge_section = edge.get('source_section') or section_id
+            cur = conn.execute(
+                "INSERT INTO edges(graph, position, source, target, relation, relation_description, confidence, "
+                "section_id, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, position, edge.get('source', ''), edge.get('target', ''), edge.get('relation'),
+                 edge.get('relation_description'), edge.get('confidence'), edge_section,
+                 json.dumps(edge, ensure_ascii=False)))
+            _insert_evidence(conn, edge.get('evidence', []), resolve_source(edge_section), edge_pk=cur.lastrowid)
+
+
+def store_cross_chapter_links(conn: sqlite3.Connection, data: Dict[str, Any], path: Optional[str] = None):
+    """cross_chapter_links.json の内容をストアに書き込む（既存の章間リンクは置き換える）"""
+    with conn:
+        conn.execute("DELETE FROM cross_links")
+        conn.execute("DELETE FROM graphs WHERE name = ?", (CROSS_LINKS_NAME,))
+        extra = {key: value for key, value in data.items() if key != 'cross_chapter_links'}
+        conn.execute("INSERT INTO graphs(name, path, section_id, extra) VALUES (?, ?, NULL, ?)",
+                     (CROSS_LINKS_NAME, path, json.dumps(extra, ensure_ascii=False)))
+        conn.executemany(
+            "INSERT INTO cross_links(position, source_section, source_concept, target_section, target_concept, "
+            "relation, relation_description, confidence, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(position, str(link.get('source_section', '')), link.get('source_concept'),
+              str(link.get('target_section', '')), link.get('target_concept'), link.get('relation'),
+              link.get('relation_description'), link.get('confidence'), json.dumps(link, ensure_ascii=False))
+             for position, link in enumerate(data.get('cross_chapter_links', []))])
+
+
+def import_graph_file(conn: sqlite3.Connection, graph_file: Path, resolve_source: Optional[SourceResolver] = None):
+    """graph_*.json を1つ取り込む（セクションIDはファイル名から推定）"""
+    with open(graph_file, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    section_id = section_id_from_graph_file(graph_file.name) or None
+    if section_id and resolve_source:
+        sources = resolve_source(section_id)
+        store_section(conn, section_id, source_path=sources[0][0] if sources else None)
+    store_graph(conn, graph_file.stem, graph, section_id=section_id, path=str(graph_file),
+                resolve_source=resolve_source)
+
+
+def import_artifacts(conn: sqlite3.Connection, graph_dir: Path, links_file: Optional[Path],
+                     input_dirs: Iterable[Path]) -> int:
+    """ディレクトリ内のグラフファイルと章間リンクをまとめて取り込む"""
+    resolve_source = section_source_resolver(input_dirs)
+    count = 0
+    for graph_file in sorted(graph_dir.glob('graph*.json')):
+        import_graph_file(conn, graph_file, resolve_source)
+        count += 1
+    if links_file and links_file.exists():
+        with open(links_file, 'r', encoding='utf-8') as f:
+            store_cross_chapter_links(conn, json.load(f), str(links_file))
+    return count
+
+
+def load_graph(conn: sqlite3.Connection, name: str) -> Dict[str, Any]:
+    """ストアからグラフを元のJSON構造で復元する"""
+    row = conn.execute("SELECT extra FROM graphs WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise KeyError(name)
+    graph = {
+        'nodes': [json.loads(r['data']) for r in conn.execute(
+            "SELECT data FROM concepts WHERE graph = ? ORDER BY position", (name,))],
+        'edges': [json.loads(r['data']) for r in conn.execute(
+            "SELECT data FROM edges WHERE graph = ? ORDER BY position", (name,))],
+    }
+    graph.update(json.loads(row['extra']))
+    return graph
+
+
+def load_cross_chapter_links(conn: sqlite3.Connection) -> Dict[str, Any]:
+    row = conn.execute("SELECT extra FROM graphs WHERE name = ?", (CROSS_LINKS_NAME,)).fetchone()
+    data = {'cross_chapter_links': [json.loads(r['data']) for r in conn.execute(
+        "SELECT data FROM cross_links ORDER BY position")]}
+    if row is not None:
+        data.update(json.loads(row['extra']))
+    return data
+
+
+def export_all(conn: sqlite3.Connection, out_dir: Path) -> List[Path]:
+    """ストア内の全グラフと章間リンクをJSONファイルとして書き出す"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for row in conn.execute("SELECT name FROM graphs ORDER BY name").fetchall():
+        name = row['name']
+        data = load_cross_chapter_links(conn) if name == CROSS_LINKS_NAME else load_graph(conn, name)
+        output_path = out_dir / f"{name}.json"
+        output_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        written.append(output_path)
+    return written
+
+
+def search(conn: sqlite3.Connection, query: str, graph: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """ラベル・エイリアス・定義・証拠のいずれかに query を含む概念を返す"""
+    fts = fts_query(query)
+    if fts is not None:
+        # バイグラムのフレーズ一致は候補の絞り込みに使い、最後に部分文字列で確かめる
+        candidate_sql = (
+            "SELECT rowid AS pk FROM concepts_fts WHERE concepts_fts MATCH :fts "
+            "UNION SELECT e.concept_pk FROM evidence_fts f JOIN evidence e ON e.pk = f.rowid "
+            "WHERE evidence_fts MATCH :fts AND e.concept_pk IS NOT NULL"
+        )
+    else:
+        candidate_sql = (
+            "SELECT pk FROM concepts WHERE label LIKE :like OR definition LIKE :like "
+            "UNION SELECT concept_pk FROM aliases WHERE alias LIKE :like "
+            "UNION SELECT concept_pk FROM evidence WHERE concept_pk IS NOT NULL AND text LIKE :like"
+        )
+    sql = (f"SELECT c.pk, c.graph, c.id, c.section_id, c.label, c.definition FROM concepts c "
+           f"WHERE c.pk IN ({candidate_sql})")
+    params: Dict[str, Any] = {'fts': fts, 'like': f"%{query}%"}
+    if graph:
+        sql += " AND c.graph = :graph"
+        params['graph'] = graph
+    sql += " ORDER BY c.graph, c.position"
+
+    needle = unicodedata.normalize('NFKC', query).lower()
+    results = []
+    for row in conn.execute(sql, params):
+        fields = {'label': row['label'] or '', 'definition': row['definition'] or ''}
+        fields['aliases'] = ' '.join(r['alias'] for r in conn.execute(
+            "SELECT alias FROM aliases WHERE concept_pk = ?", (row['pk'],)))
+        evidence_rows = conn.execute(
+            "SELECT text, source_path, char_start FROM evidence WHERE concept_pk = ? ORDER BY position",
+            (row['pk'],)).fetchall()
+        matched = [name for name, value in fields.items()
+                   if needle in unicodedata.normalize('NFKC', value).lower()]
+        hits = [r for r in evidence_rows if needle in unicodedata.normalize('NFKC', r['text']).lower()]
+        if hits:
+            matched.append('evidence')
+        if not matched:
+            continue
+        results.append({
+            'graph': row['graph'],
+            'id': row['id'],
+            'section_id': row['section_id'],
+            'label': row['label'],
+            'matched': matched,
+            'evidence': [{'text': r['text'], 'source_path': r['source_path'], 'char_start': r['char_start']}
+                         for r in hits],
+        })
+        if len(results) >= limit:
+            break
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='グラフデータのSQLiteストア')
+    parser.add_argument('command', choices=['import', 'search', 'export'])
+    parser.add_argument('query', nargs='?', help='search の検索語')
+    parser.add_argument('--db', type=Path, default=DEFAULT_DB_PATH, help='SQLiteファイル')
+    parser.add_argument('--graph-dir', type=Path, default=Path('webui/public'))
+    parser.add_argument('--links', type=Path, default=Path('cross_chapter_links.json'))
+    parser.add_argument('--input-dir', type=Path, action='append', default=None,
+                        help='証拠のオフセットを求める原文ディレクトリ（複数指定可）')
+    parser.add_argument('--graph', help='search 対象のグラフ名（例: graph_merged）')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--out-dir', type=Path, default=Path('export'), help='export の出力先')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+
+    if args.command == 'import':
+        input_dirs = args.input_dir or [Path('input'), Path('extra-input')]
+        start = time.perf_counter()
+        count = import_artifacts(conn, args.graph_dir, args.links, input_dirs)
+        stats = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                 for table in ('concepts', 'edges', 'evidence', 'cross_links')}
+        located = conn.execute("SELECT COUNT(*) FROM evidence WHERE char_start IS NOT NULL").fetchone()[0]
+        print(f"Imported {count} graph files into {args.db} in {time.perf_counter() - start:.2f}s")
+        print(f"  concepts: {stats['concepts']}, edges: {stats['edges']}, "
+              f"evidence: {stats['evidence']} ({located} located in source), cross links: {stats['cross_links']}")
+        return 0
+
+    if args.command == 'search':
+        if not args.query:
+            print("Error: 検索語を指定してください")
+            return 1
+        start = time.perf_counter()
+        results = search(conn, args.query, args.graph, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(results)} concepts matching '{args.query}' ({elapsed:.1f} ms)")
+        for result in results:
+            print(f"  [{result['graph']}] {result['label']} (sec{result['section_id']}) "
+                  f"- {', '.join(result['matched'])}")
+        return 0
+
+    written = export_all(conn, args.out_dir)
+    print(f"Exported {len(written)} files to {args.out_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
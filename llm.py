@@ -1,33 +1,177 @@
-import os, json, requests
+import os, json, time, hashlib, threading, requests
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Type
 from dotenv import load_dotenv
+from requests.structures import CaseInsensitiveDict
+
+from schemas import PARSE_METRICS, Payload, parse_payload, response_format as schema_response_format
 
 load_dotenv()
 
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 TIMEOUT = 120
+# Optional second endpoint for hedged duplicates (defaults to OPENAI_BASE_URL)
+OPENAI_HEDGE_BASE_URL = os.getenv("OPENAI_HEDGE_BASE_URL", "")
+OPENAI_HEDGE_API_KEY = os.getenv("OPENAI_HEDGE_API_KEY", "") or OPENAI_API_KEY
+HEDGE_MIN_SAMPLES = 20  # latencies needed before the p95 is trusted enough to hedge on
+# Record/replay: LLM_RECORD appends every HTTP exchange to a JSON-lines archive, LLM_REPLAY answers
+# from one instead of the network; LLM_REPLAY_LATENCY scales the recorded latencies (0: don't wait)
+LLM_RECORD = os.getenv("LLM_RECORD", "")
+LLM_REPLAY = os.getenv("LLM_REPLAY", "")
+LLM_REPLAY_LATENCY = float(os.getenv("LLM_REPLAY_LATENCY", "0") or 0)
+
+# Requests run here when a deadline or hedging is on; a request that loses or
+# misses its deadline can't be aborted, but its socket timeout is capped at the
+# caller's deadline so it gives its slot back once nobody is waiting for it
+_REQUEST_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+def cached_prompt_tokens(usage: Dict) -> int:
+    """Prompt tokens served from the provider's prefix cache (0 if not reported)."""
+    details = usage.get("prompt_tokens_details") or {}
+    # OpenAI reports prompt_tokens_details.cached_tokens; some compatible servers use prompt_cache_hit_tokens
+    return int(details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0)
+
+def request_key(body: Dict) -> str:
+    """Stable id of a request: model, messages and response_format (sampling settings are ignored)."""
+    canonical = json.dumps({k: body.get(k) for k in ("model", "messages", "response_format")},
+                           ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class FixtureMiss(requests.RequestException):
+    """Replay found no recorded response for a request."""
+
+class FixtureArchive:
+    """JSON-lines archive of HTTP exchanges: {key, model, messages, response_format, status, headers, body, latency} per line.
+
+    mode "record" appends; mode "replay" serves the recordings. Identical requests are answered
+    in recorded order (e.g. a 400 and then the 200 of the retry); past the last recording of a
+    request, the last one is served again.
+    """
+    def __init__(self, path: Path, mode: str, latency_scale: float = 0.0):
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._served: Counter = Counter()
+        self.entries: Dict[str, List[Dict]] = defaultdict(list)
+        if mode == "replay":
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]].append(entry)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(self, body: Dict, r: requests.Response, latency: float):
+        entry = {
+            "key": request_key(body), "model": body.get("model"), "messages": body.get("messages"),
+            "response_format": body.get("response_format"), "status": r.status_code,
+            "headers": {k: v for k, v in r.headers.items() if k.lower().startswith(("x-ratelimit", "retry-after"))},
+            "body": r.text, "latency": round(latency, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def replay(self, body: Dict) -> requests.Response:
+        key = request_key(body)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise FixtureMiss(f"No recorded response for {body.get('model')} request {key[:12]} in {self.path}")
+            entry = entries[min(self._served[key], len(entries) - 1)]
+            self._served[key] += 1
+        if self.latency_scale:
+            time.sleep(entry.get("latency", 0.0) * self.latency_scale)
+        r = requests.Response()
+        r.status_code = entry["status"]
+        r.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        r._content = entry["body"].encode("utf-8")
+        r.encoding = "utf-8"
+        r.url = f"replay://{self.path.name}/{key[:12]}"
+        return r
+
+_DEFAULT_ARCHIVE: Optional[FixtureArchive] = None
+
+def default_archive() -> Optional[FixtureArchive]:
+    """Archive configured by LLM_REPLAY / LLM_RECORD (loaded once), or None."""
+    global _DEFAULT_ARCHIVE
+    if _DEFAULT_ARCHIVE is None and (LLM_REPLAY or LLM_RECORD):
+        _DEFAULT_ARCHIVE = (FixtureArchive(Path(LLM_REPLAY), "replay", LLM_REPLAY_LATENCY) if LLM_REPLAY
+                            else FixtureArchive(Path(LLM_RECORD), "record"))
+    return _DEFAULT_ARCHIVE
+
+class LatencyTracker:
+    """Latencies of recent successful requests, for percentile estimates."""
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-quantile of the window, or None until HEDGE_MIN_SAMPLES latencies are in."""
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
 
 class ChatCompletionsClient:
-    """Minimal Chat Completions API client (OpenAI互換)"""
-    def __init__(self, model: str = "gpt-4o-mini"):
+    """Minimal Chat Completions API client (OpenAI互換)
+
+    deadline: seconds a call may take in total before requests.Timeout is raised (default: TIMEOUT per socket read).
+    hedge: when a request hasn't answered within the tracked p95 latency, send a duplicate
+    (to hedge_base_url if set) and use whichever succeeds first. hedge_budget caps duplicates
+    as a fraction of requests.
+    archive: FixtureArchive to record to or replay from (default: from LLM_RECORD / LLM_REPLAY).
+    """
+    def __init__(self, model: str = "gpt-4o-mini", deadline: Optional[float] = None, hedge: bool = False,
+                 hedge_base_url: Optional[str] = None, hedge_budget: float = 0.05,
+                 archive: Optional[FixtureArchive] = None):
         self.model = model
+        self.usage = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "latency": 0.0,
+                      "parse_failures": 0, "timeouts": 0, "requests": 0, "hedged": 0, "hedge_wins": 0}
+        self.last_usage: Dict = {}
+        self._lock = threading.Lock()
+        # Flipped off the first time the server rejects response_format
+        self.supports_json_schema = True
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_base_url = hedge_base_url or OPENAI_HEDGE_BASE_URL or OPENAI_BASE_URL
+        self.hedge_budget = hedge_budget
+        self.latencies = LatencyTracker()
+        self.archive = archive or default_archive()
 
     def complete(self, prompt: str, expect_json: bool = True) -> str:
-        url = f"{OPENAI_BASE_URL}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-        }
         system = "You are a careful assistant. Respond in strict JSON if asked."
         user = f"Return ONLY valid JSON. No commentary. Prompt:\n{prompt}" if expect_json else prompt
+        return self.chat([{"role":"system","content":system},{"role":"user","content":user}])
+
+    def chat(self, messages: List[Dict[str, str]], response_format: Optional[Dict] = None) -> str:
+        """Send prebuilt messages as-is (see prompts.section_messages for the cache-friendly layout)."""
         body = {
             "model": self.model,
-            "messages": [{"role":"system","content":system},{"role":"user","content":user}],
+            "messages": messages,
         }
         # Some models don't support custom temperature
         if not self.model.startswith("gpt-5"):
             body["temperature"] = 0.2
-        r = requests.post(url, headers=headers, json=body, timeout=TIMEOUT)
+        if response_format and self.supports_json_schema:
+            body["response_format"] = response_format
+        start = time.perf_counter()
+        r = self._post(body)
+        if r.status_code == 400 and "response_format" in body and ("response_format" in r.text or "json_schema" in r.text):
+            # Server doesn't do structured outputs: fall back to prompt-only JSON from now on
+            self.supports_json_schema = False
+            del body["response_format"]
+            r = self._post(body)
         if r.status_code == 429:
             print("429 body:", r.text)
             print("rate headers:", {k:v for k,v in r.headers.items() if k.lower().startswith("x-ratelimit")})
@@ -35,4 +179,128 @@ class ChatCompletionsClient:
             print("400 body:", r.text)
         r.raise_for_status()
         data = r.json()
+        self._record_usage(data.get("usage") or {}, time.perf_counter() - start)
         return data["choices"][0]["message"]["content"]
+
+    def _send(self, base_url: str, api_key: str, body: Dict,
+              deadline: Optional[float] = None) -> requests.Response:
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        start = time.perf_counter()
+        if self.archive is not None and self.archive.mode == "replay":
+            r = self.archive.replay(body)
+        else:
+            timeout = TIMEOUT if deadline is None else min(TIMEOUT, max(0.001, deadline - time.monotonic()))
+            r = requests.post(f"{base_url}/chat/completions", headers=headers, json=body, timeout=timeout)
+            if self.archive is not None:
+                self.archive.record(body, r, time.perf_counter() - start)
+        if r.ok:
+            self.latencies.add(time.perf_counter() - start)
+        return r
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if (self.usage["hedged"] + 1) / self.usage["requests"] > self.hedge_budget:
+                return False
+            self.usage["hedged"] += 1
+            return True
+
+    def _post(self, body: Dict) -> requests.Response:
+        """POST with the deadline and hedging policy; returns the first successful response."""
+        with self._lock:
+            self.usage["requests"] += 1
+        if not self.hedge and self.deadline is None:
+            return self._send(OPENAI_BASE_URL, OPENAI_API_KEY, body)
+
+        limit = self.deadline or TIMEOUT
+        deadline = time.monotonic() + limit
+        primary = _REQUEST_POOL.submit(self._send, OPENAI_BASE_URL, OPENAI_API_KEY, body, deadline)
+        pending = {primary}
+        hedge_after = self.latencies.percentile(0.95) if self.hedge else None
+        if hedge_after is not None:
+            done, pending = wait(pending, timeout=min(hedge_after, limit))
+            if not done and self._take_hedge():
+                api_key = OPENAI_HEDGE_API_KEY if self.hedge_base_url != OPENAI_BASE_URL else OPENAI_API_KEY
+                pending.add(_REQUEST_POOL.submit(self._send, self.hedge_base_url, api_key, body, deadline))
+            pending |= done
+
+        first_failure = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    r = future.result()
+                except requests.RequestException as e:
+                    first_failure = first_failure or e
+                    continue
+                if r.ok:
+                    if future is not primary:
+                        with self._lock:
+                            self.usage["hedge_wins"] += 1
+                    return r
+                first_failure = first_failure or r
+        if pending or first_failure is None:
+            raise requests.Timeout(f"No response from {self.model} within {limit:.1f}s")
+        if isinstance(first_failure, Exception):
+            raise first_failure
+        return first_failure
+
+    def complete_structured(self, messages: List[Dict[str, str]], payload_cls: Type[Payload],
+                            retries: int = 1) -> Payload:
+        """Request a response matching payload_cls (JSON-schema mode when supported).
+
+        Malformed output is repaired locally before spending a retry, and a missed deadline
+        spends one too; after the last failed attempt an empty payload is returned (and counted
+        in parse_failures, so routing escalates the section) so one bad call doesn't stop a run.
+        """
+        fmt = schema_response_format(payload_cls)
+        text = ""
+        for attempt in range(retries + 1):
+            try:
+                text = self.chat(messages, response_format=fmt)
+            except requests.Timeout as e:
+                with self._lock:
+                    self.usage["timeouts"] += 1
+                print(f"{e} (attempt {attempt + 1}/{retries + 1})")
+                continue
+            payload, outcome = parse_payload(text, payload_cls)
+            if payload is not None:
+                PARSE_METRICS.record(self.model, outcome)
+                return payload
+            if attempt < retries:
+                PARSE_METRICS.record(self.model, "retried")
+        PARSE_METRICS.record(self.model, "failed")
+        with self._lock:
+            self.usage["parse_failures"] += 1
+        print(f"No usable {payload_cls.__name__} from {self.model}: {text[:200]!r}")
+        return payload_cls()
+
+    def _record_usage(self, usage: Dict, latency: float):
+        last = {
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "cached_tokens": cached_prompt_tokens(usage),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "latency": latency,
+        }
+        with self._lock:
+            self.last_usage = last
+            self.usage["calls"] += 1
+            for key, value in last.items():
+                self.usage[key] += value
+
+    def usage_summary(self) -> str:
+        u = self.usage
+        rate = u["cached_tokens"] / u["prompt_tokens"] if u["prompt_tokens"] else 0.0
+        summary = (f"{u['calls']} calls, {u['prompt_tokens']} prompt tokens "
+                   f"({u['cached_tokens']} cached, {rate:.0%}), {u['completion_tokens']} completion tokens, "
+                   f"{u['latency']:.1f}s in requests")
+        if u["hedged"]:
+            summary += f", {u['hedged']} hedged ({u['hedge_wins']} won)"
+        if u["timeouts"]:
+            summary += f", {u['timeouts']} timed out"
+        return summary
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+セクションのマニフェスト（セクションID -> 原文Markdown・グラフ成果物）
+
+処理スクリプトがセクションを処理するたびに、原文と生成したグラフのパス・
+ハッシュ・更新時刻を sections_manifest.json に記録する。各ツールは
+リポジトリ全体を再帰的に探す代わりに、このマニフェストでファイルを引く。
+マニフェストがない・古い（記録されたファイルが消えた）場合は、決まった
+ディレクトリだけを走査して作り直す（webui/node_modules などは見ない）。
+引くだけのときはメモリ上で作り直すだけで、ファイルに書くのは record_section と
+このスクリプトのコマンドだけ。
+
+    python manifest.py rebuild
+    python manifest.py check
+    python manifest.py show 3-0
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils import section_id_from_graph_file
+
+DEFAULT_MANIFEST_PATH = Path('sections_manifest.json')
+# 原文Markdownを置くディレクトリ（直下だけを見る）
+SOURCE_DIRS = [Path('input'), Path('extra-input'), Path('contents/japanese')]
+# グラフ成果物を置くディレクトリ（先に書いたものほど優先して解決する）
+GRAPH_DIRS = [Path('webui/public'), Path('output_all_sections')]
+# process_individual_files.py の出力（<base>/output-<セクションID>/graph.json）
+INDIVIDUAL_OUTPUT_DIRS = [Path('individual-outputs')]
+
+SECTION_ID_PATTERN = re.compile(r'^(\d+-\d+)')
+
+
+def file_hash(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def file_record(path: Path) -> Dict[str, Any]:
+    """パス・ハッシュ・更新時刻の記録"""
+    return {
+        'path': path.as_posix(),
+        'hash': file_hash(path),
+        'modified_at': datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec='seconds'),
+    }
+
+
+def section_id_from_source(path: Path) -> str:
+    """原文ファイルからセクションIDを得る（input/3-0-*.md -> 3-0, extra-input/1.md -> extra-1）"""
+    if path.parent.name == 'extra-input' and path.stem.isdigit():
+        return f"extra-{path.stem}"
+    match = SECTION_ID_PATTERN.match(path.stem)
+    return match.group(1) if match else ''
+
+
+def graph_file_name(section_id: str) -> str:
+    """webui/public に置くセクショングラフのファイル名（3-0 -> graph_sec3-0.json, extra-1 -> graph_extra-1.json）"""
+    return f"graph_{section_id}.json" if section_id.startswith('extra-') else f"graph_sec{section_id}.json"
+
+
+def section_id_from_graph(path: Path) -> str:
+    """グラフ成果物からセクションIDを得る（graph_sec3-0.json, graph_3-0-*.json, output-extra-1/graph.json）"""
+    section_id = section_id_from_graph_file(path.name)
+    if section_id:
+        return section_id
+    if path.name == 'graph.json' and path.parent.name.startswith('output-'):
+        return path.parent.name[len('output-'):]
+    if path.name.startswith('graph_'):
+        match = SECTION_ID_PATTERN.match(path.stem[len('graph_'):])
+        if match:
+            return match.group(1)
+    return ''
+
+
+class Manifest:
+    """セクションID -> {'source': 記録, 'graphs': [記録, ...], 'updated_at'} の対応表"""
+
+    def __init__(self, path: Path = DEFAULT_MANIFEST_PATH, sections: Optional[Dict[str, Dict]] = None):
+        self.path = path
+        self.sections: Dict[str, Dict[str, Any]] = sections or {}
+        self._rebuilt = False
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_MANIFEST_PATH) -> 'Manifest':
+        """マニフェストを読み込む（なければメモリ上で作り直す。保存はしない）"""
+        if not path.exists():
+            manifest = cls(path)
+            manifest.rebuild()
+            return manifest
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(path, data.get('sections', {}))
+
+    def save(self):
+        data = {
+            'version': 1,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'sections': dict(sorted(self.sections.items())),
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def record(self, section_id: str, source: Optional[Path] = None, graphs: Optional[List[Path]] = None):
+        """セクションの原文・グラフを記録する（既存の記録は同じパスだけ置き換える）"""
+        entry = self.sections.setdefault(section_id, {'source': None, 'graphs': []})
+        if source is not None and source.exists():
+            entry['source'] = file_record(source)
+        for graph in graphs or []:
+            if not graph.exists():
+                continue
+            record = file_record(graph)
+            entry['graphs'] = [g for g in entry['graphs'] if g['path'] != record['path']] + [record]
+            entry['graphs'].sort(key=lambda g: graph_priority(Path(g['path'])))
+        entry['updated_at'] = datetime.now().isoformat(timespec='seconds')
+
+    def rebuild(self):
+        """決まったディレクトリだけを走査してマニフェストを作り直す（保存は save で行う）"""
+        self.sections = {}
+        for source_dir in SOURCE_DIRS:
+            if source_dir.is_dir():
+                for source in sorted(source_dir.glob('*.md')):
+                    section_id = section_id_from_source(source)
+                    if section_id and not (self.sections.get(section_id) or {}).get('source'):
+                        self.record(section_id, source=source)
+        graph_files = [graph for graph_dir in GRAPH_DIRS if graph_dir.is_dir()
+                       for graph in sorted(graph_dir.glob('graph_*.json'))]
+        graph_files += [graph for output_dir in INDIVIDUAL_OUTPUT_DIRS if output_dir.is_dir()
+                        for graph in sorted(output_dir.glob('output-*/graph.json'))]
+        for graph in graph_files:
+            section_id = section_id_from_graph(graph)
+            if section_id:
+                self.record(section_id, graphs=[graph])
+        self._rebuilt = True
+
+    def stale_entries(self) -> List[str]:
+        """記録したファイルが消えた、または内容が変わったパスの一覧"""
+        stale = []
+        for entry in self.sections.values():
+            for record in ([entry['source']] if entry.get('source') else []) + entry.get('graphs', []):
+                path = Path(record['path'])
+                if not path.exists() or file_hash(path) != record['hash']:
+                    stale.append(record['path'])
+        return stale
+
+    def _lookup(self, section_id: str, key: str) -> Optional[Path]:
+        entry = self.sections.get(section_id) or {}
+        records = [entry['source']] if key == 'source' and entry.get('source') else entry.get(key, [])
+        for record in records:
+            path = Path(record['path'])
+            if path.exists():
+                return path
+        # 記録がない・ファイルが消えた場合は一度だけ作り直して引き直す
+        if not self._rebuilt:
+            self.rebuild()
+            return self._lookup(section_id, key)
+        return None
+
+    def source_path(self, section_id: str) -> Optional[Path]:
+        """セクションの原文Markdown"""
+        return self._lookup(section_id, 'source')
+
+    def graph_path(self, section_id: str) -> Optional[Path]:
+        """セクションのグラフ（webui/public のものを優先）"""
+        return self._lookup(section_id, 'graphs')
+
+
+def graph_priority(path: Path) -> int:
+    for i, graph_dir in enumerate(GRAPH_DIRS):
+        if graph_dir.as_posix() == path.parent.as_posix():
+            return i
+    return len(GRAPH_DIRS)
+
+
+_manifests: Dict[Path, Manifest] = {}
+
+
+def get_manifest(path: Path = DEFAULT_MANIFEST_PATH) -> Manifest:
+    """プロセス内で共有するマニフェスト"""
+    if path not in _manifests:
+        _manifests[path] = Manifest.load(path)
+    return _manifests[path]
+
+
+def resolve_source(section_id: str, fallback_dir: Optional[Path] = None,
+                   path: Path = DEFAULT_MANIFEST_PATH) -> Optional[Path]:
+    """セクションの原文Markdown
+
+    fallback_dir を渡すと extra-N はまずそこの N.md を見て、マニフェストにもなければ
+    fallback_dir/<セクションID>.md を返す（存在するかは呼び出し側で確かめる）。
+    """
+    if fallback_dir is not None and section_id.startswith('extra-'):
+        source_file = fallback_dir / f"{section_id[len('extra-'):]}.md"
+        if source_file.exists():
+            return source_file
+    source_file = get_manifest(path).source_path(section_id)
+    if source_file is None and fallback_dir is not None:
+        return fallback_dir / f"{section_id}.md"
+    return source_file
+
+
+def resolve_graph(section_id: str, path: Path = DEFAULT_MANIFEST_PATH) -> Optional[Path]:
+    return get_manifest(path).graph_path(section_id)
+
+
+def record_section(section_id: str, source: Optional[Path] = None, graphs: Optional[List[Path]] = None,
+                   path: Path = DEFAULT_MANIFEST_PATH):
+    """処理スクリプトから呼ぶ: セクションの成果物を記録して保存する"""
+    manifest = get_manifest(path)
+    manifest.record(section_id, source=source, graphs=graphs)
+    manifest.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='セクションのマニフェストの作成・確認')
+    parser.add_argument('command', choices=['rebuild', 'check', 'show'])
+    parser.add_argument('section_id', nargs='?', help='show で表示するセクションID')
+    parser.add_argument('--manifest', type=Path, default=DEFAULT_MANIFEST_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        start = time.perf_counter()
+        manifest = Manifest(args.manifest)
+        manifest.rebuild()
+        manifest.save()
+        graphs = sum(len(entry['graphs']) for entry in manifest.sections.values())
+        print(f"Rebuilt {args.manifest}: {len(manifest.sections)} sections, {graphs} graph files "
+              f"in {time.perf_counter() - start:.2f}s")
+        return 0
+
+    if not args.manifest.exists():
+        print(f"Error: {args.manifest} not found. Run 'rebuild' first.")
+        return 1
+    manifest = Manifest.load(args.manifest)
+
+    if args.command == 'check':
+        stale = manifest.stale_entries()
+        missing_source = sorted(s for s, entry in manifest.sections.items() if not entry.get('source'))
+        missing_graph = sorted(s for s, entry in manifest.sections.items() if not entry.get('graphs'))
+        print(f"{len(manifest.sections)} sections, {len(stale)} stale files")
+        for path in stale:
+            print(f"  stale: {path}")
+        if missing_source:
+            print(f"  no source: {', '.join(missing_source)}")
+        if missing_graph:
+            print(f"  no graph: {', '.join(missing_graph)}")
+        if stale:
+            print("Run 'python manifest.py rebuild' to refresh")
+        return 1 if stale else 0
+
+    if not args.section_id:
+        print("Error: セクションIDを指定してください")
+        return 1
+    entry = manifest.sections.get(args.section_id)
+    if entry is None:
+        print(f"Section {args.section_id} not in manifest")
+        return 1
+    print(json.dumps(entry, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -2,12 +2,19 @@
 """
 グラフファイルを結合し、ID衝突を回避するスクリプト
 """
+import argparse
+import hashlib
 import json
 import os
 from pathlib import Path
-from typing import Dict, List, Any, Set, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 from collections import defaultdict
 
+import graph_store
+from concept_lsh import ConceptLSHIndex
+from connectivity import UnionFind
+from utils import normalize_label, section_id_from_graph_file
+
 
 def load_graph(filepath: Path) -> Dict[str, Any]:
     """グラフファイルを読み込む"""
@@ -15,14 +22,6 @@ def load_graph(filepath: Path) -> Dict[str, Any]:
         return json.load(f)
 
 
-def extract_section_id(filename: str) -> str:
-    """ファイル名からセクションIDを抽出"""
-    # graph_sec0-2.json -> 0-2
-    if filename.startswith('graph_sec'):
-        return filename.replace('graph_sec', '').replace('.json', '')
-    return ''
-
-
 def check_id_collision(graphs: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
     """ID衝突をチェックして返す"""
     id_to_sections = defaultdict(list)
@@ -43,6 +42,28 @@ def create_unique_id(original_id: str, section_id: str) -> str:
     return f"{original_id}_sec{section_id}"
 
 
+def remap_node(node: Dict[str, Any], new_id: str, section_id: str) -> Dict[str, Any]:
+    """結合後のIDとソースセクションを記録したノードのコピーを返す"""
+    node_copy = node.copy()
+    node_copy['id'] = new_id
+    node_copy['original_id'] = node['id']  # 元のIDを保持
+    node_copy['source_section'] = section_id  # ソースセクションを記録
+    return node_copy
+
+
+def remap_edge(edge: Dict[str, Any], section_mapping: Dict[str, str], section_id: str) -> Dict[str, Any]:
+    """エッジの端点を結合後のIDに付け替えたコピーを返す"""
+    source = edge['source']
+    target = edge['target']
+    edge_copy = edge.copy()
+    edge_copy['source'] = section_mapping.get(source, source)
+    edge_copy['target'] = section_mapping.get(target, target)
+    edge_copy['original_source'] = source  # 元のIDを保持
+    edge_copy['original_target'] = target  # 元のIDを保持
+    edge_copy['source_section'] = section_id  # ソースセクションを記録
+    return edge_copy
+
+
 def merge_graphs(graph_files: List[Path]) -> Dict[str, Any]:
     """グラフファイルを結合"""
     merged = {
@@ -57,7 +78,7 @@ def merge_graphs(graph_files: List[Path]) -> Dict[str, Any]:
     # 各グラフを読み込み
     graphs = {}
     for filepath in graph_files:
-        section_id = extract_section_id(filepath.name)
+        section_id = section_id_from_graph_file(filepath.name)
         if section_id:
             graphs[section_id] = load_graph(filepath)
             merged['metadata']['merged_from'].append({
@@ -106,15 +127,9 @@ def merge_graphs(graph_files: List[Path]) -> Dict[str, Any]:
             if original_id:
                 new_id = section_mapping[original_id]
                 
-                # IDを更新
-                node_copy = node.copy()
-                node_copy['id'] = new_id
-                node_copy['original_id'] = original_id  # 元のIDを保持
-                node_copy['source_section'] = section_id  # ソースセクションを記録
-                
                 # 重複チェック（念のため）
                 if new_id not in all_node_ids:
-                    merged['nodes'].append(node_copy)
+                    merged['nodes'].append(remap_node(node, new_id, section_id))
                     all_node_ids.add(new_id)
     
     # エッジを結合
@@ -127,19 +142,10 @@ def merge_graphs(graph_files: List[Path]) -> Dict[str, Any]:
             target = edge.get('target')
             
             if source and target:
-                # ソースとターゲットのIDを更新
-                new_source = section_mapping.get(source, source)
-                new_target = section_mapping.get(target, target)
-                
-                edge_copy = edge.copy()
-                edge_copy['source'] = new_source
-                edge_copy['target'] = new_target
-                edge_copy['original_source'] = source  # 元のIDを保持
-                edge_copy['original_target'] = target  # 元のIDを保持
-                edge_copy['source_section'] = section_id  # ソースセクションを記録
+                edge_copy = remap_edge(edge, section_mapping, section_id)
                 
                 # エッジの重複チェック
-                edge_key = (new_source, new_target, edge.get('relation', ''))
+                edge_key = (edge_copy['source'], edge_copy['target'], edge.get('relation', ''))
                 if edge_key not in all_edges:
                     merged['edges'].append(edge_copy)
                     all_edges.add(edge_key)
@@ -155,6 +161,460 @@ def merge_graphs(graph_files: List[Path]) -> Dict[str, Any]:
     return merged
 
 
+def file_hash(filepath: Path) -> str:
+    """変更検出用のグラフ内容ハッシュ
+
+    graph_analytics.py が書き込む "analytics" は結合結果に影響しないので除外する
+    （分析結果の更新だけでインクリメンタル結合の状態が無効にならないように）。
+    """
+    graph = load_graph(filepath)
+    graph.pop('analytics', None)
+    content = json.dumps(graph, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def load_merge_state(state_path: Path) -> Dict[str, Any]:
+    """前回のインクリメンタル結合の状態を読み込む"""
+    if not state_path.exists():
+        return {}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_merge_state(state_path: Path, state: Dict[str, Any]):
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+
+def id_mapping_from_merged(merged: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """結合済みグラフから セクション -> (元のID -> 新しいID) の対応を復元"""
+    mapping: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for node in merged.get('nodes', []):
+        mapping[node['source_section']][node['original_id']] = node['id']
+    return dict(mapping)
+
+
+def build_merge_state(graph_files: List[Path], merged: Dict[str, Any], output_path: Path) -> Dict[str, Any]:
+    """次回のインクリメンタル結合のための状態を作る"""
+    files = {}
+    for filepath in graph_files:
+        section_id = section_id_from_graph_file(filepath.name)
+        if section_id:
+            files[section_id] = {'file': filepath.name, 'hash': file_hash(filepath)}
+    return {
+        'files': files,
+        'id_mapping': id_mapping_from_merged(merged),
+        'merged_hash': file_hash(output_path),
+    }
+
+
+def merge_with_state(graph_files: List[Path], output_path: Path, state: Dict[str, Any]) -> Dict[str, Any]:
+    """状態が前回の出力と一致すればインクリメンタルに、そうでなければ全体を結合する"""
+    if state and output_path.exists() and state.get('merged_hash') == file_hash(output_path):
+        return incremental_merge_graphs(graph_files, load_graph(output_path), state)
+    print("No usable merge state; running a full merge")
+    return merge_graphs(graph_files)
+
+
+def incremental_merge_graphs(graph_files: List[Path], previous: Dict[str, Any],
+                             state: Dict[str, Any]) -> Dict[str, Any]:
+    """変更されたセクションだけを読み直して結合する
+
+    変更のないセクションのノード・エッジは前回の結合結果をそのまま使い、
+    以前に割り当てたIDは可能な限り再利用する（レイアウトや章間リンクの
+    キャッシュが無効にならないように、既存ノードのIDは変えない）。
+    新たに衝突したIDは、変更されたセクション側のノードだけに接尾辞を付ける。
+    """
+    previous_files = state.get('files', {})
+    previous_mapping = state.get('id_mapping', {})
+
+    sections: List[Tuple[str, Path]] = []
+    for filepath in graph_files:
+        section_id = section_id_from_graph_file(filepath.name)
+        if section_id:
+            sections.append((section_id, filepath))
+    current_ids = {section_id for section_id, _ in sections}
+
+    hashes = {section_id: file_hash(filepath) for section_id, filepath in sections}
+    changed = [section_id for section_id, _ in sections
+               if previous_files.get(section_id, {}).get('hash') != hashes[section_id]]
+    removed = sorted(set(previous_files) - current_ids)
+    reused = [section_id for section_id, _ in sections if section_id not in changed]
+    changed_set = set(changed)
+
+    print(f"Incremental merge: {len(changed)} changed, {len(reused)} unchanged, {len(removed)} removed")
+
+    # 変更のないセクションの前回結果を取り出す
+    kept_nodes = defaultdict(list)
+    kept_edges = defaultdict(list)
+    for node in previous.get('nodes', []):
+        section_id = node.get('source_section')
+        if section_id in current_ids and section_id not in changed_set:
+            kept_nodes[section_id].append(node)
+    for edge in previous.get('edges', []):
+        section_id = edge.get('source_section')
+        if section_id in current_ids and section_id not in changed_set:
+            kept_edges[section_id].append(edge)
+
+    # 変更されたセクションだけを読み込む
+    graphs = {section_id: load_graph(filepath) for section_id, filepath in sections
+              if section_id in changed_set}
+
+    # 使用中のID（変更のないセクションが保持）と、元IDの出現セクション
+    taken_ids: Dict[str, str] = {}
+    original_sections: Dict[str, Set[str]] = defaultdict(set)
+    for section_id, nodes in kept_nodes.items():
+        for node in nodes:
+            taken_ids[node['id']] = section_id
+            original_sections[node['original_id']].add(section_id)
+    for section_id, graph in graphs.items():
+        for node in graph.get('nodes', []):
+            if node.get('id'):
+                original_sections[node['id']].add(section_id)
+
+    # 1巡目: 前回と同じIDを使えるノードはそのまま再利用
+    id_mapping: Dict[str, Dict[str, str]] = {section_id: {} for section_id in graphs}
+    for section_id, graph in graphs.items():
+        old_mapping = previous_mapping.get(section_id, {})
+        for node in graph.get('nodes', []):
+            original_id = node.get('id')
+            old_id = old_mapping.get(original_id) if original_id else None
+            if old_id and old_id not in taken_ids:
+                id_mapping[section_id][original_id] = old_id
+                taken_ids[old_id] = section_id
+
+    # 2巡目: 新しいノードに、衝突するIDだけ接尾辞付きで割り当てる
+    for section_id, graph in graphs.items():
+        for node in graph.get('nodes', []):
+            original_id = node.get('id')
+            if not original_id or original_id in id_mapping[section_id]:
+                continue
+            if original_id not in taken_ids and len(original_sections[original_id]) == 1:
+                new_id = original_id
+            else:
+                new_id = create_unique_id(original_id, section_id)
+                suffix = 2
+                while new_id in taken_ids:
+                    new_id = f"{create_unique_id(original_id, section_id)}_{suffix}"
+                    suffix += 1
+            id_mapping[section_id][original_id] = new_id
+            taken_ids[new_id] = section_id
+
+    merged = {
+        'nodes': [],
+        'edges': [],
+        'metadata': {
+            'merged_from': [{'section_id': section_id, 'file': filepath.name}
+                            for section_id, filepath in sections],
+            'total_sections': len(sections),
+        }
+    }
+
+    all_node_ids = set()
+    all_edges = set()
+    for section_id, _ in sections:
+        if section_id in graphs:
+            section_mapping = id_mapping[section_id]
+            nodes = [remap_node(node, section_mapping[node['id']], section_id)
+                     for node in graphs[section_id].get('nodes', []) if node.get('id')]
+            edges = [remap_edge(edge, section_mapping, section_id)
+                     for edge in graphs[section_id].get('edges', [])
+                     if edge.get('source') and edge.get('target')]
+        else:
+            nodes = kept_nodes[section_id]
+            edges = kept_edges[section_id]
+
+        for node in nodes:
+            if node['id'] not in all_node_ids:
+                merged['nodes'].append(node)
+                all_node_ids.add(node['id'])
+        for edge in edges:
+            edge_key = (edge['source'], edge['target'], edge.get('relation', ''))
+            if edge_key not in all_edges:
+                merged['edges'].append(edge)
+                all_edges.add(edge_key)
+
+    collisions = [id_ for id_, owners in original_sections.items() if len(owners) > 1]
+    merged['metadata']['statistics'] = {
+        'total_nodes': len(merged['nodes']),
+        'total_edges': len(merged['edges']),
+        'id_collisions_resolved': len(collisions),
+        'unique_node_ids': len(all_node_ids)
+    }
+    merged['metadata']['incremental'] = {
+        'remerged_sections': changed,
+        'reused_sections': reused,
+        'removed_sections': removed,
+    }
+    return merged
+
+
+class IncrementalJSONWriter:
+    """結合グラフを1要素ずつ書き出すライタ
+
+    json.dump(..., indent=2) と同じ書式の {"nodes": [...], "edges": [...], "metadata": {...}}
+    を出力するので、全体をメモリに載せずに既存の graph_merged.json と同じファイルが作れる。
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+        self.f.write('{')
+        self.first_key = True
+
+    def begin_array(self, key: str):
+        self.f.write(('\n' if self.first_key else ',\n') + f'  {json.dumps(key)}: [')
+        self.first_key = False
+        self.count = 0
+
+    def write_item(self, item: Dict[str, Any]):
+        text = json.dumps(item, ensure_ascii=False, indent=2).replace('\n', '\n    ')
+        self.f.write(('\n    ' if self.count == 0 else ',\n    ') + text)
+        self.count += 1
+
+    def end_array(self):
+        self.f.write('\n  ]' if self.count else ']')
+
+    def write_value(self, key: str, value: Any):
+        text = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+        self.f.write(('\n' if self.first_key else ',\n') + f'  {json.dumps(key)}: {text}')
+        self.first_key = False
+
+    def close(self):
+        self.f.write('\n}')
+
+
+class JSONLWriter:
+    """結合グラフを1行1レコード（node / edge / metadata）のJSONLで書き出すライタ"""
+
+    def __init__(self, f):
+        self.f = f
+        self.record_type = ''
+
+    def begin_array(self, key: str):
+        self.record_type = key[:-1]  # nodes -> node, edges -> edge
+
+    def write_item(self, item: Dict[str, Any]):
+        self.f.write(json.dumps({'type': self.record_type, **item}, ensure_ascii=False) + '\n')
+
+    def end_array(self):
+        pass
+
+    def write_value(self, key: str, value: Any):
+        self.f.write(json.dumps({'type': key, **value}, ensure_ascii=False) + '\n')
+
+    def close(self):
+        pass
+
+
+def stream_merge_graphs(graph_files: List[Path], output_path: Path,
+                        fmt: str = 'json') -> Tuple[Dict[str, Any], List[str]]:
+    """グラフファイルを2パスで結合し、出力へ逐次書き出す
+
+    1パス目はノードIDだけを集めて衝突を調べ、2パス目でノード、3パス目でエッジを
+    セクションごとに読み直して書き出す。同時にメモリに載るグラフは1セクション分だけで、
+    コーパス全体で保持するのはID集合とエッジの重複判定キーのみ。
+    ノードIDは書き出し時に重複を除き、エッジの参照整合性は書き出しながら検査する
+    （validate_merged_graph と同じ内容の問題を返す）。
+    戻り値は (出力ファイルの metadata, 検証で見つかった問題)。
+    """
+    sections: List[Tuple[str, Path]] = []
+    for filepath in graph_files:
+        section_id = section_id_from_graph_file(filepath.name)
+        if section_id:
+            sections.append((section_id, filepath))
+
+    # 1パス目: ノードIDの出現セクションだけを集める
+    id_to_sections = defaultdict(list)
+    for section_id, filepath in sections:
+        for node in load_graph(filepath).get('nodes', []):
+            if node.get('id'):
+                id_to_sections[node['id']].append(section_id)
+    collisions = {id_ for id_, owners in id_to_sections.items() if len(owners) > 1}
+    del id_to_sections
+    print(f"Found {len(collisions)} ID collisions")
+
+    def section_mapping_for(graph: Dict[str, Any], section_id: str) -> Dict[str, str]:
+        return {node['id']: create_unique_id(node['id'], section_id) if node['id'] in collisions else node['id']
+                for node in graph.get('nodes', []) if node.get('id')}
+
+    all_node_ids = set()
+    all_edges = set()
+    total_edges = 0
+    issues = []
+    with open(output_path, 'w', encoding='utf-8') as f:
+        writer = JSONLWriter(f) if fmt == 'jsonl' else IncrementalJSONWriter(f)
+
+        # 2パス目: ノードを書き出す
+        writer.begin_array('nodes')
+        for section_id, filepath in sections:
+            graph = load_graph(filepath)
+            section_mapping = section_mapping_for(graph, section_id)
+            for node in graph.get('nodes', []):
+                if not node.get('id'):
+                    continue
+                new_id = section_mapping[node['id']]
+                if new_id not in all_node_ids:
+                    writer.write_item(remap_node(node, new_id, section_id))
+                    all_node_ids.add(new_id)
+        writer.end_array()
+
+        # 3パス目: エッジを書き出す
+        writer.begin_array('edges')
+        for section_id, filepath in sections:
+            graph = load_graph(filepath)
+            section_mapping = section_mapping_for(graph, section_id)
+            for edge in graph.get('edges', []):
+                if not (edge.get('source') and edge.get('target')):
+                    continue
+                edge_copy = remap_edge(edge, section_mapping, section_id)
+                edge_key = (edge_copy['source'], edge_copy['target'], edge.get('relation', ''))
+                if edge_key not in all_edges:
+                    # ノードは書き出し済みなので、ここで参照整合性を検査できる
+                    if edge_copy['source'] not in all_node_ids:
+                        issues.append(f"Edge references non-existent source: {edge_copy['source']}")
+                    if edge_copy['target'] not in all_node_ids:
+                        issues.append(f"Edge references non-existent target: {edge_copy['target']}")
+                    writer.write_item(edge_copy)
+                    all_edges.add(edge_key)
+                    total_edges += 1
+        writer.end_array()
+
+        metadata = {
+            'merged_from': [{'section_id': section_id, 'file': filepath.name}
+                            for section_id, filepath in sections],
+            'total_sections': len(sections),
+            'statistics': {
+                'total_nodes': len(all_node_ids),
+                'total_edges': total_edges,
+                'id_collisions_resolved': len(collisions),
+                'unique_node_ids': len(all_node_ids)
+            }
+        }
+        writer.write_value('metadata', metadata)
+        writer.close()
+
+    return metadata, issues
+
+
+def unify_concepts(merged: Dict[str, Any], lsh_threshold: float = 0.6) -> Dict[str, Any]:
+    """衝突したIDや近似重複の概念を1つの正準ノードに統合する
+
+    同じ元ID・同じ正規化ラベルのノードは辞書で、表記揺れのある近似重複は
+    MinHash/LSH索引（concept_lsh）で見つけるので、全ペア比較はしない。
+    統合したノードには元のセクションとIDの一覧（provenance）を残し、
+    エッジは正準ノードに付け替えて自己ループと重複を除く。
+    """
+    nodes = merged['nodes']
+    position = {node['id']: i for i, node in enumerate(nodes)}
+    uf = UnionFind(len(nodes))
+
+    first_by_key: Dict[Tuple[str, str], int] = {}
+    for i, node in enumerate(nodes):
+        for key in (('original_id', node.get('original_id') or node['id']),
+                    ('label', normalize_label(node.get('label', '')))):
+            if not key[1]:
+                continue
+            if key in first_by_key:
+                uf.union(first_by_key[key], i)
+            else:
+                first_by_key[key] = i
+
+    if lsh_threshold <= 1.0:
+        index = ConceptLSHIndex()
+        for node in nodes:
+            index.add(node.get('source_section', ''), node)
+        for entry1, entry2, _ in index.near_duplicates(lsh_threshold):
+            uf.union(position[entry1['id']], position[entry2['id']])
+
+    tier_rank = {"core": 3, "supplementary": 2, "advanced": 1}
+    used_ids = {node['id'] for node in nodes}
+    id_to_canonical: Dict[str, str] = {}
+    unified_nodes = []
+    merged_clusters = 0
+    for cluster in uf.groups():
+        members = [nodes[i] for i in cluster]
+        canonical = members[0]
+        if len(members) == 1:
+            unified_nodes.append(canonical)
+            id_to_canonical[canonical['id']] = canonical['id']
+            continue
+
+        merged_clusters += 1
+        member_ids = {member['id'] for member in members}
+        canonical_id = canonical.get('original_id') or canonical['id']
+        if canonical_id in used_ids and canonical_id not in member_ids:
+            canonical_id = canonical['id']
+
+        labels = [member.get('label', '') for member in members]
+        label = max(labels, key=lambda l: (labels.count(l), -labels.index(l)))
+        aliases = []
+        evidence = []
+        seen_evidence = set()
+        for member in members:
+            for alias in [member.get('label', '')] + list(member.get('aliases') or []):
+                if alias and alias != label and alias not in aliases:
+                    aliases.append(alias)
+            for item in member.get('evidence', []):
+                text = item.get('text', '') if isinstance(item, dict) else str(item)
+                if text not in seen_evidence:
+                    seen_evidence.add(text)
+                    evidence.append(item)
+
+        node = canonical.copy()
+        node.update({
+            'id': canonical_id,
+            'label': label,
+            'tier': max((member.get('tier', 'core') for member in members),
+                        key=lambda tier: tier_rank.get(tier, 0)),
+            'definition': next((member['definition'] for member in members if member.get('definition')), None),
+            'aliases': aliases,
+            'evidence': evidence,
+            'source_sections': list(dict.fromkeys(member.get('source_section', '') for member in members)),
+            'provenance': [{'section_id': member.get('source_section', ''),
+                            'id': member['id'],
+                            'label': member.get('label', '')} for member in members],
+        })
+        unified_nodes.append(node)
+        for member in members:
+            id_to_canonical[member['id']] = canonical_id
+
+    unified_edges = []
+    edge_positions: Dict[Tuple[str, str, str], int] = {}
+    for edge in merged['edges']:
+        source = id_to_canonical.get(edge['source'], edge['source'])
+        target = id_to_canonical.get(edge['target'], edge['target'])
+        if source == target:
+            continue
+        edge_key = (source, target, edge.get('relation', ''))
+        if edge_key in edge_positions:
+            kept = unified_edges[edge_positions[edge_key]]
+            kept['confidence'] = max(kept.get('confidence', 0.0), edge.get('confidence', 0.0))
+            continue
+        edge_copy = edge.copy()
+        edge_copy['source'] = source
+        edge_copy['target'] = target
+        edge_positions[edge_key] = len(unified_edges)
+        unified_edges.append(edge_copy)
+
+    metadata = dict(merged.get('metadata', {}))
+    metadata['statistics'] = dict(metadata.get('statistics', {}))
+    metadata['statistics'].update({
+        'total_nodes': len(unified_nodes),
+        'total_edges': len(unified_edges),
+        'unique_node_ids': len(unified_nodes),
+    })
+    metadata['unification'] = {
+        'clusters_merged': merged_clusters,
+        'nodes_before': len(nodes),
+        'nodes_after': len(unified_nodes),
+        'edges_before': len(merged['edges']),
+        'edges_after': len(unified_edges),
+        'lsh_threshold': lsh_threshold,
+    }
+    return {'nodes': unified_nodes, 'edges': unified_edges, 'metadata': metadata}
+
+
 def validate_merged_graph(graph: Dict[str, Any]) -> List[str]:
     """結合されたグラフの妥当性をチェック"""
     issues = []
@@ -175,9 +635,63 @@ def validate_merged_graph(graph: Dict[str, Any]) -> List[str]:
     return issues
 
 
+def print_validation(issues: List[str]):
+    if issues:
+        print("\nValidation issues found:")
+        for issue in issues:
+            print(f"  - {issue}")
+    else:
+        print("\nValidation passed: No issues found")
+
+
+def write_graph_store(db_path: Path, graph_files: List[Path], output_path: Optional[Path],
+                      input_dirs: Optional[List[Path]], merged_graph: Optional[Dict[str, Any]] = None):
+    """セクショングラフと結合結果をSQLiteグラフストアに書き込む"""
+    conn = graph_store.connect(db_path)
+    resolve_source = graph_store.section_source_resolver(input_dirs or [Path('input'), Path('extra-input')])
+    for filepath in graph_files:
+        graph_store.import_graph_file(conn, filepath, resolve_source)
+    if merged_graph is not None:
+        graph_store.store_graph(conn, output_path.stem, merged_graph, path=str(output_path),
+                                resolve_source=resolve_source)
+    elif output_path is not None:
+        graph_store.import_graph_file(conn, output_path, resolve_source)
+    conn.close()
+    print(f"Graph store updated: {db_path}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description='セクショングラフを結合し、ID衝突を回避する')
+    parser.add_argument('--graph-dir', type=Path, default=Path('webui/public'),
+                        help='graph_sec*.json のあるディレクトリ')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='出力先（省略時: <graph-dir>/graph_merged.json）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='変更されたセクションだけを再結合し、既存ノードのIDを維持する')
+    parser.add_argument('--state', type=Path, default=Path('.merge_state.json'),
+                        help='--incremental のハッシュとIDマッピングの保存先')
+    parser.add_argument('--stream', action='store_true',
+                        help='セクションを1つずつ読みながら出力へ逐次書き出す（大規模コーパス向け）')
+    parser.add_argument('--format', choices=['json', 'jsonl'], default='json',
+                        help='--stream の出力形式')
+    parser.add_argument('--unify', action='store_true',
+                        help='衝突・近似重複した概念を正準ノードに統合する（IDに接尾辞を付けない）')
+    parser.add_argument('--lsh-threshold', type=float, default=0.6,
+                        help='--unify で近似重複とみなすMinHash推定類似度（1より大きいと無効）')
+    parser.add_argument('--db', type=Path, default=None,
+                        help='セクショングラフと結合結果をSQLiteグラフストアにも書き込む')
+    parser.add_argument('--input-dir', type=Path, action='append', default=None,
+                        help='--db で証拠のオフセットを求める原文ディレクトリ（複数指定可）')
+    args = parser.parse_args()
+    if args.stream and args.incremental:
+        parser.error('--stream と --incremental は同時に指定できません')
+    if args.unify and (args.stream or args.incremental):
+        parser.error('--unify は --stream / --incremental と同時に指定できません')
+
     # グラフファイルのディレクトリ
-    graph_dir = Path('webui/public')
+    graph_dir = args.graph_dir
+    output_path = args.output or graph_dir / 'graph_merged.json'
+    state_path = args.state
     
     # すべてのグラフファイルを取得
     graph_files = sorted(graph_dir.glob('graph_sec*.json'))
@@ -187,22 +701,42 @@ def main():
         print("No graph files found!")
         return
     
+    if args.stream:
+        metadata, issues = stream_merge_graphs(graph_files, output_path, args.format)
+        print_validation(issues)
+        print(f"\nMerged graph streamed to: {output_path}")
+        print(f"  Total nodes: {metadata['statistics']['total_nodes']}")
+        print(f"  Total edges: {metadata['statistics']['total_edges']}")
+        print(f"  ID collisions resolved: {metadata['statistics']['id_collisions_resolved']}")
+        if args.db:
+            write_graph_store(args.db, graph_files, output_path if args.format == 'json' else None,
+                              args.input_dir)
+        return
+    
     # グラフを結合
-    merged_graph = merge_graphs(graph_files)
+    if args.incremental:
+        merged_graph = merge_with_state(graph_files, output_path, load_merge_state(state_path))
+    else:
+        merged_graph = merge_graphs(graph_files)
+    
+    if args.unify:
+        merged_graph = unify_concepts(merged_graph, args.lsh_threshold)
+        unification = merged_graph['metadata']['unification']
+        print(f"\nUnified {unification['clusters_merged']} concept clusters: "
+              f"{unification['nodes_before']} -> {unification['nodes_after']} nodes, "
+              f"{unification['edges_before']} -> {unification['edges_after']} edges")
     
     # 検証
-    issues = validate_merged_graph(merged_graph)
-    if issues:
-        print("\nValidation issues found:")
-        for issue in issues:
-            print(f"  - {issue}")
-    else:
-        print("\nValidation passed: No issues found")
+    print_validation(validate_merged_graph(merged_graph))
     
     # 結果を保存
-    output_path = graph_dir / 'graph_merged.json'
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(merged_graph, f, ensure_ascii=False, indent=2)
+    if args.incremental:
+        save_merge_state(state_path, build_merge_state(graph_files, merged_graph, output_path))
+    
+    if args.db:
+        write_graph_store(args.db, graph_files, output_path, args.input_dir, merged_graph)
     
     print(f"\nMerged graph saved to: {output_path}")
     print(f"  Total nodes: {merged_graph['metadata']['statistics']['total_nodes']}")
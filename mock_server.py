@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible /chat/completions server for offline runs and load tests.
+
+Answers the pipeline's prompts without a model:
+  - concepts: the most frequent terms of each section (katakana, kanji and
+    capitalised ASCII runs), with the first sentence containing each as verbatim evidence;
+  - relations: concepts that co-occur in a sentence, with that sentence as evidence;
+  - packed (multi-section) variants of both, keyed by section id;
+  - anything else: the empty instance of the requested JSON schema, or {}.
+Fixtures (--fixtures, JSON lines) override this: {"match": "<substring of the
+prompt>", "content": ...} or {"key": llm.request_key(body), "content": ...}. An
+archive recorded with LLM_RECORD works as a fixture file too (its successful
+responses are served by key), so real model output can be replayed over HTTP
+with faults injected.
+
+Failure injection, all reproducible for a given --seed (each request's dice are
+derived from the seed, the request and how often that request was seen, not
+from arrival order):
+  --latency fixed:0.2 | uniform:0.1,0.5 | lognormal:0.4,0.6 (median, sigma) | pareto:0.2,2.5 (scale, alpha)
+  --ms-per-token     added per completion token
+  --rpm / --tpm      token buckets; over the limit -> 429 with x-ratelimit-* and Retry-After
+  --rate-limit-rate  extra random 429s
+  --error-rate       500/502/503 responses
+  --truncate-rate    content cut mid-JSON with finish_reason "length"
+  --drop-rate        HTTP body cut off and connection closed
+
+Usage (usage.prompt_tokens_details.cached_tokens simulates prefix caching) and
+injected faults are counted at GET /stats.
+
+    python mock_server.py --port 8000 --latency lognormal:0.4,0.6 --rpm 600 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=x python pipeline.py --input input --out /tmp/out
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm import request_key
+from utils import approx_tokens
+
+TERM_PATTERN = re.compile(r"[ァ-ヴー]{3,}|[一-龥々]{2,8}|[A-Z][A-Za-z0-9\-]{2,}")
+SENTENCE_END = re.compile(r"(?<=[。！？!?\n])")
+SECTION_CONTEXT = re.compile(r"Section title: (?P<title>.*)\nChapter file: .*\n---\n(?P<text>.*?)\n---", re.S)
+PACKED_HEADER = re.compile(r"^=== Section (\S+) ===$", re.M)
+CACHE_CHUNK_CHARS = 512
+CACHE_MIN_TOKENS = 1024
+
+
+# --- deterministic answers -------------------------------------------------------
+
+def sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+
+
+def top_terms(text: str, limit: int) -> List[str]:
+    counts = Counter(TERM_PATTERN.findall(text))
+    first = {}
+    for m in TERM_PATTERN.finditer(text):
+        first.setdefault(m.group(), m.start())
+    return sorted(counts, key=lambda t: (-counts[t], first[t]))[:limit]
+
+
+def concepts_for(text: str, limit: int) -> List[Dict[str, Any]]:
+    sents = sentences(text)
+    out = []
+    for term in top_terms(text, limit):
+        evidence = next((s for s in sents if term in s), term)[:200]
+        out.append({"label": term, "aliases": [], "tier": "core",
+                    "definition": f"{term}についての説明", "evidence": [{"text": evidence}]})
+    return out
+
+
+def edges_for(text: str, labels: List[str], limit: int = 12) -> List[Dict[str, Any]]:
+    edges, seen = [], set()
+    for sent in sentences(text):
+        present = sorted((sent.find(label), label) for label in labels if label and label in sent)
+        for (_, a), (_, b) in zip(present, present[1:]):
+            if a == b or (a, b) in seen:
+                continue
+            seen.add((a, b))
+            edges.append({"source_label": a, "target_label": b, "relation": "関連する",
+                          "relation_description": f"{a}は{b}と関連する", "confidence": 0.8,
+                          "evidence": [{"text": sent[:200]}]})
+            if len(edges) >= limit:
+                return edges
+    return edges
+
+
+def json_after(prompt: str, marker: str) -> Any:
+    """First JSON value following marker in the prompt."""
+    start = prompt.find(marker)
+    if start < 0:
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(prompt[start + len(marker):].lstrip())[0]
+    except ValueError:
+        return None
+
+
+def max_concepts_of(prompt: str) -> int:
+    match = re.search(r"extract up to (\d+)", prompt)
+    return int(match.group(1)) if match else 10
+
+
+def empty_instance(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None) -> Any:
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return empty_instance(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        return None
+    kind = schema.get("type")
+    if kind == "object":
+        return {k: empty_instance(v, defs) for k, v in schema.get("properties", {}).items()}
+    return {"array": [], "string": "", "number": 0, "integer": 0, "boolean": False}.get(kind)
+
+
+def answer(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Deterministic JSON answer for one of the pipeline's prompts."""
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    relations = "propose relations" in prompt
+    if "=== Section " in prompt:
+        parts = PACKED_HEADER.split(prompt)
+        blocks = {sid: block.split("\n---\n", 1)[-1].rsplit("\n---", 1)[0] for sid, block in zip(parts[1::2], parts[2::2])}
+        if relations:
+            labels = json_after(prompt, "Concepts by section id:") or {}
+            return {"sections": [{"section_id": sid, "edges": edges_for(text, labels.get(sid, []))}
+                                 for sid, text in blocks.items()]}
+        if "Task:" in prompt:
+            limit = max_concepts_of(prompt)
+            return {"sections": [{"section_id": sid, "concepts": concepts_for(text, limit)}
+                                 for sid, text in blocks.items()]}
+    context = SECTION_CONTEXT.search(prompt)
+    if context and relations:
+        return {"edges": edges_for(context.group("text"), json_after(prompt, "Concepts:") or [])}
+    if context and "Task: extract" in prompt:
+        return {"concepts": concepts_for(context.group("text"), max_concepts_of(prompt))}
+    schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema")
+    return empty_instance(schema) if schema else {}
+
+
+# --- fault injection ---------------------------------------------------------------
+
+def parse_latency(spec: str):
+    """Latency sampler from a spec like lognormal:0.4,0.6 (see module docstring)."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "pareto":
+        return lambda rng: values[0] * rng.paretovariate(values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def reset_seconds(self) -> float:
+        return (self.capacity - self.level) / self.rate
+
+
+def reset_header(seconds: float) -> str:
+    """OpenAI-style duration (e.g. 1.5s, 2m3s)."""
+    minutes, secs = divmod(seconds, 60)
+    return f"{int(minutes)}m{secs:.0f}s" if minutes else f"{secs:.3g}s"
+
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.latency = parse_latency(args.latency)
+        self.fixtures = load_fixtures(args.fixtures) if args.fixtures else []
+        self.requests = TokenBucket(args.rpm) if args.rpm else None
+        self.tokens = TokenBucket(args.tpm) if args.tpm else None
+        self.seen: Counter = Counter()
+        self.cache: "OrderedDict[str, None]" = OrderedDict()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def rng_for(self, key: str) -> random.Random:
+        with self.lock:
+            self.seen[key] += 1
+            occurrence = self.seen[key]
+        return random.Random(f"{self.args.seed}:{key}:{occurrence}")
+
+    def rate_limit(self, tokens: int) -> Tuple[Optional[float], Dict[str, str]]:
+        """(retry_after or None, x-ratelimit-* headers), consuming from the buckets when allowed."""
+        with self.lock:
+            headers, wait = {}, 0.0
+            for name, bucket, amount in (("requests", self.requests, 1), ("tokens", self.tokens, tokens)):
+                if bucket is None:
+                    continue
+                bucket.refill()
+                wait = max(wait, bucket.wait_for(amount))
+            if wait == 0.0:
+                if self.requests:
+                    self.requests.level -= 1
+                if self.tokens:
+                    self.tokens.level -= tokens
+            for name, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                if bucket is not None:
+                    headers[f"x-ratelimit-limit-{name}"] = str(bucket.capacity)
+                    headers[f"x-ratelimit-remaining-{name}"] = str(max(0, int(bucket.level)))
+                    headers[f"x-ratelimit-reset-{name}"] = reset_header(bucket.reset_seconds())
+            return (wait or None), headers
+
+    def cached_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Simulated prefix cache: leading 512-char chunks already seen, if they add up to 1024+ tokens."""
+        text = "".join(f"<|{m.get('role')}|>{m.get('content') or ''}<|end|>" for m in messages)
+        digest, cached_chars = hashlib.sha256(), 0
+        with self.lock:
+            for i in range(0, len(text) - CACHE_CHUNK_CHARS + 1, CACHE_CHUNK_CHARS):
+                digest.update(text[i:i + CACHE_CHUNK_CHARS].encode("utf-8"))
+                key = digest.hexdigest()
+                if key in self.cache and cached_chars == i:
+                    cached_chars = i + CACHE_CHUNK_CHARS
+                    self.cache.move_to_end(key)
+                self.cache[key] = None
+            while len(self.cache) > 100_000:
+                self.cache.popitem(last=False)
+        cached = approx_tokens(text[:cached_chars])
+        return cached if cached >= CACHE_MIN_TOKENS else 0
+
+    def fixture_for(self, key: str, prompt: str) -> Optional[Any]:
+        for fixture in self.fixtures:
+            if fixture.get("key") == key or (fixture.get("match") and fixture["match"] in prompt):
+                return fixture["content"]
+        return None
+
+
+def load_fixtures(path: str) -> List[Dict[str, Any]]:
+    fixtures = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            fixture = json.loads(line)
+            if "body" in fixture:
+                # LLM_RECORD archive entry: keep the successful ones as key -> content
+                if fixture.get("status") != 200:
+                    continue
+                fixture = {"key": fixture["key"],
+                           "content": json.loads(fixture["body"])["choices"][0]["message"]["content"]}
+            fixtures.append(fixture)
+    return fixtures
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, fmt, *args):
+        if self.state.args.verbose:
+            super().log_message(fmt, *args)
+
+    def send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None, cut: bool = False):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if cut:
+            # Promise the full length, send part of it, hang up
+            self.wfile.write(data[:len(data) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.state.lock:
+                return self.send_json(200, dict(self.state.stats))
+        if self.path.rstrip("/").endswith("/health"):
+            return self.send_json(200, {"ok": True})
+        self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "not found"}})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        args, state = self.state.args, self.state
+        model, messages = body.get("model", ""), body.get("messages", [])
+        key = request_key(body)
+        rng = state.rng_for(key)
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        prompt_tokens = approx_tokens(prompt)
+        with state.lock:
+            state.stats["requests"] += 1
+
+        retry_after, headers = state.rate_limit(prompt_tokens)
+        if retry_after is None and rng.random() < args.rate_limit_rate:
+            retry_after = rng.uniform(0.5, 2.0)
+            headers.setdefault("x-ratelimit-remaining-requests", "0")
+            headers["x-ratelimit-reset-requests"] = reset_header(retry_after)
+        if retry_after is not None:
+            with state.lock:
+                state.stats["rate_limited"] += 1
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+            headers["retry-after-ms"] = str(int(retry_after * 1000))
+            return self.send_json(429, {"error": {"message": f"Rate limit reached for {model}. "
+                                                  f"Please try again in {retry_after:.3g}s.",
+                                                  "type": "requests", "code": "rate_limit_exceeded"}}, headers)
+
+        fixture = state.fixture_for(key, prompt)
+        content = fixture if fixture is not None else answer(body)
+        content = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+        completion_tokens = approx_tokens(content)
+        time.sleep(max(0.0, state.latency(rng) + completion_tokens * args.ms_per_token / 1000))
+
+        if rng.random() < args.error_rate:
+            status = rng.choice([500, 502, 503])
+            with state.lock:
+                state.stats[f"http_{status}"] += 1
+            return self.send_json(status, {"error": {"message": "The server had an error while processing "
+                                                     "your request.", "type": "server_error"}}, headers)
+        finish_reason = "stop"
+        if rng.random() < args.truncate_rate:
+            content = content[:int(len(content) * rng.uniform(0.3, 0.9))]
+            finish_reason = "length"
+            with state.lock:
+                state.stats["truncated"] += 1
+        drop = rng.random() < args.drop_rate
+        cached = state.cached_tokens(messages)
+        with state.lock:
+            state.stats["dropped" if drop else "ok"] += 1
+            state.stats["prompt_tokens"] += prompt_tokens
+            state.stats["cached_tokens"] += cached
+            state.stats["completion_tokens"] += completion_tokens
+        self.send_json(200, {
+            "id": f"chatcmpl-{key[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached}},
+        }, headers, cut=drop)
+
+
+def make_server(args, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Server bound to host:port (port 0 picks a free one, see server.server_address)."""
+    handler = type("MockHandler", (Handler,), {"state": MockState(args)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible /chat/completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", default=None, help="JSON lines of {match|key, content}")
+    parser.add_argument("--latency", default="fixed:0", help="Latency distribution (see module docstring)")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="Extra latency per completion token")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Prompt tokens per minute before 429s (0: unlimited)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of a random 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 5xx response")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Probability of truncated content")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability of a cut-off HTTP body")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    server = make_server(args, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Mock server on http://{host}:{port}/v1 (seed {args.seed}, latency {args.latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
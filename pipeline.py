@@ -1,12 +1,19 @@
 #!/usr/bin/env python
-import os, re, json, argparse, csv, hashlib
-from dataclasses import dataclass, field
+import os, re, json, argparse, csv, hashlib, time, traceback, unicodedata
+from dataclasses import asdict, dataclass, field
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
+import graph_store
+from aho_corasick import AhoCorasick
 from llm import ChatCompletionsClient
-from prompts import SECTION_CONCEPTS_PROMPT, SECTION_RELATIONS_PROMPT
-from utils import normalize_label, extract_json_block, slugify_id
+from prompts import concepts_messages, packed_concepts_messages, packed_relations_messages, relations_messages
+from routing import Router, RoutingPolicy
+from schemas import PARSE_METRICS, ConceptsPayload, EdgesPayload, PackedConceptsPayload, PackedEdgesPayload
+from utils import approx_tokens, normalize_label, slugify_id
+from work_queue import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, WorkQueue, default_worker_id
+
+MAX_SECTION_CHARS = 12000
 
 def truncate_evidence(text: str, max_len: int = 200) -> str:
     """Truncate long evidence text, keeping start and end"""
@@ -115,105 +122,206 @@ def filter_edges(edges: List[Edge], node_ids: set) -> List[Edge]:
             out.append(e)
     return out
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--input", default="contents/japanese", help="Markdown directory")
-    ap.add_argument("--out", required=True, help="Output directory")
-    ap.add_argument("--segment-level", default="h2", choices=["h1","h2","h3"])
-    ap.add_argument("--max-concepts", type=int, default=15)
-    ap.add_argument("--model", default=os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
-    args = ap.parse_args()
+def to_concepts(items, sec_id: str) -> List[Concept]:
+    concepts = []
+    for c in items:
+        label = c.label.strip()
+        if not label: 
+            continue
+        concept = Concept(
+            id=slugify_id(label) or ("tmp_"+hashlib.md5(label.encode()).hexdigest()[:8]),
+            label=label,
+            aliases=c.aliases,
+            tier=c.tier,
+            definition=c.definition,
+            evidence=[Evidence(text=e.text) for e in c.evidence if e.text],
+            section_id=sec_id
+        )
+        concepts.append(concept)
+    return concepts
 
-    input_dir = Path(args.input)
-    out_dir = Path(args.out)
-    out_dir.mkdir(parents=True, exist_ok=True)
+def to_edges(items, sec_id: str) -> List[Edge]:
+    edges = []
+    for e in items:
+        src = slugify_id(e.source_label)
+        tgt = slugify_id(e.target_label)
+        if not (src and tgt and e.relation):
+            continue
+        edge = Edge(
+            source=src, target=tgt, relation=e.relation, relation_description=e.relation_description,
+            confidence=e.confidence,
+            evidence=[Evidence(text=x.text) for x in e.evidence if x.text],
+            section_id=sec_id
+        )
+        edges.append(edge)
+    return edges
+
+def split_paragraphs(text: str) -> List[str]:
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+def normalize_for_match(s: str) -> str:
+    return unicodedata.normalize("NFKC", s).lower()
+
+def prune_relation_context(text: str, concepts: List[Concept], min_concepts: int = 2) -> str:
+    """Keep only paragraphs where at least min_concepts distinct concepts (label or alias) co-occur.
+
+    Omitted stretches are marked with [...]. Falls back to the full text when no paragraph qualifies,
+    so pruning never leaves the relations call with nothing to ground edges on.
+    """
+    matcher = AhoCorasick(
+        (normalize_for_match(name), i)
+        for i, c in enumerate(concepts) for name in [c.label, *c.aliases] if len(name.strip()) >= 2
+    )
+    paragraphs = split_paragraphs(text)
+    kept = [i for i, p in enumerate(paragraphs) if len(matcher.keys_in(normalize_for_match(p))) >= min_concepts]
+    if not kept:
+        return text
+    pieces, prev = [], -1
+    for i in kept:
+        if i != prev + 1:
+            pieces.append("[...]")
+        pieces.append(paragraphs[i])
+        prev = i
+    if prev != len(paragraphs) - 1:
+        pieces.append("[...]")
+    return "\n\n".join(pieces)
+
+def relation_context(sec: Section, concepts: List[Concept], prune: bool) -> str:
+    text = sec.text[:MAX_SECTION_CHARS]
+    return prune_relation_context(text, concepts) if prune else text
+
+def extract_concepts(client: ChatCompletionsClient, sec: Section, max_concepts: int) -> List[Concept]:
+    # Section text first, task last: the relations call below reuses the cached prefix
+    messages = concepts_messages(sec.title, sec.chapter, sec.text[:MAX_SECTION_CHARS], max_concepts)
+    return to_concepts(client.complete_structured(messages, ConceptsPayload).concepts, sec.id)
+
+def extract_relations(client: ChatCompletionsClient, sec: Section, concepts: List[Concept],
+                      prune: bool = False) -> List[Edge]:
+    concept_labels = [c.label for c in concepts]
+    rmessages = relations_messages(sec.title, sec.chapter, relation_context(sec, concepts, prune),
+                                   json.dumps(concept_labels, ensure_ascii=False, indent=2))
+    rdata = client.complete_structured(rmessages, EdgesPayload)
+    print(f"Relations for {sec.title}: {len(rdata.edges)} edges")
+    return to_edges(rdata.edges, sec.id)
+
+def extract_section(client: ChatCompletionsClient, sec: Section, max_concepts: int,
+                    prune: bool = False) -> Tuple[List[Concept], List[Edge]]:
+    concepts = extract_concepts(client, sec, max_concepts)
+    return concepts, extract_relations(client, sec, concepts, prune)
+
+def section_tokens(sec: Section) -> int:
+    return approx_tokens(sec.title) + approx_tokens(sec.text[:MAX_SECTION_CHARS])
+
+def pack_sections(sections: List[Section], budget: int, max_sections: int = 8) -> List[List[Section]]:
+    """Group consecutive sections while their text fits in `budget` tokens (budget <= 0: one per request).
+
+    A section larger than the budget on its own still gets a request of its own.
+    """
+    packs: List[List[Section]] = []
+    current: List[Section] = []
+    used = 0
+    for sec in sections:
+        cost = section_tokens(sec)
+        if current and (budget <= 0 or used + cost > budget or len(current) >= max_sections):
+            packs.append(current)
+            current, used = [], 0
+        current.append(sec)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
 
-    client = ChatCompletionsClient(model=args.model)
+def extract_pack(client: ChatCompletionsClient, pack: List[Section], max_concepts: int,
+                 prune: bool = False) -> Tuple[List[Concept], List[Edge]]:
+    """Extract several sections with one concepts call and one relations call, split back by section id.
+
+    Sections the model leaves out of a packed response are re-requested on their own.
+    """
+    if len(pack) == 1:
+        return extract_section(client, pack[0], max_concepts, prune)
+    entries = [(sec.id, sec.title, sec.chapter, sec.text[:MAX_SECTION_CHARS]) for sec in pack]
+    cdata = client.complete_structured(packed_concepts_messages(entries, max_concepts), PackedConceptsPayload)
+    concepts_by_sec: Dict[str, List[Concept]] = {}
+    for entry in cdata.sections:
+        sec_id = entry.section_id.strip()
+        concepts_by_sec.setdefault(sec_id, []).extend(to_concepts(entry.concepts, sec_id))
 
     all_concepts: List[Concept] = []
     all_edges: List[Edge] = []
-    sections: List[Section] = []
+    answered = []
+    for sec in pack:
+        if sec.id not in concepts_by_sec:
+            concepts, edges = extract_section(client, sec, max_concepts, prune)
+            all_concepts.extend(concepts)
+            all_edges.extend(edges)
+        else:
+            all_concepts.extend(concepts_by_sec[sec.id])
+            answered.append(sec)
+    if not answered:
+        return all_concepts, all_edges
+
+    entries = [(sec.id, sec.title, sec.chapter, relation_context(sec, concepts_by_sec[sec.id], prune))
+               for sec in answered]
+    labels = {sec.id: [c.label for c in concepts_by_sec[sec.id]] for sec in answered}
+    rdata = client.complete_structured(
+        packed_relations_messages(entries, json.dumps(labels, ensure_ascii=False, indent=2)), PackedEdgesPayload)
+    edges_by_sec: Dict[str, list] = {}
+    for entry in rdata.sections:
+        edges_by_sec.setdefault(entry.section_id.strip(), []).extend(entry.edges)
+    for sec in answered:
+        if sec.id not in edges_by_sec:
+            all_edges.extend(extract_relations(client, sec, concepts_by_sec[sec.id], prune))
+            continue
+        print(f"Relations for {sec.title}: {len(edges_by_sec[sec.id])} edges")
+        all_edges.extend(to_edges(edges_by_sec[sec.id], sec.id))
+    return all_concepts, all_edges
 
+def load_sections(input_dir: Path, segment_level: str) -> Tuple[List[Tuple[str, str]], List[Section]]:
+    sections: List[Section] = []
     files = read_markdown_files(input_dir)
     for idx, (path, txt) in enumerate(files, start=1):
         chapter = Path(path).name
-        chunks = split_sections(txt, args.segment_level)
+        chunks = split_sections(txt, segment_level)
         for j, (title, body) in enumerate(chunks, start=1):
             sec_id = f"s{idx:02d}_{j:02d}"
             sec = Section(id=sec_id, chapter=chapter, title=title, text=body, path=path)
             sections.append(sec)
+    return files, sections
 
-    for sec in sections:
-        prompt = SECTION_CONCEPTS_PROMPT.format(
-            section_title=sec.title,
-            chapter=sec.chapter,
-            max_concepts=args.max_concepts,
-            text=sec.text[:12000]
-        )
-        txt = client.complete(prompt, expect_json=True)
-        data = extract_json_block(txt) or {"concepts":[]}
-        concepts = []
-        for c in data.get("concepts", []):
-            label = c.get("label","").strip()
-            if not label: 
-                continue
-            concept = Concept(
-                id=slugify_id(label) or ("tmp_"+hashlib.md5(label.encode()).hexdigest()[:8]),
-                label=label,
-                aliases=c.get("aliases",[]) or [],
-                tier=c.get("tier","core"),
-                definition=c.get("definition"),
-                evidence=[Evidence(text=e.get("text","")) for e in c.get("evidence",[]) if e.get("text")],
-                section_id=sec.id
-            )
-            concepts.append(concept)
-
-        concept_labels = [c.label for c in concepts]
-        rprompt = SECTION_RELATIONS_PROMPT.format(
-            section_title=sec.title,
-            chapter=sec.chapter,
-            # relation_types parameter removed from prompt
-            concepts=json.dumps(concept_labels, ensure_ascii=False, indent=2),
-            text=sec.text[:12000]
-        )
-        rtxt = client.complete(rprompt, expect_json=True)
-        print(f"Relations response for {sec.title}: {rtxt[:500]}...")
-        rdata = extract_json_block(rtxt) or {"edges":[]}
-        edges = []
-        for e in rdata.get("edges", []):
-            src = slugify_id(e.get("source_label",""))
-            tgt = slugify_id(e.get("target_label",""))
-            erelation = e.get("relation","")
-            erelation_desc = e.get("relation_description","")
-            if not (src and tgt and erelation):
-                continue
-            edge = Edge(
-                source=src, target=tgt, relation=erelation, relation_description=erelation_desc,
-                confidence=float(e.get("confidence",0.7)),
-                evidence=[Evidence(text=x.get("text","")) for x in e.get("evidence",[]) if x.get("text")],
-                section_id=sec.id
-            )
-            edges.append(edge)
+class Extractor:
+    """Per-pack extraction with the model, routing and request options from the command line."""
+    def __init__(self, args, log_dir: Path):
+        client_options = dict(deadline=args.deadline, hedge=args.hedge, hedge_base_url=args.hedge_base_url,
+                              hedge_budget=args.hedge_budget)
+        self.max_concepts = args.max_concepts
+        self.prune = args.prune_relations
+        self.router = None
+        if args.escalate:
+            self.router = Router([args.model, *args.escalate], RoutingPolicy(min_edges=args.min_edges),
+                                 log_path=Path(args.routing_log) if args.routing_log else log_dir / "routing_log.jsonl",
+                                 client_options=client_options)
+            self.client = self.router.clients[args.model]
+        else:
+            self.client = ChatCompletionsClient(model=args.model, **client_options)
 
-        all_concepts.extend(concepts)
-        all_edges.extend(edges)
+    def run(self, pack: List[Section]) -> Tuple[List[Concept], List[Edge]]:
+        if self.router:
+            return self.router.run(
+                pack, lambda tier_client, secs: extract_pack(tier_client, secs, self.max_concepts, self.prune))
+        return extract_pack(self.client, pack, self.max_concepts, self.prune)
+
+    def print_usage(self):
+        if self.router:
+            print(f"LLM usage:\n{self.router.usage_summary()}")
+            print(f"Routing:\n{self.router.summary()}")
+        else:
+            print(f"LLM usage: {self.client.usage_summary()}")
+        print(f"Parse results: {PARSE_METRICS.summary()}")
 
+def build_graph(all_concepts: List[Concept], all_edges: List[Edge]) -> Tuple[List[Concept], List[Edge], Dict]:
     merged_concepts = dedupe_concepts(all_concepts)
     node_ids = {c.id for c in merged_concepts}
     filtered_edges = filter_edges(all_edges, node_ids)
-
-    with (out_dir := Path(args.out)).joinpath("nodes.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f); w.writerow(["id","label","tier","definition","aliases","evidence"])
-        for c in merged_concepts: 
-            evidence_texts = [truncate_evidence(e.text) for e in c.evidence]
-            w.writerow([c.id, c.label, c.tier, (c.definition or ""), "|".join(c.aliases), "|".join(evidence_texts)])
-
-    with (out_dir / "edges.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f); w.writerow(["source","target","relation","relation_description","confidence","evidence"])
-        for e in filtered_edges: 
-            evidence_texts = [truncate_evidence(ev.text) for ev in e.evidence]
-            w.writerow([e.source, e.target, e.relation, e.relation_description, f"{e.confidence:.2f}", "|".join(evidence_texts)])
-
     graph = {
         "nodes": [
             {
@@ -236,7 +344,23 @@ def main():
             } for e in filtered_edges
         ]
     }
-    Path(args.out,"graph.json").write_text(json.dumps(graph, ensure_ascii=False, indent=2), encoding="utf-8")
+    return merged_concepts, filtered_edges, graph
+
+def write_outputs(out_dir: Path, merged_concepts: List[Concept], filtered_edges: List[Edge], graph: Dict):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with out_dir.joinpath("nodes.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f); w.writerow(["id","label","tier","definition","aliases","evidence"])
+        for c in merged_concepts: 
+            evidence_texts = [truncate_evidence(e.text) for e in c.evidence]
+            w.writerow([c.id, c.label, c.tier, (c.definition or ""), "|".join(c.aliases), "|".join(evidence_texts)])
+
+    with (out_dir / "edges.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f); w.writerow(["source","target","relation","relation_description","confidence","evidence"])
+        for e in filtered_edges: 
+            evidence_texts = [truncate_evidence(ev.text) for ev in e.evidence]
+            w.writerow([e.source, e.target, e.relation, e.relation_description, f"{e.confidence:.2f}", "|".join(evidence_texts)])
+
+    Path(out_dir, "graph.json").write_text(json.dumps(graph, ensure_ascii=False, indent=2), encoding="utf-8")
 
     lines = ["```mermaid","graph TD"]
     for c in merged_concepts:
@@ -245,11 +369,186 @@ def main():
         # Use short relation label for mermaid format
         lines.append(f"  {e.source} -->|{e.relation}| {e.target}")
     lines.append("```")
-    Path(args.out,"mermaid.md").write_text("\n".join(lines), encoding="utf-8")
+    Path(out_dir, "mermaid.md").write_text("\n".join(lines), encoding="utf-8")
 
     # Skip viewer generation as requested
 
+def store_in_db(db: Path, graph_name: str, out_dir: Path, sections: List[Section], graph: Dict,
+                files: List[Tuple[str, str]]):
+    conn = graph_store.connect(db)
+    for sec in sections:
+        graph_store.store_section(conn, sec.id, sec.title, sec.path)
+    graph_store.store_graph(conn, graph_name, graph, path=str(Path(out_dir, "graph.json")),
+                            resolve_source=lambda _: files)
+    conn.close()
+
+def finish(args, sections: List[Section], files: List[Tuple[str, str]],
+           all_concepts: List[Concept], all_edges: List[Edge]):
+    """Reduce step shared by local runs and queue jobs: dedupe, filter and write every output."""
+    out_dir = Path(args.out)
+    merged_concepts, filtered_edges, graph = build_graph(all_concepts, all_edges)
+    write_outputs(out_dir, merged_concepts, filtered_edges, graph)
+    if args.db:
+        store_in_db(Path(args.db), args.db_graph_name, out_dir, sections, graph, files)
+
+def run_local(args):
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    extractor = Extractor(args, out_dir)
+    files, sections = load_sections(Path(args.input), args.segment_level)
+
+    all_concepts: List[Concept] = []
+    all_edges: List[Edge] = []
+    packs = pack_sections(sections, args.pack_budget, args.pack_max_sections)
+    if len(packs) < len(sections):
+        print(f"Packed {len(sections)} sections into {len(packs)} requests (budget {args.pack_budget} tokens)")
+    for pack in packs:
+        concepts, edges = extractor.run(pack)
+        all_concepts.extend(concepts)
+        all_edges.extend(edges)
+
+    finish(args, sections, files, all_concepts, all_edges)
+    extractor.print_usage()
     print(f"Done. Outputs saved under: {args.out}")
 
+# --- Work-queue mode (several workers share one job, see work_queue.py) ----------
+
+# Extraction settings fixed at enqueue time so every worker produces comparable results
+JOB_OPTIONS = ("model", "escalate", "min_edges", "max_concepts", "prune_relations")
+
+def concept_from_dict(d: Dict) -> Concept:
+    return Concept(**{**d, "evidence": [Evidence(**e) for e in d.get("evidence", [])]})
+
+def edge_from_dict(d: Dict) -> Edge:
+    return Edge(**{**d, "evidence": [Evidence(**e) for e in d.get("evidence", [])]})
+
+def enqueue_job(args):
+    queue = WorkQueue(Path(args.queue))
+    files, sections = load_sections(Path(args.input), args.segment_level)
+    packs = pack_sections(sections, args.pack_budget, args.pack_max_sections)
+    queue.set_meta("job", {key: getattr(args, key) for key in JOB_OPTIONS})
+    queue.set_meta("limits", {"lease_seconds": args.lease_seconds, "max_attempts": args.max_attempts})
+    tasks = [(pack[0].id if len(pack) == 1 else f"{pack[0].id}..{pack[-1].id}",
+              {"sections": [asdict(sec) for sec in pack]}) for pack in packs]
+    added = queue.enqueue(tasks)
+    print(f"Enqueued {added} tasks ({len(sections)} sections, {len(tasks) - added} already queued) into {args.queue}")
+    print(f"Queue: {queue.counts()}")
+    queue.close()
+
+def run_worker(args):
+    queue = WorkQueue(Path(args.queue))
+    job = queue.get_meta("job")
+    if job is None:
+        raise SystemExit(f"No job in {args.queue}; run with --queue-mode enqueue first")
+    limits = queue.get_meta("limits", {})
+    queue.lease_seconds = limits.get("lease_seconds", queue.lease_seconds)
+    queue.max_attempts = limits.get("max_attempts", queue.max_attempts)
+    for key, value in job.items():
+        setattr(args, key, value)
+    extractor = Extractor(args, Path(args.out) if args.out else Path(args.queue).parent)
+    worker = args.worker_id or default_worker_id()
+
+    finished = 0
+    while True:
+        claimed = queue.claim(worker)
+        if claimed is None:
+            if queue.drained():
+                break
+            # Other workers hold the remaining leases; wait in case one of them dies
+            time.sleep(args.poll_interval)
+            continue
+        task_id, payload = claimed
+        pack = [Section(**d) for d in payload["sections"]]
+        try:
+            with queue.keep_alive(task_id, worker) as heartbeat:
+                concepts, edges = extractor.run(pack)
+        except Exception:
+            print(f"Task {task_id} failed:\n{traceback.format_exc()}")
+            queue.fail(task_id, worker, traceback.format_exc())
+            continue
+        result = {"concepts": [asdict(c) for c in concepts], "edges": [asdict(e) for e in edges]}
+        if heartbeat.lost or not queue.complete(task_id, worker, result):
+            print(f"Lost the lease on {task_id}; result discarded")
+            continue
+        finished += 1
+        print(f"[{worker}] done {task_id} ({len(concepts)} concepts, {len(edges)} edges)")
+
+    extractor.print_usage()
+    print(f"Worker {worker} finished {finished} tasks. Queue: {queue.counts()}")
+    queue.close()
+
+def reduce_job(args):
+    queue = WorkQueue(Path(args.queue))
+    counts = queue.counts()
+    if counts["pending"] or counts["leased"]:
+        raise SystemExit(f"Job not finished yet: {counts}")
+    for task_id, attempts, error in queue.failures():
+        print(f"Warning: {task_id} failed after {attempts} attempts and is missing from the graph")
+
+    sections: List[Section] = []
+    all_concepts: List[Concept] = []
+    all_edges: List[Edge] = []
+    for _, payload, result in queue.results():
+        sections.extend(Section(**d) for d in payload["sections"])
+        all_concepts.extend(concept_from_dict(d) for d in result["concepts"])
+        all_edges.extend(edge_from_dict(d) for d in result["edges"])
+    queue.close()
+
+    files = [(path, Path(path).read_text(encoding="utf-8", errors="ignore"))
+             for path in dict.fromkeys(sec.path for sec in sections) if Path(path).exists()]
+    finish(args, sections, files, all_concepts, all_edges)
+    print(f"Done. Reduced {counts['done']} tasks. Outputs saved under: {args.out}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="contents/japanese", help="Markdown directory")
+    ap.add_argument("--out", default=None, help="Output directory (local runs and --queue-mode reduce)")
+    ap.add_argument("--segment-level", default="h2", choices=["h1","h2","h3"])
+    ap.add_argument("--max-concepts", type=int, default=15)
+    ap.add_argument("--model", default=os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    ap.add_argument("--pack-budget", type=int, default=3000,
+                    help="Pack consecutive short sections into one request up to this many tokens (0 disables)")
+    ap.add_argument("--pack-max-sections", type=int, default=8, help="Most sections in one packed request")
+    ap.add_argument("--prune-relations", action="store_true",
+                    help="Send only paragraphs where extracted concepts co-occur to the relations call "
+                         "(see benchmarks/bench_context_pruning.py)")
+    ap.add_argument("--escalate", action="append", default=[], metavar="MODEL",
+                    help="Stronger model to retry sections that fail validation with (repeatable, in order). "
+                         "--model is then the first, cheap tier")
+    ap.add_argument("--min-edges", type=int, default=3, help="Routing: fewest edges a section may come back with")
+    ap.add_argument("--routing-log", default=None, help="Routing decisions log (default: OUT/routing_log.jsonl)")
+    ap.add_argument("--deadline", type=float, default=None,
+                    help="Seconds an LLM call may take in total before it fails (default: no overall limit)")
+    ap.add_argument("--hedge", action="store_true",
+                    help="Send a duplicate request when one is slower than the client's p95 latency")
+    ap.add_argument("--hedge-base-url", default=None,
+                    help="Endpoint for duplicates (default: OPENAI_HEDGE_BASE_URL or OPENAI_BASE_URL)")
+    ap.add_argument("--hedge-budget", type=float, default=0.05, help="Most duplicates as a fraction of requests")
+    ap.add_argument("--queue", default=None, help="Work-queue database shared by enqueue/work/reduce")
+    ap.add_argument("--queue-mode", choices=["enqueue", "work", "reduce"], default=None,
+                    help="enqueue: add sections to --queue; work: process tasks until the queue is drained; "
+                         "reduce: merge the results into --out")
+    ap.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                    help="Enqueue: how long a claimed task stays leased without a heartbeat")
+    ap.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Enqueue: claims per task before it fails")
+    ap.add_argument("--worker-id", default=None, help="Work: worker name in the queue (default: host:pid)")
+    ap.add_argument("--poll-interval", type=float, default=5.0, help="Work: seconds between claims while others hold leases")
+    ap.add_argument("--db", default=None, help="Also write the graph into this SQLite graph store")
+    ap.add_argument("--db-graph-name", default="graph", help="Graph name to use inside the store")
+    args = ap.parse_args()
+    if bool(args.queue) != bool(args.queue_mode):
+        ap.error("--queue and --queue-mode go together")
+    if args.queue_mode in (None, "reduce") and not args.out:
+        ap.error("--out is required")
+
+    if args.queue_mode == "enqueue":
+        enqueue_job(args)
+    elif args.queue_mode == "work":
+        run_worker(args)
+    elif args.queue_mode == "reduce":
+        reduce_job(args)
+    else:
+        run_local(args)
+
 if __name__ == "__main__":
     main()
@@ -9,6 +9,8 @@ import subprocess
 import shutil
 from pathlib import Path
 
+from manifest import record_section, section_id_from_source
+
 
 def get_section_id(filename):
     """Extract section ID from filename for naming output files"""
@@ -41,7 +43,11 @@ def process_single_file(input_file, output_dir, section_id):
             output_dir,
             "--max-concepts",
             "10",
+            # Cheap model first; sections failing validation are redone with gpt-5-mini
+            # (decisions, latency and cost go to routing_log.jsonl in output_dir)
             "--model",
+            "gpt-4o-mini",
+            "--escalate",
             "gpt-5-mini",
         ]
 
@@ -58,6 +64,11 @@ def process_single_file(input_file, output_dir, section_id):
                 )
                 shutil.copy(graph_file, section_graph_file)
                 print(f"  Created {section_graph_file}")
+                record_section(
+                    section_id_from_source(Path(input_file)) or section_id,
+                    source=Path(input_file),
+                    graphs=[Path(section_graph_file)],
+                )
 
         else:
             print(f"✗ Failed to process {section_id}")
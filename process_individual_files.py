@@ -13,6 +13,8 @@ from typing import List, Dict, Optional
 import hashlib
 from datetime import datetime
 
+from manifest import record_section
+
 
 def get_processed_files_record(record_file: Path) -> Dict[str, str]:
     """Read the record of previously processed files."""
@@ -172,6 +174,7 @@ def process_file_list(
             if graph_file.exists():
                 webui_file = webui_public_dir / f"graph_{section_id}.json"
                 webui_file.write_text(graph_file.read_text(encoding='utf-8'))
+                record_section(section_id, source=file_path, graphs=[webui_file, graph_file])
                 
                 # Update processed record
                 processed_record[file_key] = {
@@ -69,3 +69,171 @@ Chapter file: {chapter}
 {text}
 }}
 """
+
+# --- Cache-friendly prompt layout -------------------------------------------
+# The templates above put the task first and the section text last, so the
+# concepts and relations calls for one section share almost no prefix. The
+# layout below keeps a stable system block and the section text at the front
+# and the task-specific instructions at the end, so providers with automatic
+# prefix caching can reuse the section tokens for the second call.
+
+EXTRACTION_SYSTEM_PROMPT = """You build concept maps from textbook sections.
+You are a careful assistant. Respond in strict JSON only: no markdown fences, no commentary.
+
+General rules for every task:
+- **CRITICAL: Language matching requirement**
+  - If source text is in Japanese: ALL labels, definitions, relations and descriptions MUST be in Japanese
+  - Only use English if the exact English term appears in the original Japanese text (e.g., "AI", "Plurality")
+  - When Japanese text discusses English concepts, prefer Japanese translations when they exist in the text
+  - Example: If text says "デジタル民主主義", use "デジタル民主主義" not "Digital Democracy"
+- Evidence must be *verbatim* spans inside the section.
+- Use short labels, no markdown.
+
+The section follows; the task comes after it."""
+
+SECTION_CONTEXT_TEMPLATE = """Section title: {section_title}
+Chapter file: {chapter}
+---
+{text}
+---"""
+
+CONCEPTS_TASK = """Task: extract up to {max_concepts} key **knowledge concepts** from the section above that are central for learning (NOT trivia).
+Return STRICT JSON with this schema:
+{{
+  "concepts": [{{
+      "label": str,                    # canonical short name
+      "aliases": [str],                # synonyms / code tokens etc.
+      "definition": str,               # <= 30 words plain definition
+      "evidence": [{{"text": str}}]    # short quotes from the section
+  }}]
+}}
+
+Rules:
+- Focus on curriculum-aligned concepts that are central for learning.
+- Avoid meta, anecdotes, history unless explicitly in objectives."""
+
+RELATIONS_TASK = """Task: propose relations BETWEEN THESE CONCEPTS ONLY from the section above, as a list of edges.
+
+Concepts:
+{concepts}
+
+Return STRICT JSON with:
+{{
+  "edges": [{{
+    "source_label": str,
+    "target_label": str,
+    "relation": str,               # short label for graph display (1-3 words)
+    "relation_description": str,   # full natural language description
+    "confidence": float,           # 0.0-1.0
+    "evidence": [{{"text": str}}]  # short quotes from the section
+  }}]
+}}
+
+Rules:
+- Only connect the provided concepts. No new nodes.
+- For "relation": provide a short label (1-3 words) suitable for graph display (e.g., "includes", "type of", "requires").
+- For "relation_description": provide full natural language description that includes the target concept (e.g., "Logistic regression is a type of machine learning").
+- Only use English if the exact English term appears in the original Japanese text
+- Japanese examples: relation: "含む", "要求する", "影響する"; relation_description: "Aは〜を含む", "Bは〜を要求する"
+- Ensure natural Japanese phrasing in relation_description
+- Evidence must ground the relation; omit the edge if no textual support.
+- Keep 3-12 edges per section."""
+
+
+def section_messages(section_title: str, chapter: str, text: str, task: str) -> list:
+    """Chat messages with the stable prefix (system block, then section text) first and the task last."""
+    context = SECTION_CONTEXT_TEMPLATE.format(section_title=section_title, chapter=chapter, text=text)
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": f"{context}\n\n{task}"},
+    ]
+
+
+def concepts_messages(section_title: str, chapter: str, text: str, max_concepts: int) -> list:
+    return section_messages(section_title, chapter, text, CONCEPTS_TASK.format(max_concepts=max_concepts))
+
+
+def relations_messages(section_title: str, chapter: str, text: str, concepts: str) -> list:
+    return section_messages(section_title, chapter, text, RELATIONS_TASK.format(concepts=concepts))
+
+
+# --- Packed requests ----------------------------------------------------------
+# Many sections are only a few hundred characters long. Packing consecutive
+# short sections into one request pays for the instruction block once; the
+# model returns one entry per section id so results can be split back out.
+
+PACKED_SECTION_TEMPLATE = """=== Section {section_id} ===
+Section title: {section_title}
+Chapter file: {chapter}
+---
+{text}
+---"""
+
+PACKED_CONCEPTS_TASK = """Task: for EACH section above, separately, extract up to {max_concepts} key **knowledge concepts** from that section that are central for learning (NOT trivia).
+Return STRICT JSON with one entry per section id:
+{{
+  "sections": [{{
+    "section_id": str,                 # exactly as in the "=== Section ... ===" header
+    "concepts": [{{
+      "label": str,                    # canonical short name
+      "aliases": [str],                # synonyms / code tokens etc.
+      "definition": str,               # <= 30 words plain definition
+      "evidence": [{{"text": str}}]    # short quotes from that section
+    }}]
+  }}]
+}}
+
+Rules:
+- Treat sections independently: evidence must come from the section the concept is listed under.
+- Focus on curriculum-aligned concepts that are central for learning.
+- Avoid meta, anecdotes, history unless explicitly in objectives."""
+
+PACKED_RELATIONS_TASK = """Task: for EACH section above, separately, propose relations BETWEEN THAT SECTION'S CONCEPTS ONLY, as a list of edges.
+
+Concepts by section id:
+{concepts}
+
+Return STRICT JSON with one entry per section id:
+{{
+  "sections": [{{
+    "section_id": str,               # exactly as in the "=== Section ... ===" header
+    "edges": [{{
+      "source_label": str,
+      "target_label": str,
+      "relation": str,               # short label for graph display (1-3 words)
+      "relation_description": str,   # full natural language description
+      "confidence": float,           # 0.0-1.0
+      "evidence": [{{"text": str}}]  # short quotes from that section
+    }}]
+  }}]
+}}
+
+Rules:
+- Only connect the concepts listed for the same section. No new nodes.
+- For "relation": provide a short label (1-3 words) suitable for graph display (e.g., "includes", "type of", "requires").
+- For "relation_description": provide full natural language description that includes the target concept (e.g., "Logistic regression is a type of machine learning").
+- Only use English if the exact English term appears in the original Japanese text
+- Japanese examples: relation: "含む", "要求する", "影響する"; relation_description: "Aは〜を含む", "Bは〜を要求する"
+- Ensure natural Japanese phrasing in relation_description
+- Evidence must ground the relation; omit the edge if no textual support.
+- Keep 3-12 edges per section."""
+
+
+def packed_messages(sections: list, task: str) -> list:
+    """Chat messages for several (section_id, section_title, chapter, text) tuples, task last."""
+    context = "\n\n".join(
+        PACKED_SECTION_TEMPLATE.format(section_id=section_id, section_title=title, chapter=chapter, text=text)
+        for section_id, title, chapter, text in sections
+    )
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": f"{context}\n\n{task}"},
+    ]
+
+
+def packed_concepts_messages(sections: list, max_concepts: int) -> list:
+    return packed_messages(sections, PACKED_CONCEPTS_TASK.format(max_concepts=max_concepts))
+
+
+def packed_relations_messages(sections: list, concepts_by_section: str) -> list:
+    return packed_messages(sections, PACKED_RELATIONS_TASK.format(concepts=concepts_by_section))
@@ -0,0 +1,156 @@
+"""Tiered model routing: try a cheap model first, escalate sections whose result fails validation.
+
+pipeline.py --escalate MODEL (repeatable) turns this on. Each attempt is appended to a
+JSON-lines log with the model, sections, latency, token usage, estimated cost and the
+validation failures that caused an escalation, so thresholds can be tuned afterwards.
+"""
+import json, time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from connectivity import GraphConnectivity
+from llm import ChatCompletionsClient
+from validate_evidence import normalize_text
+
+# USD per 1M tokens: (input, cached input, output). Unknown models are logged with cost 0.
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+}
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    price, cached_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    return ((prompt_tokens - cached_tokens) * price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+@dataclass
+class RoutingPolicy:
+    """Thresholds a section result has to meet to be accepted without escalation."""
+    min_edges: int = 3                  # the prompts ask for 3-12 edges per section
+    max_missing_evidence: float = 0.3   # share of evidence quotes not found verbatim in the section
+    min_connected: float = 0.6          # share of concepts in the largest connected component
+
+def validate_section(text: str, concepts: list, edges: list, policy: RoutingPolicy,
+                     parse_failed: bool = False) -> List[str]:
+    """Reasons to escalate this section's result (empty list: accept)."""
+    reasons = []
+    if parse_failed:
+        reasons.append("unparseable_json")
+    if not concepts:
+        return reasons + ["no_concepts"]
+
+    source = normalize_text(text)
+    quotes = [e.text for item in [*concepts, *edges] for e in item.evidence if e.text]
+    missing = sum(1 for q in quotes if normalize_text(q) not in source)
+    if quotes and missing / len(quotes) > policy.max_missing_evidence:
+        reasons.append("evidence_not_verbatim")
+
+    conn = GraphConnectivity()
+    for c in concepts:
+        conn.add_node(c.id)
+    valid_edges = [e for e in edges if e.source != e.target and e.source in conn.index and e.target in conn.index]
+    for e in valid_edges:
+        conn.add_edge(e.source, e.target)
+    nodes = len(conn.ids)
+    if nodes >= 3 and len(valid_edges) < policy.min_edges:
+        reasons.append("too_few_edges")
+    if nodes >= 2 and max(conn.component_sizes()) / nodes < policy.min_connected:
+        reasons.append("disconnected")
+    return reasons
+
+# extract(client, sections) -> (concepts, edges), each item carrying a section_id
+ExtractFn = Callable[[ChatCompletionsClient, list], Tuple[list, list]]
+
+class Router:
+    """Runs extraction through model tiers, escalating only the sections that fail validation."""
+
+    def __init__(self, models: Sequence[str], policy: Optional[RoutingPolicy] = None,
+                 log_path: Optional[Path] = None, client_options: Optional[Dict] = None):
+        self.models = list(models)
+        self.policy = policy or RoutingPolicy()
+        self.clients = {m: ChatCompletionsClient(model=m, **(client_options or {})) for m in self.models}
+        self.log_path = log_path
+        self.stats: Dict[str, Dict] = {
+            m: {"attempts": 0, "sections": 0, "accepted": 0, "escalated": 0, "kept_failing": 0, "latency": 0.0,
+                "cost": 0.0, "reasons": {}} for m in self.models}
+
+    def run(self, sections: list, extract: ExtractFn) -> Tuple[list, list]:
+        """Extract sections (possibly several in one request), escalating failures tier by tier.
+
+        If every tier fails, the last tier's result is kept.
+        """
+        concepts_out, edges_out = [], []
+        pending = list(sections)
+        for tier, model in enumerate(self.models):
+            if not pending:
+                break
+            last_tier = tier == len(self.models) - 1
+            client = self.clients[model]
+            before = dict(client.usage)
+            start = time.perf_counter()
+            concepts, edges = extract(client, pending)
+            latency = time.perf_counter() - start
+            parse_failed = client.usage["parse_failures"] > before["parse_failures"]
+
+            escalate, verdicts = [], {}
+            for sec in pending:
+                sec_concepts = [c for c in concepts if c.section_id == sec.id]
+                sec_edges = [e for e in edges if e.section_id == sec.id]
+                # A failed packed call may have been recovered by per-section retries; only blame empty results
+                sec_parse_failed = parse_failed and not (sec_concepts and sec_edges)
+                reasons = validate_section(sec.text, sec_concepts, sec_edges, self.policy, sec_parse_failed)
+                verdicts[sec.id] = reasons
+                if reasons and not last_tier:
+                    escalate.append(sec)
+                else:
+                    concepts_out.extend(sec_concepts)
+                    edges_out.extend(sec_edges)
+            self._log(model, tier, pending, verdicts, latency, before, client.usage, escalate)
+            pending = escalate
+        return concepts_out, edges_out
+
+    def _log(self, model: str, tier: int, sections: list, verdicts: Dict[str, List[str]], latency: float,
+             before: Dict, after: Dict, escalated: list):
+        tokens = {k: after[k] - before[k] for k in ("prompt_tokens", "cached_tokens", "completion_tokens")}
+        cost = estimate_cost(model, tokens["prompt_tokens"], tokens["cached_tokens"], tokens["completion_tokens"])
+        s = self.stats[model]
+        s["attempts"] += 1
+        s["sections"] += len(sections)
+        s["escalated"] += len(escalated)
+        kept_failing = [sid for sid, reasons in verdicts.items() if reasons] if not escalated else []
+        s["accepted"] += len(sections) - len(escalated) - len(kept_failing)
+        s["kept_failing"] += len(kept_failing)
+        s["latency"] += latency
+        s["cost"] += cost
+        for reasons in verdicts.values():
+            for reason in reasons:
+                s["reasons"][reason] = s["reasons"].get(reason, 0) + 1
+        for sec in escalated:
+            print(f"Escalating {sec.title} from {model}: {', '.join(verdicts[sec.id])}")
+        if self.log_path:
+            record = {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "model": model, "tier": tier,
+                "sections": [sec.id for sec in sections], "latency": round(latency, 3), **tokens,
+                "cost_usd": round(cost, 6), "failures": {k: v for k, v in verdicts.items() if v},
+                "escalated": [sec.id for sec in escalated], "kept_failing": kept_failing,
+            }
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self) -> str:
+        lines = []
+        for model, s in self.stats.items():
+            reasons = ", ".join(f"{k} {v}" for k, v in sorted(s["reasons"].items())) or "none"
+            lines.append(f"{model}: {s['sections']} sections in {s['attempts']} batches, {s['accepted']} accepted, "
+                         f"{s['escalated']} escalated, {s['kept_failing']} kept failing, "
+                         f"{s['latency']:.1f}s, ${s['cost']:.4f} (failures: {reasons})")
+        return "\n".join(lines)
+
+    def usage_summary(self) -> str:
+        return "\n".join(f"{m}: {c.usage_summary()}" for m, c in self.clients.items())
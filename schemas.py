@@ -0,0 +1,220 @@
+"""Pydantic models for LLM payloads, JSON-schema response formats, local repair and parse metrics."""
+import json, re, threading
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+from utils import extract_json_block
+
+class _Lenient(BaseModel):
+    @model_validator(mode="before")
+    @classmethod
+    def _drop_nulls(cls, data):
+        # A null field falls back to its default instead of failing the whole payload
+        if isinstance(data, dict):
+            return {k: v for k, v in data.items() if v is not None}
+        return data
+
+class EvidenceItem(_Lenient):
+    text: str = ""
+
+class _WithEvidence(_Lenient):
+    evidence: List[EvidenceItem] = []
+
+    @field_validator("evidence", mode="before")
+    @classmethod
+    def _coerce_evidence(cls, value):
+        # Models sometimes return bare strings instead of {"text": ...}
+        if isinstance(value, (str, dict)):
+            value = [value]
+        return [{"text": v} if isinstance(v, str) else v for v in value]
+
+class ConceptItem(_WithEvidence):
+    label: str = ""
+    aliases: List[str] = []
+    tier: str = "core"
+    definition: Optional[str] = None
+
+    @field_validator("aliases", mode="before")
+    @classmethod
+    def _coerce_aliases(cls, value):
+        return [value] if isinstance(value, str) else value
+
+class ConceptsPayload(_Lenient):
+    concepts: List[ConceptItem] = []
+
+class EdgeItem(_WithEvidence):
+    source_label: str = ""
+    target_label: str = ""
+    relation: str = ""
+    relation_description: str = ""
+    confidence: float = 0.7
+
+class EdgesPayload(_Lenient):
+    edges: List[EdgeItem] = []
+
+# Packed requests: several small sections in one call, results keyed by section id
+
+class SectionConcepts(_Lenient):
+    section_id: str = ""
+    concepts: List[ConceptItem] = []
+
+class PackedConceptsPayload(_Lenient):
+    sections: List[SectionConcepts] = []
+
+class SectionEdges(_Lenient):
+    section_id: str = ""
+    edges: List[EdgeItem] = []
+
+class PackedEdgesPayload(_Lenient):
+    sections: List[SectionEdges] = []
+
+Payload = TypeVar("Payload", bound=BaseModel)
+
+def _strict_schema(node: Any) -> Any:
+    """Rewrite a pydantic JSON schema for strict structured outputs (all keys required, no extras/defaults)."""
+    if isinstance(node, dict):
+        node = {k: _strict_schema(v) for k, v in node.items() if k not in ("default", "title")}
+        if node.get("type") == "object" and "properties" in node:
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+        return node
+    if isinstance(node, list):
+        return [_strict_schema(v) for v in node]
+    return node
+
+def response_format(payload_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """`response_format` body parameter for OpenAI-compatible JSON-schema mode."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": payload_cls.__name__,
+            "schema": _strict_schema(payload_cls.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.I)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+def repair_json(text: str) -> Optional[str]:
+    """Cheap local fixes for common malformed output: code fences, prose around the JSON,
+    trailing commas, smart quotes, Python literals and truncated endings.
+
+    One walk over the text keeps string values verbatim: quote and literal fixes apply only
+    between tokens. Truncated output is cut back to the last complete element or member
+    before the open brackets are closed.
+    """
+    if not text:
+        return None
+    s = _FENCE.sub("", text.strip())
+    start = min([i for i in (s.find("{"), s.find("[")) if i >= 0], default=-1)
+    if start < 0:
+        return None
+    s = s[start:]
+
+    out: List[str] = []
+    stack: List[str] = []
+    # (length of out, open brackets) after which the value can be closed cleanly
+    safe: Optional[Tuple[int, Tuple[str, ...]]] = None
+    closer = None  # quote characters that end the current string, None outside strings
+    escaped = False
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if closer is not None:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch in closer:
+                closer = None
+                ch = '"'
+            out.append(ch)
+            i += 1
+            continue
+        if ch == '"' or ch in "“”":
+            closer = '"' if ch == '"' else '"”'
+            out.append('"')
+        elif ch == ",":
+            safe = (len(out), tuple(stack))
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            if ch == "[":
+                safe = (len(out), tuple(stack))
+        elif ch in "}]":
+            while out and (out[-1].isspace() or out[-1] == ","):
+                out.pop()  # trailing comma
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out)
+            safe = (len(out), tuple(stack))
+        elif ch.isalpha():
+            j = i
+            while j < len(s) and (s[j].isalnum() or s[j] == "_"):
+                j += 1
+            word = s[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Truncated: keep everything up to the last complete element and close what was open there
+    if safe is None:
+        return None
+    length, open_brackets = safe
+    head = "".join(out[:length]).rstrip()
+    if head.endswith(","):
+        head = head[:-1]
+    return head + "".join(reversed(open_brackets))
+
+def parse_payload(text: str, payload_cls: Type[Payload]) -> Tuple[Optional[Payload], str]:
+    """Validate text as payload_cls. Returns (payload, how) where how is "direct", "repaired" or "failed"."""
+    try:
+        return payload_cls.model_validate_json(text), "direct"
+    except (ValidationError, ValueError):
+        pass
+    for candidate in (repair_json(text), extract_json_block(text)):
+        if candidate is None:
+            continue
+        try:
+            if isinstance(candidate, str):
+                return payload_cls.model_validate_json(candidate), "repaired"
+            return payload_cls.model_validate(candidate), "repaired"
+        except (ValidationError, ValueError):
+            continue
+    return None, "failed"
+
+class ParseMetrics:
+    """Per-model counts of how responses were parsed (thread-safe)."""
+    OUTCOMES = ("direct", "repaired", "retried", "failed")
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, outcome: str):
+        with self._lock:
+            counts = self.counts.setdefault(model, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def summary(self) -> str:
+        lines = []
+        for model, c in sorted(self.counts.items()):
+            total = c["direct"] + c["repaired"] + c["failed"]
+            rate = c["failed"] / total if total else 0.0
+            lines.append(f"{model}: {c['direct']} direct, {c['repaired']} repaired, {c['retried']} retried, "
+                         f"{c['failed']} failed ({rate:.0%} failure)")
+        return "\n".join(lines) or "no structured calls"
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return json.loads(json.dumps(self.counts))
+
+PARSE_METRICS = ParseMetrics()
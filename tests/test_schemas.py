@@ -0,0 +1,37 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from schemas import ConceptsPayload, parse_payload, repair_json  # noqa: E402
+
+
+def test_repair_keeps_smart_quotes_inside_strings():
+    text = '{"concepts":[{"label":"a","evidence":[{"text":"彼は“hi”と言った"}]},]}'
+    payload, how = parse_payload(text, ConceptsPayload)
+    assert how == "repaired"
+    assert payload.concepts[0].evidence[0].text == "彼は“hi”と言った"
+
+
+def test_repair_keeps_python_literal_words_inside_strings():
+    text = '{"concepts":[{"label":"None","definition":"True or False",}]}'
+    payload, how = parse_payload(text, ConceptsPayload)
+    assert how == "repaired"
+    assert payload.concepts[0].label == "None"
+    assert payload.concepts[0].definition == "True or False"
+
+
+def test_repair_fixes_smart_quotes_and_literals_between_tokens():
+    assert json.loads(repair_json('{“a”: True, "b": None, "c": [1, 2,],}')) == {"a": True, "b": None, "c": [1, 2]}
+
+
+def test_repair_cuts_truncated_array_to_last_complete_element():
+    payload, how = parse_payload('{"concepts":[{"label":"a"},{"lab', ConceptsPayload)
+    assert how == "repaired"
+    assert [c.label for c in payload.concepts] == ["a"]
+
+
+def test_repair_drops_truncated_string_value():
+    assert json.loads(repair_json('{"concepts":[{"label":"a"},{"label":"b","definition":"cut')) == \
+        {"concepts": [{"label": "a"}, {"label": "b"}]}
@@ -36,3 +36,25 @@ def extract_json_block(text: str):
                 except Exception:
                     continue
     return None
+
+def char_ngrams(s: str, n: int = 2) -> set:
+    """Set of character n-grams of s; strings shorter than n yield themselves."""
+    if len(s) < n:
+        return {s} if s else set()
+    return {s[i:i+n] for i in range(len(s) - n + 1)}
+
+def approx_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII characters per token, one token per other character (e.g. Japanese)."""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+def section_id_from_graph_file(filename: str) -> str:
+    """Section id from a graph file name (graph_sec3-0.json -> 3-0, graph_extra-1.json -> extra-1), else ''."""
+    if not (filename.startswith("graph_") and filename.endswith(".json")):
+        return ""
+    stem = filename[len("graph_"):-len(".json")]
+    if stem.startswith("sec"):
+        return stem[len("sec"):]
+    if stem.startswith("extra-"):
+        return stem
+    return ""
@@ -11,6 +11,9 @@ from typing import List, Dict, Tuple, Optional
 import argparse
 from difflib import SequenceMatcher
 
+from manifest import resolve_source
+from utils import section_id_from_graph_file
+
 
 def load_graph_data(graph_file: Path) -> Dict:
     """グラフデータを読み込み"""
@@ -90,16 +93,12 @@ def validate_evidence_in_graph(graph_file: Path, source_dir: Path) -> List[Dict]
     graph_data = load_graph_data(graph_file)
     issues = []
     
-    # ソースファイルを特定
-    if 'extra-1' in str(graph_file):
-        source_file = source_dir / '1.md'
-    elif 'extra-2' in str(graph_file):
-        source_file = source_dir / '2.md'
-    elif 'extra-3' in str(graph_file):
-        source_file = source_dir / '3.md'
-    else:
+    # ソースファイルを特定（source_dir になければマニフェストで引く）
+    section_id = section_id_from_graph_file(graph_file.name)
+    if not section_id:
         print(f"Unknown graph file pattern: {graph_file}")
         return issues
+    source_file = resolve_source(section_id, source_dir)
     
     if not source_file.exists():
         issues.append({
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Watch input directories and rebuild only what changed.
+
+Polls input/*.md and extra-input/*.md (no inotify dependency), waits until
+edits settle (debounce), then:
+  1. re-extracts only the changed sections through pipeline.py,
+  2. re-merges incrementally (stable node ids, see merge_graphs.py --incremental),
+  3. refreshes graph analytics and the search index in webui/public,
+printing per-stage timings. `npm run dev` in webui/ picks the new files up.
+
+    python watch.py
+    python watch.py --once        # rebuild sections whose source differs from the manifest, then exit
+"""
+
+import argparse
+import hashlib
+import json
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import build_search_index
+import graph_analytics
+import merge_graphs
+from manifest import get_manifest, graph_file_name, record_section, section_id_from_source
+from process_individual_files import process_single_file
+
+DEFAULT_WATCH_DIRS = [Path("input"), Path("extra-input")]
+
+Snapshot = Dict[Path, Tuple[int, int]]
+
+
+def take_snapshot(watch_dirs: List[Path]) -> Snapshot:
+    """(mtime, size) of every markdown file directly under the watched directories."""
+    snapshot = {}
+    for watch_dir in watch_dirs:
+        if not watch_dir.is_dir():
+            continue
+        for path in watch_dir.glob("*.md"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def changed_paths(before: Snapshot, after: Snapshot) -> List[Path]:
+    return sorted(path for path in set(before) | set(after) if before.get(path) != after.get(path))
+
+
+def content_changed(path: Path) -> bool:
+    """True if the file content differs from what the manifest recorded (touches alone don't count)."""
+    section_id = section_id_from_source(path)
+    entry = get_manifest().sections.get(section_id) or {}
+    recorded = (entry.get("source") or {}).get("hash")
+    return recorded != hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def extract_section(source: Path, args) -> Tuple[str, bool]:
+    """Run the pipeline on one source file and publish its graph to webui/public."""
+    section_id = section_id_from_source(source)
+    output_dir = args.output_base / f"output-{section_id}"
+    ok = process_single_file(source, output_dir, section_id, model=args.model,
+                             max_concepts=args.max_concepts, verbose=args.verbose)
+    graph_file = output_dir / "graph.json"
+    if not ok or not graph_file.exists():
+        return section_id, False
+    webui_file = args.webui_public / graph_file_name(section_id)
+    shutil.copyfile(graph_file, webui_file)
+    return section_id, True
+
+
+def rebuild(sources: List[Path], args) -> Dict[str, float]:
+    """Run all stages for the changed sources and return per-stage timings."""
+    timings = {}
+    sources = [source for source in sources if section_id_from_source(source)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(lambda source: extract_section(source, args), sources))
+    for source, (section_id, ok) in zip(sources, results):
+        print(f"  {'✓' if ok else '✗'} {section_id} ({source.name})")
+        if ok:
+            record_section(section_id, source=source,
+                           graphs=[args.webui_public / graph_file_name(section_id),
+                                   args.output_base / f"output-{section_id}" / "graph.json"])
+    timings["extract"] = time.perf_counter() - start
+    updated = [section_id for section_id, ok in results if ok]
+    if not updated:
+        return timings
+
+    start = time.perf_counter()
+    graph_files = sorted(args.webui_public.glob("graph_sec*.json"))
+    merged_path = args.webui_public / "graph_merged.json"
+    merged = merge_graphs.merge_with_state(graph_files, merged_path, merge_graphs.load_merge_state(args.state))
+    with open(merged_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    merge_graphs.save_merge_state(args.state, merge_graphs.build_merge_state(graph_files, merged, merged_path))
+    timings["merge"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache = graph_analytics.load_cache(graph_analytics.DEFAULT_CACHE_PATH)
+    for section_id in updated:
+        graph_analytics.analyze_graph_file(args.webui_public / graph_file_name(section_id), cache)
+    graph_analytics.analyze_graph_file(merged_path, cache)
+    graph_analytics.save_cache(graph_analytics.DEFAULT_CACHE_PATH, cache,
+                               graph_analytics.iter_target_files(args.webui_public))
+    timings["analytics"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    docs, postings = build_search_index.build_index(args.webui_public)
+    build_search_index.write_index(args.webui_public / "search", docs, postings, build_search_index.DEFAULT_SHARDS)
+    timings["search_index"] = time.perf_counter() - start
+    return timings
+
+
+def print_timings(timings: Dict[str, float]):
+    total = sum(timings.values())
+    stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    print(f"Rebuilt in {total:.2f}s ({stages})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch input markdown and incrementally rebuild graphs")
+    parser.add_argument("--watch-dir", type=Path, action="append", default=None,
+                        help="Directory to watch (repeatable, default: input and extra-input)")
+    parser.add_argument("--webui-public", type=Path, default=Path("webui/public"))
+    parser.add_argument("--output-base", type=Path, default=Path("individual-outputs"),
+                        help="Where per-section pipeline outputs go")
+    parser.add_argument("--state", type=Path, default=Path(".merge_state.json"),
+                        help="Incremental merge state (shared with merge_graphs.py --incremental)")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini")
+    parser.add_argument("--max-concepts", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=4, help="Sections extracted in parallel")
+    parser.add_argument("--interval", type=float, default=0.5, help="Polling interval in seconds")
+    parser.add_argument("--debounce", type=float, default=1.0,
+                        help="Seconds without further changes before rebuilding")
+    parser.add_argument("--once", action="store_true",
+                        help="Rebuild sections whose content differs from the manifest, then exit")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    watch_dirs = args.watch_dir or DEFAULT_WATCH_DIRS
+    args.output_base.mkdir(exist_ok=True)
+    snapshot = take_snapshot(watch_dirs)
+
+    if args.once:
+        stale = [path for path in sorted(snapshot) if section_id_from_source(path) and content_changed(path)]
+        print(f"{len(stale)} changed sections")
+        if stale:
+            print_timings(rebuild(stale, args))
+        return 0
+
+    print(f"Watching {', '.join(str(d) for d in watch_dirs)} ({len(snapshot)} files). Ctrl-C to stop.")
+    pending: Dict[Path, None] = {}
+    last_change = 0.0
+    try:
+        while True:
+            time.sleep(args.interval)
+            current = take_snapshot(watch_dirs)
+            changes = changed_paths(snapshot, current)
+            snapshot = current
+            if changes:
+                pending.update(dict.fromkeys(changes))
+                last_change = time.monotonic()
+                continue
+            if not pending or time.monotonic() - last_change < args.debounce:
+                continue
+
+            sources = [path for path in pending if path.exists() and content_changed(path)]
+            pending.clear()
+            if not sources:
+                continue
+            print(f"\n{time.strftime('%H:%M:%S')} {len(sources)} changed: {', '.join(p.name for p in sources)}")
+            print_timings(rebuild(sources, args))
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
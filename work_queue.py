@@ -0,0 +1,244 @@
+"""SQLite work queue with leases, heartbeats and retry counts.
+
+Used by pipeline.py --queue to share one extraction job between several worker
+processes, on one machine or on several machines that see the same database
+file (a filesystem with working POSIX locks; SQLite over some network
+filesystems is not safe).
+
+A worker claims a task by taking a lease on it. While it works it renews the
+lease with heartbeats. A task whose lease expires (crashed or stuck worker)
+can be claimed again. Every claim counts as an attempt. A task that has failed
+max_attempts times is marked failed and no longer handed out.
+
+    python work_queue.py status --queue job.sqlite
+    python work_queue.py retry-failed --queue job.sqlite
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL             -- JSON
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY,        -- enqueue order; results are reduced in this order
+    id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,          -- JSON
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,                    -- JSON, set when done
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, seq);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Task queue in one SQLite file; every method opens a short IMMEDIATE transaction."""
+
+    def __init__(self, path: Path, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=60000")
+        self.conn.executescript(SCHEMA)
+        # Heartbeat threads share the connection
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        return _Transaction(self.conn, self._lock)
+
+    # --- job setup -------------------------------------------------------------
+
+    def set_meta(self, key: str, value: Any):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         (key, json.dumps(value, ensure_ascii=False)))
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def enqueue(self, tasks: List[Tuple[str, Dict]]) -> int:
+        """Add (task_id, payload) pairs; ids already in the queue are left alone. Returns how many were added."""
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (id, payload, updated) VALUES (?, ?, ?)",
+                [(task_id, json.dumps(payload, ensure_ascii=False), now) for task_id, payload in tasks])
+            return conn.total_changes - before
+
+    # --- worker side -----------------------------------------------------------
+
+    def claim(self, worker: str) -> Optional[Tuple[str, Dict]]:
+        """Lease the next pending task (or one whose lease expired). None if nothing is claimable now."""
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases that used up their attempts will never finish
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = COALESCE(error, 'lease expired'), updated = ?"
+                " WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            row = conn.execute(
+                "SELECT id, payload FROM tasks WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))"
+                " AND attempts < ? ORDER BY seq LIMIT 1", (now, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, worker = ?, lease_expires = ?,"
+                " updated = ? WHERE id = ?", (worker, now + self.lease_seconds, now, row[0]))
+            return row[0], json.loads(row[1])
+
+    def heartbeat(self, task_id: str, worker: str) -> bool:
+        """Extend the lease. False if the task is no longer leased to this worker."""
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, task_id, worker))
+            return cur.rowcount == 1
+
+    def complete(self, task_id: str, worker: str, result: Any) -> bool:
+        """Store the result. False (result dropped) if the lease was lost to another worker meanwhile."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_expires = NULL, updated = ?"
+                " WHERE id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(result, ensure_ascii=False), time.time(), task_id, worker))
+            return cur.rowcount == 1
+
+    def fail(self, task_id: str, worker: str, error: str):
+        """Give the task back for a retry, or mark it failed once max_attempts is reached."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " error = ?, lease_expires = NULL, updated = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error[-2000:], time.time(), task_id, worker))
+
+    def keep_alive(self, task_id: str, worker: str) -> 'Heartbeat':
+        """Context manager renewing the lease in the background every lease_seconds / 3."""
+        return Heartbeat(self, task_id, worker)
+
+    # --- progress and results --------------------------------------------------
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(("pending", "leased", "done", "failed"), 0)
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts.update(rows)
+        return counts
+
+    def drained(self) -> bool:
+        """True when no task is pending or leased (everything is done or failed)."""
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def results(self) -> Iterator[Tuple[str, Dict, Any]]:
+        """(task_id, payload, result) of finished tasks in enqueue order."""
+        with self._lock:
+            rows = self.conn.execute("SELECT id, payload, result FROM tasks WHERE status = 'done' ORDER BY seq").fetchall()
+        for task_id, payload, result in rows:
+            yield task_id, json.loads(payload), json.loads(result)
+
+    def failures(self) -> List[Tuple[str, int, str]]:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT id, attempts, COALESCE(error, '') FROM tasks WHERE status = 'failed' ORDER BY seq").fetchall()
+
+    def retry_failed(self) -> int:
+        """Put failed tasks back with a fresh attempt count."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, worker = NULL, updated = ? WHERE status = 'failed'",
+                (time.time(),)).rowcount
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+class Heartbeat:
+    def __init__(self, queue: WorkQueue, task_id: str, worker: str):
+        self.queue = queue
+        self.task_id = task_id
+        self.worker = worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            if not self.queue.heartbeat(self.task_id, self.worker):
+                self.lost = True
+                return
+
+    def __enter__(self) -> 'Heartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a pipeline work queue")
+    parser.add_argument("command", choices=["status", "retry-failed"])
+    parser.add_argument("--queue", type=Path, required=True, help="Queue database")
+    args = parser.parse_args()
+
+    if not args.queue.exists():
+        print(f"Queue not found: {args.queue}")
+        return 1
+    queue = WorkQueue(args.queue)
+    if args.command == "retry-failed":
+        print(f"{queue.retry_failed()} failed tasks put back")
+    counts = queue.counts()
+    print(", ".join(f"{status} {n}" for status, n in counts.items()))
+    for task_id, attempts, error in queue.failures():
+        print(f"  failed {task_id} after {attempts} attempts: {error.splitlines()[-1] if error else ''}")
+    queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())